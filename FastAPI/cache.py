@@ -0,0 +1,185 @@
+from dotenv import load_dotenv
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+
+load_dotenv()
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s?.!]+$")
+
+
+def normalize_query(query: str) -> str:
+    """Normalizes a query for exact matching (case, whitespace and trailing punctuation are ignored)"""
+    return _TRAILING_PUNCT_RE.sub("", _WHITESPACE_RE.sub(" ", query.strip().lower()))
+
+
+class AnswerCache():
+
+    """LRU/TTL cache of query answers with an exact tier and an optional semantic tier.
+
+       The exact tier matches normalized queries. The semantic tier matches queries whose embedding has a cosine
+       similarity of at least `similarity_threshold` with a cached query. Answers are cached per `scope` (e.g. the
+       documents a query was restricted to), and a lookup only matches answers of the same scope. `invalidate` must be
+       called whenever the underlying collection changes; answers computed before the invalidation are then discarded.
+
+    Args:
+        max_entries (Optional[int]): Maximum number of cached answers. Defaults to ANSWER_CACHE_SIZE or 1024, 0 disables the cache.
+        ttl_s (Optional[float]): Seconds an answer stays valid. Defaults to ANSWER_CACHE_TTL_S or 3600.
+        semantic (Optional[bool]): Enables the semantic tier. Defaults to ANSWER_CACHE_SEMANTIC or false.
+        similarity_threshold (Optional[float]): Minimum cosine similarity for a semantic hit. Defaults to ANSWER_CACHE_SIMILARITY or 0.95.
+
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_s: Optional[float] = None, semantic: Optional[bool] = None,
+                 similarity_threshold: Optional[float] = None):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("ANSWER_CACHE_SIZE", 1024))
+        self.ttl_s = ttl_s if ttl_s is not None else float(os.getenv("ANSWER_CACHE_TTL_S", 3600))
+        self.semantic = semantic if semantic is not None else os.getenv("ANSWER_CACHE_SEMANTIC", "false").lower() == "true"
+        self.similarity_threshold = similarity_threshold if similarity_threshold is not None else float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))
+
+        # (normalized query, scope) -> (value, expires_at, normalized embedding or None)
+        self._entries: "OrderedDict[Tuple[str, Optional[str]], Tuple[Any, float, Optional[np.ndarray]]]" = OrderedDict()
+        # Per scope, stacked embeddings of the semantic tier and their keys, rebuilt lazily after the entries change
+        self._matrices: Dict[Optional[str], Tuple[np.ndarray, List[Tuple[str, Optional[str]]]]] = {}
+        self._generation = 0
+        self._counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @property
+    def generation(self) -> int:
+        """Increases on every invalidation. Pass the value read before computing an answer to `put`."""
+        return self._generation
+
+    def get(self, query: str, scope: Optional[str] = None) -> Optional[Any]:
+        """Looks up the exact tier
+
+        Args:
+            query (str): Query
+            scope (Optional[str]): Scope the answer was cached under
+
+        Returns:
+            Optional[Any]: Cached value, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        key = (normalize_query(query), scope)
+        with self._lock:
+            value = self._get_live(key)
+            if value is not None:
+                self._counters["exact_hits"] += 1
+            elif not self.semantic:
+                self._counters["misses"] += 1
+            return value
+
+    def get_semantic(self, query_embedding: List[float], scope: Optional[str] = None) -> Optional[Any]:
+        """Looks up the semantic tier, to be called after an exact miss
+
+        Args:
+            query_embedding (List[float]): Embedding of the query
+            scope (Optional[str]): Scope the answer was cached under
+
+        Returns:
+            Optional[Any]: Value of the most similar cached query above the threshold, or None on a miss
+        """
+        if not (self.enabled and self.semantic):
+            return None
+
+        query_vector = self._normalize(query_embedding)
+        with self._lock:
+            matrix, keys = self._semantic_matrix(scope)
+            if matrix is not None:
+                similarities = matrix @ query_vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    value = self._get_live(keys[best])
+                    if value is not None:
+                        self._counters["semantic_hits"] += 1
+                        return value
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, query: str, value: Any, query_embedding: Optional[List[float]] = None, generation: Optional[int] = None,
+            scope: Optional[str] = None):
+        """Caches the value for the query
+
+        Args:
+            query (str): Query
+            value (Any): Value to cache
+            query_embedding (Optional[List[float]]): Embedding of the query, needed for the semantic tier
+            generation (Optional[int]): `generation` read before computing the value. Stale values are dropped.
+            scope (Optional[str]): Scope of the answer, e.g. the filters the query was restricted to
+        """
+        if not self.enabled:
+            return
+
+        key = (normalize_query(query), scope)
+        embedding = self._normalize(query_embedding) if (self.semantic and query_embedding is not None) else None
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl_s, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+            self._matrices.clear()
+
+    def invalidate(self):
+        """Drops every cached value, e.g. after documents are indexed or deleted"""
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+            self._generation += 1
+            self._counters["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["exact_hits"] + self._counters["semantic_hits"] + self._counters["misses"]
+            hits = self._counters["exact_hits"] + self._counters["semantic_hits"]
+            return {
+                "enabled": self.enabled,
+                "semantic": self.semantic,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                **self._counters,
+            }
+
+    def _get_live(self, key: Tuple[str, Optional[str]]) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at, _ = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self._matrices.clear()
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _semantic_matrix(self, scope: Optional[str]) -> Tuple[Optional[np.ndarray], List[Tuple[str, Optional[str]]]]:
+        if scope not in self._matrices:
+            keys = [key for key, (_, _, embedding) in self._entries.items() if embedding is not None and key[1] == scope]
+            if not keys:
+                return None, []
+            self._matrices[scope] = (np.stack([self._entries[key][2] for key in keys]), keys)
+        return self._matrices[scope]
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,108 @@
+from typing import Callable, List
+import numpy as np
+
+from llama_index.core import Document
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.node_parser.text.utils import split_by_sentence_tokenizer
+from llama_index.core.schema import BaseNode, TextNode
+from llama_index.core.utils import get_tokenizer
+
+
+CHUNKING_STRATEGIES = ("sentence", "semantic", "hybrid")
+
+
+def sentence_chunks(documents: List[Document], chunk_size: int) -> List[BaseNode]:
+    """Splits the documents into chunks of at most chunk_size tokens on sentence boundaries, without any embedding calls
+
+    Args:
+        documents (List[Document]): List of documents
+        chunk_size (int): Maximum chunk size in tokens
+
+    Returns:
+        List[BaseNode]: List of chunks (without embeddings)
+    """
+    return SentenceSplitter(chunk_size=chunk_size).get_nodes_from_documents(documents)
+
+
+def semantic_chunks(documents: List[Document], embedder: BaseEmbedding, chunk_size: int, unit: str = "sentence",
+                    buffer_size: int = 1, breakpoint_percentile_threshold: float = 95) -> List[BaseNode]:
+    """Splits the documents where the meaning shifts, and derives each chunk's vector from the embeddings used to
+    find the breakpoints, so chunks never need to be embedded a second time.
+
+    The text is split into units (sentences, or short token windows for the hybrid mode). Each unit is embedded
+    together with its `buffer_size` neighbours, and a new chunk starts where the cosine distance between consecutive
+    units is above the `breakpoint_percentile_threshold` percentile of the document, or where the chunk would exceed
+    chunk_size tokens. A chunk's vector is the normalized mean of its units' embeddings.
+
+    Args:
+        documents (List[Document]): List of documents
+        embedder (BaseEmbedding): Embedder used for the units
+        chunk_size (int): Maximum chunk size in tokens
+        unit (str): "sentence" to split on sentences, "window" to split on token windows of chunk_size // 4
+        buffer_size (int): Number of neighbouring units embedded with each unit
+        breakpoint_percentile_threshold (float): Percentile of the distances above which a chunk is split
+
+    Returns:
+        List[BaseNode]: List of chunks with their embeddings set
+    """
+    split_units = _unit_splitter(unit, chunk_size)
+    tokenizer = get_tokenizer()
+
+    documents = [document for document in documents if document.text.strip()]
+    units_per_document = [split_units(document.text) for document in documents]
+
+    # Embed the buffered units of every document in one batched pass
+    buffered = [
+        "".join(units[max(0, i - buffer_size):i + buffer_size + 1])
+        for units in units_per_document
+        for i in range(len(units))
+    ]
+    embeddings = np.asarray(embedder.get_text_embedding_batch(buffered), dtype=np.float32) if buffered else None
+
+    chunks = []
+    offset = 0
+    for document, units in zip(documents, units_per_document):
+        if not units:
+            continue
+        unit_embeddings = _normalize(embeddings[offset:offset + len(units)])
+        offset += len(units)
+
+        # Distance between each unit and the next one
+        distances = 1 - np.sum(unit_embeddings[:-1] * unit_embeddings[1:], axis=1)
+        threshold = np.percentile(distances, breakpoint_percentile_threshold) if len(distances) else 0.0
+
+        start, tokens = 0, 0
+        for i, unit_text in enumerate(units):
+            unit_tokens = len(tokenizer(unit_text))
+            is_breakpoint = i > 0 and distances[i - 1] > threshold
+            if i > start and (is_breakpoint or tokens + unit_tokens > chunk_size):
+                chunks.append(_chunk_node(document, units[start:i], unit_embeddings[start:i]))
+                start, tokens = i, 0
+            tokens += unit_tokens
+        chunks.append(_chunk_node(document, units[start:], unit_embeddings[start:]))
+
+    return chunks
+
+
+def _unit_splitter(unit: str, chunk_size: int) -> Callable[[str], List[str]]:
+    if unit == "sentence":
+        return split_by_sentence_tokenizer()
+    if unit == "window":
+        window_splitter = SentenceSplitter(chunk_size=max(chunk_size // 4, 32), chunk_overlap=0)
+        # Windows lose the separating whitespace, add it back so joined chunks read naturally
+        return lambda text: [f"{window} " for window in window_splitter.split_text(text)]
+    raise ValueError(f"Unsupported chunking unit '{unit}'. Please choose sentence or window.")
+
+
+def _chunk_node(document: Document, units: List[str], unit_embeddings: np.ndarray) -> TextNode:
+    return TextNode(
+        text="".join(units).strip(),
+        metadata=dict(document.metadata),
+        embedding=_normalize(unit_embeddings.mean(axis=0)).tolist(),
+    )
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
@@ -0,0 +1,270 @@
+from dotenv import load_dotenv
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Optional
+import json
+import os
+import threading
+
+from pymilvus import connections
+
+from FastAPI.embeddings import CachedBatchingEmbedding
+from FastAPI.local_store import LocalVectorStore, local_store_path
+from FastAPI.storage import pooled_minio_client
+
+if TYPE_CHECKING:
+    from llama_index.vector_stores.milvus import MilvusVectorStore
+
+
+load_dotenv()
+
+
+def _nvidia_embedder():
+    from llama_index.embeddings.nvidia import NVIDIAEmbedding
+
+    os.environ["NVIDIA_API_KEY"] = os.getenv("NVIDIA_API_KEY")
+    return NVIDIAEmbedding(model=os.getenv('EMBEDDING_MODEL', 'nvidia/nv-embedqa-e5-v5'), truncate="END")
+
+
+def _azure_embedder():
+    from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
+
+    return AzureOpenAIEmbedding(
+        model=os.getenv('EMBEDDING_MODEL'),
+        engine=os.getenv('EMBEDDING_MODEL'),
+        api_version=os.getenv('LLM_API_VERSION'),
+        azure_endpoint=os.getenv('LLM_ENDPOINT'),
+        api_key=os.getenv('LLM_API_KEY')
+    )
+
+
+def _nvidia_llm():
+    from llama_index.llms.nvidia import NVIDIA
+
+    return NVIDIA(model=os.getenv('LLM_MODEL'))
+
+
+def _azure_llm():
+    from llama_index.llms.azure_openai import AzureOpenAI
+
+    return AzureOpenAI(model=os.getenv('LLM_MODEL'),
+                       engine=os.getenv('LLM_MODEL'),
+                       api_version=os.getenv('LLM_API_VERSION'),
+                       azure_endpoint=os.getenv('LLM_ENDPOINT'),
+                       api_key=os.getenv('LLM_API_KEY')
+                       )
+
+
+# Client builders of each model host. A provider's SDK is only imported when its builder first runs, so the
+# other hosts' packages are never loaded
+PROVIDERS: Dict[str, Dict[str, Callable[[], Any]]] = {
+    "NVIDIA": {"embedder": _nvidia_embedder, "llm": _nvidia_llm},
+    "AZURE": {"embedder": _azure_embedder, "llm": _azure_llm},
+}
+
+
+def provider(kind: str, model_host: Optional[str] = None) -> Callable[[], Any]:
+    """Returns the builder of the embedder or LLM of the model host
+
+    Args:
+        kind (str): "embedder" or "llm"
+        model_host (Optional[str]): NVIDIA or AZURE. Defaults to MODEL_HOST
+
+    Raises:
+        ValueError: If the model host is not supported
+    """
+    model_host = model_host or os.getenv("MODEL_HOST", "NVIDIA")
+    if model_host not in PROVIDERS:
+        raise ValueError(f"Model host '{model_host}' not supported. Please choose one of {', '.join(PROVIDERS)}.")
+    return PROVIDERS[model_host][kind]
+
+
+def build_embedder():
+    """
+    Builds the embedder of the model host (NVIDIA or Azure), wrapped to cache repeated query embeddings and merge
+    concurrent ones into batched API calls
+    """
+    model_host = os.getenv("MODEL_HOST", "NVIDIA")
+    return CachedBatchingEmbedding(provider("embedder", model_host)(), symmetric=model_host == "AZURE")
+
+
+def build_llm():
+    """
+    Builds the LLM of the model host (NVIDIA or Azure)
+    """
+    return provider("llm")()
+
+
+def milvus_uri() -> str:
+    """
+    URI of the Milvus server: MILVUS_CONNECTION_URI if set (e.g. the path of a Milvus Lite file), else built from MILVUS_HOST
+    and MILVUS_PORT
+    """
+    return os.getenv("MILVUS_CONNECTION_URI") or f"http://{os.getenv('MILVUS_HOST', 'localhost')}:{os.getenv('MILVUS_PORT', 19530)}/"
+
+
+def connect_milvus() -> str:
+    """
+    Opens the default pymilvus connection (MILVUS_CONNECTION_URI, or MILVUS_HOST / MILVUS_PORT) used by `Collection` and `utility`
+
+    Returns:
+        str: Connection alias
+    """
+    if os.getenv("MILVUS_CONNECTION_URI"):
+        connections.connect(alias="default", uri=os.getenv("MILVUS_CONNECTION_URI"))
+    else:
+        connections.connect(alias="default", host=os.getenv("MILVUS_HOST", "localhost"), port=os.getenv("MILVUS_PORT", 19530))
+    return "default"
+
+
+class ClientRegistry():
+
+    """Builds the MinIO, Milvus and model clients once per process and hands the same instances to every caller.
+
+       The routes, Indexing_Pipeline and Query_Pipeline get their clients here instead of building their own, so
+       connection pools are shared and connections are opened once. Clients are built on first use; `register`
+       replaces one (e.g. with a local stand-in in the benchmarks).
+
+    Args:
+        factories (Optional[Dict[str, Callable[[], Any]]]): Builders of the "minio", "milvus", "embedder" and "llm"
+            clients. Defaults to the ones configured from the environment.
+
+    """
+
+    def __init__(self, factories: Optional[Dict[str, Callable[[], Any]]] = None):
+        self.factories = {
+            "minio": pooled_minio_client,
+            "milvus": connect_milvus,
+            "embedder": build_embedder,
+            "llm": build_llm,
+        }
+        self.factories.update(factories or {})
+        self._clients: Dict[str, Any] = {}
+        self._milvus_stores: Dict[str, "MilvusVectorStore"] = {}
+        self._local_stores: Dict[str, LocalVectorStore] = {}
+        self._lock = threading.RLock()
+        # One lock per client, so building a slow client does not hold up the others
+        self._build_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, name: str) -> Any:
+        """Returns the named client, building it on first use
+
+        Args:
+            name (str): Client name (minio, milvus, embedder or llm)
+
+        Returns:
+            Any: Shared client
+        """
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                build_lock = self._build_locks.setdefault(name, threading.Lock())
+            with build_lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = self.factories[name]()
+        return client
+
+    def peek(self, name: str) -> Optional[Any]:
+        """Returns the named client if it was already built, without building it"""
+        return self._clients.get(name)
+
+    def warm_up(self, names: Iterable[str], on_ready: Optional[Callable[[], None]] = None) -> threading.Thread:
+        """Builds the named clients in a background thread, so that startup does not wait for them and the first
+        request finds them ready. Errors are printed and raised again by the first request that needs the client.
+
+        Args:
+            names (Iterable[str]): Clients to build
+            on_ready (Optional[Callable[[], None]]): Called once every client is built
+
+        Returns:
+            threading.Thread: Warm-up thread
+        """
+        names = list(names)
+
+        def build():
+            failed = False
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    failed = True
+                    print(f"Could not warm up the {name} client: {e}")
+            if on_ready is not None and not failed:
+                on_ready()
+
+        thread = threading.Thread(target=build, name="client-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def register(self, name: str, client: Any):
+        """Replaces the named client, e.g. with a stand-in"""
+        with self._lock:
+            self._clients[name] = client
+
+    def minio(self):
+        """Shared MinIO client (pooled connections, see `FastAPI.storage.pooled_minio_client`)"""
+        return self.get("minio")
+
+    def milvus(self) -> str:
+        """Alias of the shared pymilvus connection, connecting on first use"""
+        return self.get("milvus")
+
+    def embedder(self):
+        """Shared embedder"""
+        return self.get("embedder")
+
+    def llm(self):
+        """Shared LLM"""
+        return self.get("llm")
+
+    def milvus_store(self, collection_name: str, **kwargs) -> "MilvusVectorStore":
+        """Returns the vector store of the collection, reusing its Milvus client across pipelines and refreshes
+
+        Args:
+            collection_name (str): Milvus collection
+            **kwargs: MilvusVectorStore arguments (uri, consistency_level, search_config...)
+
+        Returns:
+            MilvusVectorStore: Store built once per collection and arguments
+        """
+        from llama_index.vector_stores.milvus import MilvusVectorStore
+
+        key = json.dumps([collection_name, kwargs], sort_keys=True, default=str)
+        with self._lock:
+            store = self._milvus_stores.get(key)
+            if store is None:
+                store = self._milvus_stores[key] = MilvusVectorStore(collection_name=collection_name, **kwargs)
+            return store
+
+    def local_store(self, collection_name: str) -> LocalVectorStore:
+        """Returns the embedded vector store of the collection (VECTOR_STORE_BACKEND=local), shared by the pipelines.
+        Its files are only mapped on first use."""
+        with self._lock:
+            store = self._local_stores.get(collection_name)
+            if store is None:
+                store = self._local_stores[collection_name] = LocalVectorStore(local_store_path(collection_name))
+            return store
+
+    def release_milvus_stores(self, collection_name: str):
+        """Closes the vector stores of a collection (e.g. after it is dropped) so the next call rebuilds them"""
+        with self._lock:
+            for key in [key for key in self._milvus_stores if json.loads(key)[0] == collection_name]:
+                self._milvus_stores.pop(key).client.close()
+
+    def close(self):
+        """Closes the Milvus connections, the local vector stores and the MinIO connection pool"""
+        with self._lock:
+            for store in self._local_stores.values():
+                store.close()
+            for store in self._milvus_stores.values():
+                store.client.close()
+            self._milvus_stores.clear()
+            if "milvus" in self._clients:
+                connections.disconnect(self._clients.pop("milvus"))
+            minio_client = self._clients.pop("minio", None)
+            http_client = getattr(minio_client, "_http", None)
+            if http_client is not None:
+                http_client.clear()
+
+
+# Process-wide registry shared by the routes and the pipelines
+clients = ClientRegistry()
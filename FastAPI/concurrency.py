@@ -0,0 +1,65 @@
+from dotenv import load_dotenv
+from typing import Any, Callable, Dict
+import asyncio
+import os
+
+
+load_dotenv()
+
+# Default number of in-flight calls allowed per backend (override with <BACKEND>_MAX_CONCURRENCY)
+DEFAULT_LIMITS = {
+    "LLM": 8,
+    "EMBEDDING": 16,
+    "MILVUS": 16,
+    "MINIO": 16,
+    "INDEXING": 2,
+}
+
+
+class BackendLimiter():
+
+    """Bounds the number of concurrent calls made to each backend (LLM, embedding, Milvus, MinIO, indexing).
+
+       Limits are read from the environment, e.g. LLM_MAX_CONCURRENCY=4. Semaphores are created lazily so
+       they bind to the event loop that first uses them.
+
+    """
+
+    def __init__(self, limits: Dict[str, int] = None):
+        self.limits = dict(DEFAULT_LIMITS)
+        for backend in self.limits:
+            self.limits[backend] = int(os.getenv(f"{backend}_MAX_CONCURRENCY", self.limits[backend]))
+        self.limits.update(limits or {})
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def __call__(self, backend: str) -> asyncio.Semaphore:
+        """Returns the semaphore guarding the given backend
+
+        Args:
+            backend (str): Backend name (LLM, EMBEDDING, MILVUS, MINIO or INDEXING)
+
+        Returns:
+            asyncio.Semaphore: Semaphore to hold while calling the backend
+        """
+        backend = backend.upper()
+        semaphore = self._semaphores.get(backend)
+        if semaphore is None:
+            semaphore = self._semaphores.setdefault(backend, asyncio.Semaphore(self.limits[backend]))
+        return semaphore
+
+    async def run_in_thread(self, backend: str, func: Callable, *args, **kwargs) -> Any:
+        """Runs a blocking call in a worker thread while holding the backend's semaphore
+
+        Args:
+            backend (str): Backend name
+            func (Callable): Blocking function to call
+
+        Returns:
+            Any: Return value of func
+        """
+        async with self(backend):
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+
+# Process-wide limiter shared by the routes and the query engine
+limiter = BackendLimiter()
@@ -0,0 +1,296 @@
+from dotenv import load_dotenv
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+
+from pydantic import PrivateAttr
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+
+load_dotenv()
+
+# Inputs NVIDIA embedding endpoints accept per request
+NVIDIA_MAX_BATCH_SIZE = 259
+
+
+class QueryEmbeddingBatcher():
+
+    """Merges concurrent single-query embed calls into one batched API call.
+
+       The first pending query opens a window of `window_ms`; every query submitted before it closes (up to
+       `max_batch_size`) is embedded in the same call. Identical texts within a batch are embedded once.
+
+    Args:
+        embed_fn (Callable[[List[str]], List[List[float]]]): Embeds a batch of queries with one API call
+        window_ms (float): How long to wait for more queries after the first one
+        max_batch_size (int): Maximum number of distinct queries per API call
+
+    """
+
+    def __init__(self, embed_fn, window_ms: float, max_batch_size: int):
+        self.embed_fn = embed_fn
+        self.window_s = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+    def submit(self, text: str) -> Future:
+        """Queues a query for embedding
+
+        Args:
+            text (str): Query
+
+        Returns:
+            Future: Resolves to the query embedding
+        """
+        self._ensure_worker()
+        future = Future()
+        self._pending.put((text, future))
+        return future
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="query-embedding-batcher", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._pending.get()]
+                deadline = time.monotonic() + self.window_s
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self._pending.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                self._embed_batch(batch)
+            except Exception as e:
+                # The worker serves every later query, it must outlive any failure
+                print(f"Query embedding batcher error: {e}")
+
+    def _embed_batch(self, batch: List[Tuple[str, Future]]):
+        # Queries cancelled while waiting (e.g. the client disconnected) are dropped, their futures cannot take a result
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = self.embed_fn(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"Expected {len(texts)} query embeddings, got {len(vectors)}")
+            embeddings = dict(zip(texts, vectors))
+            for text, future in batch:
+                future.set_result(embeddings[text])
+        except Exception as e:
+            # Every caller still waiting gets the error, none is left blocked
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+class CachedBatchingEmbedding(BaseEmbedding):
+
+    """Wraps an embedder with a bounded LRU cache of query embeddings and a query micro-batcher.
+
+       Only query embeddings are cached and batched, passage embeddings (used while indexing) are passed
+       straight through to the wrapped embedder, which already batches them.
+
+    Args:
+        inner (BaseEmbedding): Embedder to wrap (NVIDIA or Azure OpenAI)
+        symmetric (bool): True if the model embeds queries and passages the same way (Azure OpenAI). Such models
+            batch queries through the regular text batch API.
+        max_entries (Optional[int]): Maximum cached query embeddings. Defaults to EMBED_CACHE_SIZE or 4096, 0 disables the cache.
+        window_ms (Optional[float]): Micro-batching window. Defaults to EMBED_BATCH_WINDOW_MS or 5, 0 disables batching.
+        max_batch_size (Optional[int]): Maximum queries per batched call. Defaults to EMBED_QUERY_BATCH_SIZE or 32.
+        cache_path (Optional[str]): JSON file the cache is loaded from and saved to. Defaults to EMBED_CACHE_PATH, unset keeps it in memory.
+
+    """
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _symmetric: bool = PrivateAttr()
+    _max_entries: int = PrivateAttr()
+    _cache_path: Optional[str] = PrivateAttr()
+    _cache: "OrderedDict[Tuple[str, str], List[float]]" = PrivateAttr()
+    _cache_lock: threading.Lock = PrivateAttr()
+    _batcher: Optional[QueryEmbeddingBatcher] = PrivateAttr()
+    _max_batch_size: int = PrivateAttr()
+    _counters: Dict[str, int] = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, symmetric: bool = False, max_entries: Optional[int] = None,
+                 window_ms: Optional[float] = None, max_batch_size: Optional[int] = None,
+                 cache_path: Optional[str] = None, **kwargs: Any):
+        super().__init__(model_name=inner.model_name, embed_batch_size=inner.embed_batch_size, **kwargs)
+        window_ms = window_ms if window_ms is not None else float(os.getenv("EMBED_BATCH_WINDOW_MS", 5))
+        max_batch_size = max_batch_size or int(os.getenv("EMBED_QUERY_BATCH_SIZE", 32))
+
+        self._inner = inner
+        self._symmetric = symmetric
+        self._max_batch_size = max_batch_size
+        self._max_entries = max_entries if max_entries is not None else int(os.getenv("EMBED_CACHE_SIZE", 4096))
+        self._cache_path = cache_path or os.getenv("EMBED_CACHE_PATH")
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._batcher = QueryEmbeddingBatcher(self._embed_queries, window_ms, max_batch_size) if window_ms > 0 else None
+        self._counters = {"hits": 0, "misses": 0, "api_calls": 0, "queries_embedded": 0}
+
+        if self._cache_path and os.path.exists(self._cache_path):
+            self.load(self._cache_path)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedBatchingEmbedding"
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        return self._inner
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        embedding = self._cache_get(query)
+        if embedding is None:
+            if self._batcher is not None:
+                embedding = self._batcher.submit(query).result()
+            else:
+                embedding = self._embed_queries([query])[0]
+            self._cache_put(query, embedding)
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        embedding = self._cache_get(query)
+        if embedding is None:
+            if self._batcher is not None:
+                embedding = await asyncio.wrap_future(self._batcher.submit(query))
+            else:
+                self._count_api_call(1)
+                embedding = await self._inner.aget_query_embedding(query)
+            self._cache_put(query, embedding)
+        return embedding
+
+    def get_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Embeds many queries at once, embedding only the cache misses in batched calls of up to max_batch_size queries
+
+        Args:
+            queries (List[str]): Queries
+
+        Returns:
+            List[List[float]]: One embedding per query
+        """
+        embeddings = [self._cache_get(query) for query in queries]
+        missing = list(dict.fromkeys(query for query, embedding in zip(queries, embeddings) if embedding is None))
+        computed = {}
+        for i in range(0, len(missing), self._max_batch_size):
+            batch = missing[i:i + self._max_batch_size]
+            computed.update(zip(batch, self._embed_queries(batch)))
+        for query, embedding in computed.items():
+            self._cache_put(query, embedding)
+        return [embedding if embedding is not None else computed[query] for query, embedding in zip(queries, embeddings)]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._inner._get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._inner._get_text_embeddings(texts)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await self._inner._aget_text_embedding(text)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self._inner._aget_text_embeddings(texts)
+
+    def _embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # One API call for the whole batch of queries
+        if len(texts) == 1:
+            self._count_api_call(1)
+            return [self._inner.get_query_embedding(texts[0])]
+        client = getattr(self._inner, "_client", None)
+        if client is not None and hasattr(client, "embeddings") and hasattr(self._inner, "truncate"):
+            # NVIDIAEmbedding only batches passages: send the queries through its OpenAI-compatible client with
+            # input_type="query", as its single-query method does
+            embeddings = []
+            for i in range(0, len(texts), NVIDIA_MAX_BATCH_SIZE):
+                batch = texts[i:i + NVIDIA_MAX_BATCH_SIZE]
+                self._count_api_call(len(batch))
+                data = client.embeddings.create(
+                    input=batch, model=self._inner.model, extra_body={"input_type": "query", "truncate": self._inner.truncate}
+                ).data
+                embeddings.extend(item.embedding for item in data)
+            return embeddings
+        if self._symmetric:
+            self._count_api_call(len(texts))
+            return self._inner.get_text_embedding_batch(texts)
+        embeddings = []
+        for text in texts:
+            self._count_api_call(1)
+            embeddings.append(self._inner.get_query_embedding(text))
+        return embeddings
+
+    def _count_api_call(self, num_queries: int):
+        with self._cache_lock:
+            self._counters["api_calls"] += 1
+            self._counters["queries_embedded"] += num_queries
+
+    def _cache_get(self, text: str) -> Optional[List[float]]:
+        if self._max_entries <= 0:
+            return None
+        key = (self.model_name, text)
+        with self._cache_lock:
+            embedding = self._cache.get(key)
+            if embedding is None:
+                self._counters["misses"] += 1
+            else:
+                self._cache.move_to_end(key)
+                self._counters["hits"] += 1
+            return embedding
+
+    def _cache_put(self, text: str, embedding: List[float]):
+        if self._max_entries <= 0:
+            return
+        with self._cache_lock:
+            self._cache[(self.model_name, text)] = embedding
+            self._cache.move_to_end((self.model_name, text))
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            return {
+                "entries": len(self._cache),
+                "max_entries": self._max_entries,
+                "batching": self._batcher is not None,
+                **self._counters,
+            }
+
+    def save(self, path: Optional[str] = None):
+        """Persists the cache as JSON to path (defaults to the configured cache path)"""
+        path = path or self._cache_path
+        if not path:
+            return
+        with self._cache_lock:
+            entries = [[model_name, text, embedding] for (model_name, text), embedding in self._cache.items()]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str):
+        """Loads a cache previously written by `save`"""
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not load embedding cache from {path}: {e}")
+            return
+        with self._cache_lock:
+            for model_name, text, embedding in entries[-self._max_entries:] if self._max_entries > 0 else []:
+                self._cache[(model_name, text)] = embedding
@@ -1,208 +1,341 @@
 from dotenv import load_dotenv
-from typing import List
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import hashlib
+import json
 import os
-import PyPDF2
-from io import BytesIO
-import torch
-from llama_index.embeddings.nvidia import NVIDIAEmbedding
-from llama_index.core.node_parser import SemanticSplitterNodeParser, SentenceSplitter
-from llama_index.core import VectorStoreIndex, StorageContext, Document
-from llama_index.core.schema import BaseNode
-from llama_index.vector_stores.milvus import MilvusVectorStore
+import threading
+import time
+from llama_index.core import Document
+from llama_index.core.schema import BaseNode, MetadataMode, TextNode
+
+from minio.deleteobjects import DeleteObject
+from pymilvus import Collection
+
+from FastAPI.clients import clients, milvus_uri
+from FastAPI.chunking import CHUNKING_STRATEGIES, semantic_chunks, sentence_chunks
+from FastAPI.ingest import PipelineStage, StreamingPipeline
+from FastAPI.lexical import BM25Index
+from FastAPI.local_store import LocalVectorStore, vector_store_backend
+from FastAPI.metrics import metrics
+from FastAPI.milvus_index import (
+    TENANT_FIELD, CompactionScheduler, consistency_level, default_tenant, ensure_collection, fetch_embeddings,
+    file_names_with_prefix, has_tenants, in_expression, indexed_file_names, tenant_expression,
+)
+from FastAPI.pdf_extraction import iter_pdf_pages, spool_object
 
-from minio import Minio
-from pymilvus import Collection, CollectionSchema, FieldSchema, DataType, connections, utility
 
-from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
+load_dotenv()
 
+# Metadata stored with every chunk for incremental re-indexing, kept out of the embedded and prompted text
+FINGERPRINT_METADATA_KEYS = ["page_num", "page_hash", "content_hash"]
+EXCLUDED_METADATA_KEYS = FINGERPRINT_METADATA_KEYS + [TENANT_FIELD]
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _milvus_str(value: str) -> str:
+    """Quotes a string for use in a Milvus boolean expression"""
+    return json.dumps(value)
 
-load_dotenv()
 
 class Indexing_Pipeline():
 
     """Pipeline for indexing the documents.
        Current implementation supports indexing the documents using NVIDIA and Azure OpenAI models.
 
+    Args:
+        chunk_size (int, optional): Maximum chunk size in tokens. Defaults to 512.
+        embedder (optional): Embedder to use instead of the shared one from the client registry.
+        embed_batch_size (Optional[int], optional): Chunks embedded per request. Defaults to EMBED_BATCH_SIZE or 32.
+        embed_max_in_flight (Optional[int], optional): Embedding requests in flight at once. Defaults to EMBED_MAX_IN_FLIGHT or 4.
+        insert_batch_size (Optional[int], optional): Vectors inserted into Milvus per request. Defaults to MILVUS_INSERT_BATCH_SIZE or 256.
+        lexical_index (Optional[BM25Index], optional): Lexical index kept in sync with the collection when enabled. Configured from the environment if not given.
+        chunking_strategy (Optional[str], optional): "sentence" (sentence splitting, no embedding calls), "semantic" (semantic
+            breakpoints between sentences) or "hybrid" (semantic breakpoints between short token windows). The semantic and
+            hybrid chunk vectors are derived from the embeddings used to find the breakpoints. Defaults to CHUNKING_STRATEGY or "semantic".
+
     """
 
-    def __init__(self, chunk_size:int = 512):
+    def __init__(self, chunk_size:int = 512, embedder=None, embed_batch_size: Optional[int] = None, chunking_strategy: Optional[str] = None,
+                 embed_max_in_flight: Optional[int] = None, insert_batch_size: Optional[int] = None, lexical_index: Optional[BM25Index] = None):
         self.chunk_size = chunk_size  
+        self.chunking_strategy = chunking_strategy or os.getenv("CHUNKING_STRATEGY", "semantic")
+        if self.chunking_strategy not in CHUNKING_STRATEGIES:
+            raise ValueError(f"Chunking strategy '{self.chunking_strategy}' not supported. Please choose one of {', '.join(CHUNKING_STRATEGIES)}.")
+        self.embed_batch_size = embed_batch_size or int(os.getenv("EMBED_BATCH_SIZE", 32))
+        self.embed_max_in_flight = embed_max_in_flight or int(os.getenv("EMBED_MAX_IN_FLIGHT", 4))
+        self.insert_batch_size = insert_batch_size or int(os.getenv("MILVUS_INSERT_BATCH_SIZE", 256))
+        self.chunk_workers = int(os.getenv("CHUNK_WORKERS", 2))
+        self.ingest_queue_size = int(os.getenv("INGEST_QUEUE_SIZE", 8))
         self.collection_name = os.getenv("MILVUS_COLLECTION_NAME", "test")
+        self.vector_store_backend = vector_store_backend()
         self.milvus_port = os.getenv("MILVUS_PORT", 19530)
         self.milvus_host_IP = os.getenv("MILVUS_HOST", "localhost")
         self.model_host = os.getenv("MODEL_HOST", "NVIDIA")
-        self.embedder = self.initialize_embedder()
+        # Taken from the client registry on first use, so that building the pipeline does not import the provider SDKs
+        self._embedder = embedder
         self.embedder_dims = os.getenv("EMBEDDING_MODEL_DIMS", 1024)
         self.minio_bucket = os.getenv("MINIO_BUCKET_NAME", "test")
-        self.minio_client = Minio(
-                                endpoint="localhost:9000",
-                                access_key='minioadmin',
-                                secret_key='minioadmin',
-                                secure=False  
-                            )
+        self.minio_client = clients.minio()
+        self.lexical_index = lexical_index if lexical_index is not None else BM25Index()
         self.milvus_store = None
+        self.multi_tenant = False
+        # Deleted rows are compacted in the background once they reach the MILVUS_COMPACTION_* thresholds
+        self.compaction = CompactionScheduler(get_collection=self._get_collection)
+        self._store_lock = threading.Lock()
+
+    def iter_documents(self, path:List[str], stats: Optional[Dict] = None) -> Iterator[Document]:
+        """Reads documents from the given path, yielding each page as soon as it is extracted
+
+        Each file is streamed from MinIO to a temporary file and its pages are extracted in parallel
+        (see `FastAPI.pdf_extraction.iter_pdf_pages`).
 
-    def read_document(self, path:List[str]) -> List[Document]:
+        Args:
+            path (List[str]): List of paths to the files (pdf)
+            stats (Optional[Dict]): If given, filled with the extraction stats of each file (pages/sec, peak RSS)
+
+        Yields:
+            Document: One document per page of the file with associated metadata
+        """
+        stats = {} if stats is None else stats
+
+        for file_path in path:
+            file_name = file_path.split("/")[-1]
+            if not file_name.endswith('.pdf'):
+                continue
+
+            # Fetch the file from MinIO
+            with metrics.timer("download"):
+                spooled_path = spool_object(self.minio_client, self.minio_bucket, file_name)
+            try:
+                file_stats = stats.setdefault(file_name, {})
+                for page_num, pdf_text in iter_pdf_pages(spooled_path, stats=file_stats):
+                    yield Document(text=pdf_text, metadata={"file_name": file_name, "page_num": page_num})
+                metrics.observe("rag_stage_seconds", file_stats["seconds"], pipeline="indexing", stage="extract")
+                peak_rss = file_stats["peak_rss_mb"]
+                worker_rss = f", extraction workers {peak_rss['worker_max']} MB" if "worker_max" in peak_rss else ""
+                print(f"Extracted {file_stats['pages']} pages from {file_name} at {file_stats['pages_per_s']} pages/s "
+                      f"(peak RSS {peak_rss['self']} MB{worker_rss})")
+            finally:
+                os.remove(spooled_path)
+
+    def read_document(self, path:List[str], stats: Optional[Dict] = None) -> List[Document]:
         """Reads documents from the given path
         
         Args:
             path (List[str]): List of paths to the files (pdf, docx)
+            stats (Optional[Dict]): If given, filled with the extraction stats of each file (pages/sec, peak RSS)
         
         Returns:
             List[Document]: List of documents (each document is a page of the file with associated metadata)
         
         """
-        documents = []
-
-        for file_path in path:
-            # Fetch the file from MinIO
-            file_name = file_path.split("/")[-1]
-            response = self.minio_client.get_object(self.minio_bucket, file_name)
-            file_content = response.read()  # Read the file as binary
-            
-            if file_name.endswith('.pdf'):
-                # Handle PDF files
-                pdf_stream = BytesIO(file_content)
-                pdf_reader = PyPDF2.PdfReader(pdf_stream)
-
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    pdf_text = page.extract_text() or ""
-
-                     # Sanitize the extracted text
-                    pdf_text = pdf_text.encode('utf-8', 'ignore').decode('utf-8', 'ignore')
+        return list(self.iter_documents(path, stats=stats))
+    
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = self.initialize_embedder()
+        return self._embedder
 
-                    documents.append(Document(text=pdf_text, metadata={"file_name": file_name, "page_num": page_num}))
+    @embedder.setter
+    def embedder(self, embedder):
+        self._embedder = embedder
 
-        return documents
-    
     def initialize_embedder(self):
         """
-        Initializes the embedder based on the model host (NVIDIA or Azure)
+        Returns the embedder of the model host (NVIDIA or Azure), shared through the client registry
         """
-
-        if self.model_host == "NVIDIA":
-            os.environ["NVIDIA_API_KEY"] = os.getenv("NVIDIA_API_KEY")
-            embedder = NVIDIAEmbedding(
-                model=os.getenv('EMBEDDING_MODEL'),
-                truncate="END")
-
-        elif self.model_host == "AZURE":
-            embedder = AzureOpenAIEmbedding(
-                model=os.getenv('EMBEDDING_MODEL'),
-                engine=os.getenv('EMBEDDING_MODEL'),
-                api_version=os.getenv('LLM_API_VERSION'),
-                azure_endpoint=os.getenv('LLM_ENDPOINT'),
-                api_key=os.getenv('LLM_API_KEY')
-            )
-
-        else:
-            raise Exception("Model host not supported. Please choose NVIDIA or AZURE.")    
-
-        return embedder
+        return clients.embedder()
 
     def chunk_document(self, documents:List[Document], chunk_size:int) -> List[BaseNode]:
-        """Chunks the document into smaller parts
+        """Chunks the document into smaller parts using the pipeline's chunking strategy
 
         Args:
             documents (List[Document]): List of documents
 
         Returns:
-            List[BaseNode]: List of chunks
+            List[BaseNode]: List of chunks (with embeddings already set for the semantic and hybrid strategies)
         """
-        base_splitter = SentenceSplitter(chunk_size=chunk_size) 
-        splitter = SemanticSplitterNodeParser(
-            buffer_size=1, breakpoint_percentile_threshold=95, embed_model=self.embedder, base_splitter=base_splitter
-        )
-        chunks = splitter.get_nodes_from_documents(documents)
-        print(f"Chunked the document into {len(chunks)} chunks")
-
+        with metrics.timer("chunk"):
+            if self.chunking_strategy == "sentence":
+                chunks = sentence_chunks(documents, chunk_size=chunk_size)
+            else:
+                chunks = semantic_chunks(
+                    documents,
+                    embedder=self.embedder,
+                    chunk_size=chunk_size,
+                    unit="sentence" if self.chunking_strategy == "semantic" else "window",
+                    buffer_size=1,
+                    breakpoint_percentile_threshold=95,
+                )
         return chunks
     
     def initialize_milvus_store(self, dim):
         """
-        Initializes the milvus store with the given vector dimensions
+        Initializes the milvus store with the given vector dimensions. The collection and its vector index
+        (MILVUS_INDEX_TYPE / MILVUS_INDEX_PARAMS) are created if they do not exist yet, and the collection is loaded.
+        With VECTOR_STORE_BACKEND=local, the chunks go to the collection's embedded vector store instead (see
+        `FastAPI.local_store`), created on the first insert.
 
         Args:
             dim (int): Dimension of the vectors
-            collection_name (str): Name of the collection
 
         Returns:
             str: Message indicating the status of the initialization
         
         """
         if self.milvus_store:
-            return f"Milvus store already initialized at {self.milvus_store.uri}, skipping initialization"
-        
-        connections.connect(host=self.milvus_host_IP, port=self.milvus_port)
-
-        # Check if the collection already exists
-        if utility.has_collection(self.collection_name):
-            print(f"Milvus collection '{self.collection_name}' already exists. Reusing the existing collection.")
-            self.milvus_store = MilvusVectorStore(
-                collection_name=self.collection_name,
-                uri=f"http://{self.milvus_host_IP}:{self.milvus_port}/",
-                overwrite=False  # Avoid overwriting the existing collection
-            )
-        else:
-            # Initialize a new collection if it does not exist
-            print(f"Milvus collection '{self.collection_name}' does not exist. Initializing a new collection.")
-
-            fields = [
-                FieldSchema(name="id", dtype=DataType.VARCHAR, is_primary=True, auto_id=False, max_length=65535),
-                FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=1024),
-                FieldSchema(name="file_name", dtype=DataType.VARCHAR, max_length=65535)
-                ]
-
-            # Define the collection schema
-            schema = CollectionSchema(fields=fields)
-            collection = Collection(name="test", schema=schema)
-            print("Collection 'test' created successfully.")
-
-            self.milvus_store = MilvusVectorStore(
-                dim=1024,
-                collection_name='test',
-                uri=f"http://{self.milvus_host_IP}:{self.milvus_port}/",
-                overwrite=True, 
-                consistency_level='Strong'
-            )
+            return f"Vector store of {self.collection_name} already initialized, skipping initialization"
+
+        local_store = self._local_store()
+        if local_store is not None:
+            self.milvus_store = local_store
+            # Every chunk of the local store records its tenant
+            self.multi_tenant = True
+            print(f"Initialized local vector store at {local_store.path} with {dim} dimensions")
+            return
         
-            print (f"Initialized Milvus store at {self.milvus_store.uri} with {self.milvus_store.dim} dimensions and file_name fields")
+        collection = ensure_collection(self.collection_name, dim=dim, using=clients.milvus())
+        self.multi_tenant = has_tenants(collection)
+
+        # The collection is managed by ensure_collection, the store only reads and writes it
+        self.milvus_store = clients.milvus_store(
+            self.collection_name,
+            dim=dim,
+            uri=milvus_uri(),
+            overwrite=False,
+            consistency_level=consistency_level(),
+        )
 
-            return
+        print (f"Initialized Milvus store at {self.milvus_store.uri} with {dim} dimensions")
         
    
-    def reset_milvus_store(self):
+    def reset_milvus_store(self, tenant: Optional[str] = None):
         """
-        Resets the milvus store by dropping the collection and recreating empty collection
+        Resets the milvus store by dropping the collection and recreating empty collection. When a tenant is
+        given, only that tenant's chunks are deleted from the collection.
         """
-        connections.connect(host=self.milvus_host_IP, port=self.milvus_port)
-
         try:
-            collection = Collection(name=self.milvus_store.collection_name)
-            collection.drop()
-            print(f"Deleted {self.milvus_store.collection_name} from milvus store, please re-run the indexing pipeline")
+            collection = self._get_collection()
+            local = isinstance(collection, LocalVectorStore)
+            if tenant is not None and (local or has_tenants(collection)):
+                if local:
+                    self.compaction.record_deletes(collection.delete_where(tenant=tenant))
+                else:
+                    self.compaction.record_deletes(collection.delete(tenant_expression(tenant)).delete_count)
+                if self.lexical_index.enabled:
+                    self.lexical_index.remove_tenant(tenant)
+                    self.lexical_index.save()
+                print(f"Deleted the chunks of tenant '{tenant}' from {self.collection_name}")
+                return
+
+            if local:
+                collection.clear()
+            else:
+                collection.drop()
+            print(f"Deleted {self.collection_name} from milvus store, please re-run the indexing pipeline")
+            clients.release_milvus_stores(self.collection_name)
             self.milvus_store = None
+            if self.lexical_index.enabled:
+                self.lexical_index.clear()
+                self.lexical_index.save()
 
         except Exception as e:
             print(f"Error deleting collection: {e}")
 
 
-    def delete_milvus_indexes_using_filename(self, filename: str):
+    def delete_documents(self, file_names: Optional[List[str]] = None, prefix: Optional[str] = None,
+                         tenant: Optional[str] = None, remove_objects: bool = True) -> Dict:
         """
-        Deletes the indexes from the Milvus store based on the filename metadata
+        Deletes documents from the Milvus store and the lexical index with one delete expression for all the files,
+        and removes their files from MinIO. The deleted rows are compacted later by the compaction scheduler.
+        The MinIO bucket is shared by all tenants, so files another tenant still has indexed are kept in MinIO.
+
+        Args:
+            file_names (Optional[List[str]]): Names of the files to delete
+            prefix (Optional[str]): Deletes every file whose name starts with the prefix
+            tenant (Optional[str]): Tenant whose chunks are deleted. Defaults to DEFAULT_TENANT.
+            remove_objects (bool): Also removes the files from MinIO, except those still indexed by another tenant
+
+        Returns:
+            Dict: Deleted file names, number of chunks and objects deleted, and the time spent in Milvus, the lexical
+                index and MinIO
+        """
+        if not file_names and not prefix:
+            raise ValueError("Please give the file names or the prefix of the documents to delete.")
+
+        start = time.perf_counter()
+        tenant = tenant or default_tenant()
+        file_names = set(file_names or [])
+        timings = {}
+
+        collection = self._get_collection()
+        chunks_deleted = 0
+        if isinstance(collection, LocalVectorStore):
+            if prefix:
+                file_names.update(collection.file_names(prefix, tenant=tenant))
+            if file_names:
+                chunks_deleted = collection.delete_where(file_names=file_names, tenant=tenant)
+        else:
+            tenant_expr = tenant_expression(tenant) if has_tenants(collection) else None
+            if prefix:
+                file_names.update(file_names_with_prefix(collection, prefix, tenant_expr, consistency_level="Strong"))
+            if file_names:
+                expr = in_expression("file_name", sorted(file_names))
+                chunks_deleted = collection.delete(f"{tenant_expr} and {expr}" if tenant_expr else expr).delete_count
+        self.compaction.record_deletes(chunks_deleted)
+        timings["milvus_ms"] = _elapsed_ms(start)
+
+        if self.lexical_index.enabled and file_names:
+            lexical_start = time.perf_counter()
+            self.lexical_index.remove_files(file_names, tenant=tenant)
+            self.lexical_index.save()
+            timings["lexical_ms"] = _elapsed_ms(lexical_start)
+
+        objects_deleted, objects_kept = 0, []
+        if remove_objects:
+            minio_start = time.perf_counter()
+            object_names = set(file_names)
+            if prefix:
+                object_names.update(obj.object_name for obj in self.minio_client.list_objects(self.minio_bucket, prefix=prefix, recursive=True))
+            # The chunks of this tenant are gone: any file still indexed is another tenant's document
+            if isinstance(collection, LocalVectorStore):
+                objects_kept = sorted(object_names.intersection(collection.file_names()))
+            elif object_names:
+                objects_kept = indexed_file_names(collection, object_names, consistency_level="Strong")
+            object_names.difference_update(objects_kept)
+            # One multi-object delete request per 1000 objects; the errors are returned lazily
+            errors = list(self.minio_client.remove_objects(self.minio_bucket, (DeleteObject(name) for name in sorted(object_names))))
+            for error in errors:
+                print(f"Error deleting {error.name} from MinIO: {error.message}")
+            objects_deleted = len(object_names) - len(errors)
+            timings["minio_ms"] = _elapsed_ms(minio_start)
+
+        timings["total_ms"] = _elapsed_ms(start)
+        print(f"Deleted {len(file_names)} documents ({chunks_deleted} chunks, {objects_deleted} objects) in {timings['total_ms']} ms")
+        return {
+            "file_names": sorted(file_names),
+            "chunks_deleted": chunks_deleted,
+            "objects_deleted": objects_deleted,
+            "objects_kept": objects_kept,
+            "pending_compaction_deletes": self.compaction.stats()["pending_deletes"],
+            "timings": timings,
+        }
+
+    def delete_milvus_indexes_using_filename(self, filename: str, tenant: Optional[str] = None):
+        """
+        Deletes the indexes from the Milvus store based on the filename metadata, among the chunks of the
+        tenant (DEFAULT_TENANT if not given) so the delete only touches that tenant's partition
         """
-        connections.connect(host=self.milvus_host_IP, port=self.milvus_port)
-        
         try:
-            # Initialize the collection
-            collection = Collection(name=self.collection_name)
-            
-            # Use a filter expression to delete all entries with the specific filename metadata
-            expr = f"file_name == '{filename}'"
-            collection.delete(expr)
-            collection.compact()
-        
+            self.delete_documents([filename], tenant=tenant, remove_objects=False)
             print(f"Deleted indexes for {filename} from Milvus store")
             
             # Success message for FastAPI response
@@ -212,39 +345,276 @@ class Indexing_Pipeline():
             print("Error deleting from Milvus:", e)
             return {"status": "error", "message": str(e)}
         
-    def run(self, path: List[str]) -> VectorStoreIndex:
-        """
-        Runs the indexing pipeline to index the documents
+    def _local_store(self) -> Optional[LocalVectorStore]:
+        """The collection's embedded vector store with VECTOR_STORE_BACKEND=local, else None"""
+        return clients.local_store(self.collection_name) if self.vector_store_backend == "local" else None
 
-        Args:
-            path (List[str]): List of paths to the files (pdf)
+    def _get_collection(self) -> Union[Collection, LocalVectorStore]:
+        # The local store also provides the num_entities / compact used by the compaction scheduler
+        local_store = self._local_store()
+        return local_store if local_store is not None else Collection(name=self.collection_name, using=clients.milvus())
 
-        Returns:
-            VectorStoreIndex: VectorStoreIndex object containing the indexed documents
+    def _fetch_indexed_chunks(self, file_name: str, tenant: str) -> Dict[str, Tuple[Optional[int], Optional[str]]]:
         """
-        documents = self.read_document(path)
-        chunks = self.chunk_document(documents, chunk_size=self.chunk_size)
-
-        # Initialize Milvus store based on the embedding model
-        if not self.milvus_store:
-            self.initialize_milvus_store(dim=int(self.embedder_dims))
-
-        # Initialize storage context with Milvus vector store
-        storage_context = StorageContext.from_defaults(vector_store=self.milvus_store)
-
-        # Add documents (or chunks) to the index
-        index = VectorStoreIndex.from_documents(
-            [Document(text=chunk.text, metadata={"file_name": chunk.metadata["file_name"]}) for chunk in chunks],
-            storage_context=storage_context,
-            embed_model=self.embedder
+        Returns {chunk id: (page_num, page_hash)} of the chunks already indexed for the file of the tenant
+        """
+        collection = self._get_collection()
+        if isinstance(collection, LocalVectorStore):
+            return collection.indexed_chunks(file_name, tenant)
+        expr = f"file_name == {_milvus_str(file_name)}"
+        if self.multi_tenant:
+            expr = f"{tenant_expression(tenant)} and {expr}"
+        iterator = collection.query_iterator(
+            batch_size=1000,
+            expr=expr,
+            output_fields=["id", "page_num", "page_hash"],
+            # Re-indexing must see every chunk written so far, whatever the read consistency level
+            consistency_level="Strong",
         )
+        indexed = {}
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                for row in rows:
+                    indexed[row["id"]] = (row.get("page_num"), row.get("page_hash"))
+        finally:
+            iterator.close()
+
+        return indexed
+
+    def _fetch_embeddings(self, ids: List[str]) -> Dict[str, List[float]]:
+        collection = self._get_collection()
+        if isinstance(collection, LocalVectorStore):
+            return collection.fetch_embeddings(ids)
+        return fetch_embeddings(collection, ids, consistency_level="Strong")
+
+    def _delete_ids(self, ids: Iterable[str]):
+        ids = list(ids)
+        collection = self._get_collection()
+        if isinstance(collection, LocalVectorStore):
+            self.compaction.record_deletes(collection.delete_ids(ids))
+            return
+        for i in range(0, len(ids), 1000):
+            collection.delete(in_expression("id", ids[i:i + 1000]))
+        self.compaction.record_deletes(len(ids))
+
+    @staticmethod
+    def _build_nodes(chunks: List[BaseNode], tenant: Optional[str] = None) -> List[TextNode]:
+        """Builds the nodes to store with ids derived from the tenant, file, page and chunk content, so re-indexing
+        the same content yields the same ids"""
+        tenant = tenant or default_tenant()
+        # The default tenant keeps the ids of the chunks indexed before tenants
+        id_prefix = "" if tenant == default_tenant() else f"{tenant}\0"
+        nodes = []
+        occurrences = {}
+        for chunk in chunks:
+            file_name, page_num = chunk.metadata["file_name"], chunk.metadata["page_num"]
+            content_hash = _content_hash(chunk.text)
+            occurrence = occurrences.get((page_num, content_hash), 0)
+            occurrences[(page_num, content_hash)] = occurrence + 1
+
+            nodes.append(TextNode(
+                id_=_content_hash(f"{id_prefix}{file_name}\0{page_num}\0{content_hash}\0{occurrence}"),
+                text=chunk.text,
+                embedding=chunk.embedding,
+                metadata={
+                    "file_name": file_name,
+                    "page_num": page_num,
+                    "page_hash": chunk.metadata["page_hash"],
+                    "content_hash": content_hash,
+                    TENANT_FIELD: tenant,
+                },
+                excluded_embed_metadata_keys=EXCLUDED_METADATA_KEYS,
+                excluded_llm_metadata_keys=EXCLUDED_METADATA_KEYS,
+            ))
+        return nodes
+
+    def embed_nodes(self, nodes: List[BaseNode]):
+        """
+        Embeds the nodes that do not have an embedding yet (the semantic and hybrid chunking strategies already set one)
+        """
+        missing = [node for node in nodes if node.embedding is None]
+        if not missing:
+            return
+        with metrics.timer("embed"):
+            embeddings = self.embedder.get_text_embedding_batch(
+                [node.get_content(metadata_mode=MetadataMode.EMBED) for node in missing]
+            )
+        for node, embedding in zip(missing, embeddings):
+            node.embedding = embedding
 
-        print(f"Indexed {len(chunks)} chunks into Milvus.")
-        return index
+    def _page_nodes(self, document: Document, state: Dict) -> List[TextNode]:
+        """
+        Chunk stage of the ingest pipeline: returns the nodes of one page, or nothing if the page is unchanged
+        since it was last indexed
+        """
+        document.metadata["page_hash"] = _content_hash(document.text)
+        page_key = (document.metadata["page_num"], document.metadata["page_hash"])
+        if page_key in state["indexed_pages"]:
+            with state["lock"]:
+                state["unchanged_pages"].add(page_key)
+            return []
+
+        nodes = self._build_nodes(self.chunk_document([document], chunk_size=self.chunk_size), tenant=state["tenant"])
+        with state["lock"]:
+            state["node_ids"].update(node.id_ for node in nodes)
+        return nodes
+
+    def _embed_batch(self, nodes: List[TextNode], states: Dict[str, Dict], progress: Callable[[str, int], None]) -> List[TextNode]:
+        """
+        Embed stage of the ingest pipeline. Chunks whose content is already indexed reuse their stored vectors
+        (only their page_hash is rewritten, by the insert stage), the others are embedded. Chunks whose vector is
+        no longer found (e.g. deleted meanwhile) are embedded again.
+        """
+        carried_nodes, new_nodes = [], []
+        for node in nodes:
+            state = states[node.metadata["file_name"]]
+            (carried_nodes if node.id_ in state["indexed"] else new_nodes).append(node)
+
+        if carried_nodes:
+            embeddings = self._fetch_embeddings([node.id_ for node in carried_nodes])
+            found = []
+            for node in carried_nodes:
+                if node.id_ in embeddings:
+                    node.embedding = embeddings[node.id_]
+                    found.append(node)
+                else:
+                    new_nodes.append(node)
+            carried_nodes = found
+        self.embed_nodes(new_nodes)
+
+        for node_list, counter in ((carried_nodes, "chunks_carried"), (new_nodes, "chunks_added")):
+            for node in node_list:
+                state = states[node.metadata["file_name"]]
+                with state["lock"]:
+                    state[counter] += 1
+        if new_nodes:
+            progress("chunks_embedded", len(new_nodes))
+        return nodes
+
+    def _insert_batch(self, nodes: List[TextNode], states: Dict[str, Dict], progress: Callable[[str, int], None]):
+        """
+        Insert stage of the ingest pipeline. The stored rows of reused chunks are only replaced here, right before
+        their new rows are added, so a run failing earlier leaves them in place.
+        """
+        with metrics.timer("milvus_insert"):
+            if self._local_store() is None:
+                # The local store upserts on add, Milvus needs the old rows deleted first
+                carried_ids = [node.id_ for node in nodes if node.id_ in states[node.metadata["file_name"]]["indexed"]]
+                if carried_ids:
+                    self._delete_ids(carried_ids)
+            self.milvus_store.add(nodes)
+        if self.lexical_index.enabled:
+            self.lexical_index.add(nodes)
+        progress("vectors_written", len(nodes))
+
+    def run(self, path: List[str], progress: Optional[Callable[[str, int], None]] = None, tenant: Optional[str] = None) -> Dict:
+        """
+        Runs the indexing pipeline to index the documents. Re-indexing a file only embeds and inserts the chunks
+        that are new or changed, and deletes the chunks that are no longer in the file.
 
+        Extraction, chunking, embedding and Milvus inserts run as the stages of a `StreamingPipeline`, so pages are
+        chunked and embedded while the rest of the file is still being extracted, and the run takes about as long
+        as its slowest stage.
 
+        Args:
+            path (List[str]): List of paths to the files (pdf)
+            progress (Optional[Callable[[str, int], None]]): Called as progress(field, count) when pages are parsed
+                ("pages_parsed"), chunks are embedded ("chunks_embedded") and vectors are written ("vectors_written")
+            tenant (Optional[str]): Tenant the documents belong to. Defaults to DEFAULT_TENANT.
 
+        Returns:
+            Dict: Summary of the run (pages parsed, chunks reused, added and removed, and the per-stage metrics)
+        """
+        progress = progress or (lambda field, count: None)
 
+        # Initialize Milvus store based on the embedding model (the pipeline may be shared by concurrent jobs)
+        with self._store_lock:
+            if not self.milvus_store:
+                self.initialize_milvus_store(dim=int(self.embedder_dims))
 
-        
+        tenant = tenant or default_tenant()
+        if not self.multi_tenant and tenant != default_tenant():
+            raise ValueError(f"Milvus collection '{self.collection_name}' was created without tenants, only the default tenant can index into it.")
 
+        states = {}
+        for file_path in path:
+            file_name = file_path.split("/")[-1]
+            if file_name.endswith('.pdf') and file_name not in states:
+                indexed = self._fetch_indexed_chunks(file_name, tenant)
+                indexed_pages = set(indexed.values())
+                if self.lexical_index.enabled:
+                    # Pages indexed before the lexical index was enabled are re-chunked so their chunks get added to it
+                    indexed_pages -= {page_key for id_, page_key in indexed.items() if id_ not in self.lexical_index}
+                states[file_name] = {
+                    "tenant": tenant,
+                    "indexed": indexed,
+                    "indexed_pages": indexed_pages,
+                    "unchanged_pages": set(),
+                    "node_ids": set(),
+                    "chunks_carried": 0,
+                    "chunks_added": 0,
+                    "pages": 0,
+                    "lock": threading.Lock(),
+                }
+
+        extraction_stats = {}
+
+        def pages() -> Iterator[Document]:
+            for document in self.iter_documents(path, stats=extraction_stats):
+                states[document.metadata["file_name"]]["pages"] += 1
+                progress("pages_parsed", 1)
+                yield document
+
+        pipeline = StreamingPipeline(
+            stages=[
+                PipelineStage(
+                    "chunk",
+                    lambda document: self._page_nodes(document, states[document.metadata["file_name"]]),
+                    workers=self.chunk_workers,
+                ),
+                PipelineStage(
+                    "embed",
+                    lambda nodes: self._embed_batch(nodes, states, progress),
+                    workers=self.embed_max_in_flight,
+                    batch_size=self.embed_batch_size,
+                ),
+                PipelineStage(
+                    "insert",
+                    lambda nodes: self._insert_batch(nodes, states, progress),
+                    batch_size=self.insert_batch_size,
+                ),
+            ],
+            queue_size=self.ingest_queue_size,
+        )
+        stage_metrics = pipeline.run(pages(), source_name="extract")
+
+        summary = {"file_names": [], "pages": 0, "pages_reused": 0, "chunks_reused": 0, "chunks_added": 0, "chunks_removed": 0}
+        for file_name, state in states.items():
+            # Chunks that are neither on an unchanged page nor produced by a changed page are no longer in the file
+            kept_ids = {id_ for id_, page_key in state["indexed"].items() if page_key in state["unchanged_pages"]}
+            removed_ids = set(state["indexed"]) - kept_ids - state["node_ids"]
+            if removed_ids:
+                self._delete_ids(removed_ids)
+                if self.lexical_index.enabled:
+                    self.lexical_index.remove_ids(removed_ids)
+
+            print(f"Indexed {file_name}: {len(state['unchanged_pages'])} unchanged pages skipped, "
+                  f"{len(kept_ids) + state['chunks_carried']} chunks reused, {state['chunks_added']} added, {len(removed_ids)} removed")
+            summary["file_names"].append(file_name)
+            summary["pages"] += state["pages"]
+            summary["pages_reused"] += len(state["unchanged_pages"])
+            summary["chunks_reused"] += len(kept_ids) + state["chunks_carried"]
+            summary["chunks_added"] += state["chunks_added"]
+            summary["chunks_removed"] += len(removed_ids)
+
+        if self.lexical_index.enabled:
+            self.lexical_index.save()
+
+        summary["vectors_written"] = summary["chunks_added"]
+        summary["extraction"] = extraction_stats
+        summary["stages"] = stage_metrics
+        metrics.record_indexing(summary)
+        return summary
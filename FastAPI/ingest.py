@@ -0,0 +1,208 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import queue
+import threading
+import time
+
+
+_DONE = object()
+
+
+class PipelineStage():
+
+    """One stage of a `StreamingPipeline`.
+
+    Args:
+        name (str): Stage name used in the metrics
+        fn (Callable[[Any], Optional[Iterable[Any]]]): Processes one input (or one batch of inputs when batch_size is set)
+            and returns the outputs to pass on to the next stage (None for the last stage)
+        workers (int): Number of threads running the stage
+        batch_size (Optional[int]): If set, inputs are grouped into lists of up to batch_size before fn is called
+
+    """
+
+    def __init__(self, name: str, fn: Callable[[Any], Optional[Iterable[Any]]], workers: int = 1, batch_size: Optional[int] = None):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+
+
+class _StageMetrics():
+
+    def __init__(self):
+        self.items_in = 0
+        self.items_out = 0
+        self.calls = 0
+        self.busy_s = 0.0
+        self.first_start = None
+        self.last_end = None
+        self.max_queue_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+        self._lock = threading.Lock()
+
+    def record_call(self, items_in: int, items_out: int, start: float, end: float):
+        with self._lock:
+            self.items_in += items_in
+            self.items_out += items_out
+            self.calls += 1
+            self.busy_s += end - start
+            self.first_start = start if self.first_start is None else min(self.first_start, start)
+            self.last_end = end if self.last_end is None else max(self.last_end, end)
+
+    def record_depth(self, depth: int):
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+            self._depth_total += depth
+            self._depth_samples += 1
+
+    def to_dict(self) -> Dict[str, float]:
+        active_s = (self.last_end - self.first_start) if self.first_start is not None else 0.0
+        return {
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "calls": self.calls,
+            "busy_s": round(self.busy_s, 3),
+            "active_s": round(active_s, 3),
+            "items_per_s": round(self.items_in / active_s, 2) if active_s else 0.0,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_queue_depth": round(self._depth_total / self._depth_samples, 2) if self._depth_samples else 0.0,
+        }
+
+
+class StreamingPipeline():
+
+    """Runs a source iterator and a chain of stages concurrently, connected by bounded queues.
+
+       Each stage runs in its own thread(s), so e.g. PDF extraction, chunking, embedding and vector inserts overlap and
+       the whole run takes about as long as its slowest stage. The bounded queues apply back-pressure so a fast stage
+       cannot run far ahead of a slow one. If any stage fails, the pipeline stops and the error is re-raised by `run`.
+
+    Args:
+        stages (List[PipelineStage]): Stages in order, the first one consumes the source items
+        queue_size (int): Maximum number of items waiting in front of each stage
+
+    """
+
+    def __init__(self, stages: List[PipelineStage], queue_size: int = 8):
+        self.stages = stages
+        self.queue_size = queue_size
+
+    def run(self, source: Iterable[Any], source_name: str = "source") -> Dict[str, Dict[str, float]]:
+        """Runs the pipeline until the source is exhausted and every stage has drained its queue
+
+        Args:
+            source (Iterable[Any]): Items fed to the first stage
+            source_name (str): Name of the source in the metrics
+
+        Returns:
+            Dict[str, Dict[str, float]]: Metrics per stage (throughput, busy time, queue depths) plus the total wall time
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        metrics = {source_name: _StageMetrics(), **{stage.name: _StageMetrics() for stage in self.stages}}
+        stop = threading.Event()
+        errors = []
+        start = time.perf_counter()
+
+        def put(q: queue.Queue, item, stage_metrics: Optional[_StageMetrics] = None):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    if stage_metrics is not None:
+                        stage_metrics.record_depth(q.qsize())
+                    return
+                except queue.Full:
+                    continue
+
+        def get(q: queue.Queue):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _DONE
+
+        def fail(e: Exception):
+            errors.append(e)
+            stop.set()
+
+        def run_source():
+            source_metrics = metrics[source_name]
+            iterator = iter(source)
+            try:
+                while not stop.is_set():
+                    item_start = time.perf_counter()
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        break
+                    source_metrics.record_call(1, 1, item_start, time.perf_counter())
+                    put(queues[0], item, metrics[self.stages[0].name])
+            except Exception as e:
+                fail(e)
+            finally:
+                # Closing the source lets generators clean up (e.g. remove spooled files) if the run stopped early
+                if hasattr(iterator, "close"):
+                    iterator.close()
+                put(queues[0], _DONE)
+
+        def run_stage(index: int, finished: List[int], finished_lock: threading.Lock):
+            stage = self.stages[index]
+            stage_metrics = metrics[stage.name]
+            in_queue = queues[index]
+            out_queue = queues[index + 1] if index + 1 < len(queues) else None
+            next_metrics = metrics[self.stages[index + 1].name] if out_queue is not None else None
+            batch = []
+
+            def process(item, items_in: int):
+                call_start = time.perf_counter()
+                outputs = list(stage.fn(item) or [])
+                stage_metrics.record_call(items_in, len(outputs), call_start, time.perf_counter())
+                if out_queue is not None:
+                    for output in outputs:
+                        put(out_queue, output, next_metrics)
+
+            try:
+                while not stop.is_set():
+                    item = get(in_queue)
+                    if item is _DONE:
+                        # Let the sibling workers of this stage see the end of the input too
+                        put(in_queue, _DONE)
+                        break
+                    if stage.batch_size:
+                        batch.append(item)
+                        if len(batch) >= stage.batch_size:
+                            process(batch, len(batch))
+                            batch = []
+                    else:
+                        process(item, 1)
+                if batch and not stop.is_set():
+                    process(batch, len(batch))
+            except Exception as e:
+                fail(e)
+            finally:
+                with finished_lock:
+                    finished[0] += 1
+                    last_worker = finished[0] == stage.workers
+                if last_worker and out_queue is not None:
+                    put(out_queue, _DONE)
+
+        threads = [threading.Thread(target=run_source, name=f"ingest-{source_name}", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            finished, finished_lock = [0], threading.Lock()
+            for worker in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=run_stage, args=(index, finished, finished_lock), name=f"ingest-{stage.name}-{worker}", daemon=True
+                ))
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+        results = {name: stage_metrics.to_dict() for name, stage_metrics in metrics.items()}
+        results["wall_s"] = round(time.perf_counter() - start, 3)
+        return results
@@ -0,0 +1,143 @@
+from dotenv import load_dotenv
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import os
+import threading
+import time
+import uuid
+
+from FastAPI.concurrency import limiter
+
+
+load_dotenv()
+
+PROGRESS_FIELDS = ("pages_parsed", "chunks_embedded", "vectors_written")
+
+
+class IndexingJob():
+
+    """State of a single indexing job, updated by the worker thread and read by the status route."""
+
+    def __init__(self, file_name: str, tenant: Optional[str] = None):
+        self.job_id = uuid.uuid4().hex
+        self.file_name = file_name
+        self.tenant = tenant
+        self.status = "queued"
+        self.attempts = 0
+        self.progress = {field: 0 for field in PROGRESS_FIELDS}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def update_progress(self, field: str, count: int = 1):
+        """Adds count to one of the progress counters (pages_parsed, chunks_embedded, vectors_written)"""
+        with self._lock:
+            self.progress[field] = self.progress.get(field, 0) + count
+
+    def reset_progress(self):
+        with self._lock:
+            self.progress = {field: 0 for field in PROGRESS_FIELDS}
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "file_name": self.file_name,
+                "tenant": self.tenant,
+                "status": self.status,
+                "attempts": self.attempts,
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class IndexingJobQueue():
+
+    """Bounded worker pool running indexing jobs in the background.
+
+    Args:
+        run_fn (Callable): Called as run_fn(file_name, progress, tenant) in a worker thread. progress(field, count)
+            updates the job's progress counters. Its return value is stored as the job result.
+        max_workers (Optional[int]): Number of jobs indexed concurrently. Defaults to INDEXING_MAX_CONCURRENCY.
+        max_retries (Optional[int]): Retries after a failed attempt. Defaults to INDEXING_MAX_RETRIES or 2.
+        retry_backoff_s (Optional[float]): Base delay between retries, doubled after each attempt.
+            Defaults to INDEXING_RETRY_BACKOFF_S or 2.
+        max_history (Optional[int]): Number of finished jobs kept for status polling. Defaults to INDEXING_JOB_HISTORY or 1000.
+
+    """
+
+    def __init__(self, run_fn: Callable, max_workers: Optional[int] = None, max_retries: Optional[int] = None,
+                 retry_backoff_s: Optional[float] = None, max_history: Optional[int] = None):
+        self.run_fn = run_fn
+        self.max_workers = max_workers or limiter.limits["INDEXING"]
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("INDEXING_MAX_RETRIES", 2))
+        self.retry_backoff_s = retry_backoff_s if retry_backoff_s is not None else float(os.getenv("INDEXING_RETRY_BACKOFF_S", 2))
+        self.max_history = max_history or int(os.getenv("INDEXING_JOB_HISTORY", 1000))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="indexing")
+        self._jobs: "OrderedDict[str, IndexingJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, file_name: str, tenant: Optional[str] = None) -> IndexingJob:
+        """Queues a file for indexing and returns immediately
+
+        Args:
+            file_name (str): Name of the file in MinIO
+            tenant (Optional[str]): Tenant the file is indexed for
+
+        Returns:
+            IndexingJob: The queued job
+        """
+        job = IndexingJob(file_name, tenant)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._evict_finished()
+        self._executor.submit(self._run_job, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IndexingJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run_job(self, job: IndexingJob):
+        job.status = "running"
+        job.started_at = time.time()
+
+        while True:
+            job.attempts += 1
+            job.reset_progress()
+            try:
+                job.result = self.run_fn(job.file_name, job.update_progress, job.tenant)
+                job.status = "completed"
+                job.error = None
+                break
+
+            except Exception as e:
+                print(f"Error indexing {job.file_name} (attempt {job.attempts}): {e}")
+                job.error = str(e)
+                if job.attempts > self.max_retries:
+                    job.status = "failed"
+                    break
+                job.status = "retrying"
+                time.sleep(self.retry_backoff_s * 2 ** (job.attempts - 1))
+                job.status = "running"
+
+        job.finished_at = time.time()
+
+    def _evict_finished(self):
+        # Drop the oldest finished jobs once the history is full, never the ones still in flight
+        excess = len(self._jobs) - self.max_history
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at is not None][:excess]:
+            del self._jobs[job_id]
@@ -0,0 +1,453 @@
+from dotenv import load_dotenv
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import math
+import operator
+import os
+import re
+import threading
+
+import numpy as np
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import BaseNode, MetadataMode, NodeWithScore, QueryBundle, TextNode
+from llama_index.core.vector_stores import FilterCondition, FilterOperator, MetadataFilters
+
+from FastAPI.milvus_index import TENANT_FIELD, default_tenant
+
+
+load_dotenv()
+
+# Words, numbers and compounds such as "5-fluorouracil", "2.5mg" or "L01XE"; compounds are also indexed by their parts
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+_PART_RE = re.compile(r"[.\-/]")
+
+# Terms present in nearly every chunk add little to the ranking but have the longest postings
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have if in into is it its of on or that the their there these "
+    "this to was were which will with what when where who how".split()
+)
+
+_COMPARATORS = {
+    FilterOperator.EQ: operator.eq,
+    FilterOperator.NE: operator.ne,
+    FilterOperator.GT: operator.gt,
+    FilterOperator.GTE: operator.ge,
+    FilterOperator.LT: operator.lt,
+    FilterOperator.LTE: operator.le,
+    FilterOperator.IN: lambda value, values: value in values,
+    FilterOperator.NIN: lambda value, values: value not in values,
+}
+
+# Lexical searches are local and sub-millisecond, a couple of threads is enough to overlap them with Milvus searches
+_search_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="lexical-search")
+
+
+def matches_filters(metadata: Dict, filters: Optional[MetadataFilters]) -> bool:
+    """Evaluates metadata filters (see `FastAPI.milvus_index.metadata_filters`) on a chunk's metadata, as Milvus does"""
+    if filters is None:
+        return True
+    results = (
+        f.key in metadata and _COMPARATORS[f.operator](metadata[f.key], f.value)
+        for f in filters.filters
+    )
+    return any(results) if filters.condition == FilterCondition.OR else all(results)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms of a text without stop words, used both for indexing and for queries"""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in STOP_WORDS:
+            continue
+        tokens.append(token)
+        if _PART_RE.search(token):
+            tokens.extend(part for part in _PART_RE.split(token) if part)
+    return tokens
+
+
+class BM25Index():
+
+    """In-process BM25 index over the indexed chunks, used next to the Milvus search for exact terms
+       (drug names, dosages, codes) that embeddings tend to miss.
+
+       Postings are stored compactly as one pair of uint32 arrays (document numbers, term frequencies) per term,
+       and queries are scored with vectorized NumPy over the postings of the query terms only. Removed chunks are
+       tombstoned and dropped from the postings once they make up half of the index (and on `save`). The chunk
+       text and metadata are kept so lexical hits can be returned without a round trip to Milvus.
+
+    Args:
+        enabled (Optional[bool]): Builds and searches the index. Defaults to LEXICAL_INDEX or false.
+        path (Optional[str]): File the index is persisted to. Defaults to LEXICAL_INDEX_PATH or lexical_index.npz.
+        k1 (float): BM25 term frequency saturation
+        b (float): BM25 length normalization
+
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.enabled = enabled if enabled is not None else os.getenv("LEXICAL_INDEX", "false").lower() == "true"
+        self.path = path or os.getenv("LEXICAL_INDEX_PATH", "lexical_index.npz")
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self.clear()
+        if self.enabled and os.path.exists(self.path):
+            self.load(self.path)
+
+    def clear(self):
+        """Removes every chunk from the index"""
+        with self._lock:
+            self._terms: Dict[str, int] = {}
+            self._postings_docs: List[array] = []
+            self._postings_tfs: List[array] = []
+            self._df: List[int] = []
+            # Per document number: chunk id, text, metadata, excluded metadata keys, length, unique term ids, alive flag
+            self._node_ids: List[str] = []
+            self._texts: List[Optional[str]] = []
+            self._metadata: List[Optional[Dict]] = []
+            self._excluded: List[Tuple[str, ...]] = []
+            self._lengths = array("I")
+            self._doc_terms: List[Optional[array]] = []
+            self._alive = bytearray()
+            self._doc_numbers: Dict[str, int] = {}
+            self._total_length = 0
+            # BM25 length normalization per document, recomputed lazily after the index changes
+            self._norms: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._doc_numbers)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._doc_numbers
+
+    def add(self, nodes: Iterable[BaseNode]):
+        """Indexes the nodes, replacing the chunks already indexed with the same ids"""
+        with self._lock:
+            for node in nodes:
+                self._remove(node.node_id)
+                text = node.get_content(metadata_mode=MetadataMode.NONE)
+                term_counts = Counter(tokenize(text))
+
+                doc = len(self._node_ids)
+                term_ids = array("I")
+                for term, count in term_counts.items():
+                    term_id = self._terms.get(term)
+                    if term_id is None:
+                        term_id = self._terms[term] = len(self._postings_docs)
+                        self._postings_docs.append(array("I"))
+                        self._postings_tfs.append(array("I"))
+                        self._df.append(0)
+                    self._postings_docs[term_id].append(doc)
+                    self._postings_tfs[term_id].append(count)
+                    self._df[term_id] += 1
+                    term_ids.append(term_id)
+
+                length = sum(term_counts.values())
+                self._node_ids.append(node.node_id)
+                self._texts.append(text)
+                self._metadata.append(dict(node.metadata))
+                self._excluded.append(tuple(node.excluded_llm_metadata_keys))
+                self._lengths.append(length)
+                self._doc_terms.append(term_ids)
+                self._alive.append(1)
+                self._doc_numbers[node.node_id] = doc
+                self._total_length += length
+            self._norms = None
+            self._maybe_compact()
+
+    def remove_ids(self, node_ids: Iterable[str]):
+        """Removes the chunks with the given ids"""
+        with self._lock:
+            for node_id in node_ids:
+                self._remove(node_id)
+            self._maybe_compact()
+
+    def remove_files(self, file_names: Iterable[str], tenant: Optional[str] = None) -> int:
+        """Removes every chunk of the files (of the given tenant only, if any)
+
+        Returns:
+            int: Number of chunks removed
+        """
+        file_names = set(file_names)
+        with self._lock:
+            node_ids = [
+                self._node_ids[doc] for doc in self._doc_numbers.values()
+                if self._metadata[doc].get("file_name") in file_names and (tenant is None or self._tenant(doc) == tenant)
+            ]
+            self.remove_ids(node_ids)
+            return len(node_ids)
+
+    def remove_tenant(self, tenant: str) -> int:
+        """Removes every chunk of a tenant
+
+        Returns:
+            int: Number of chunks removed
+        """
+        with self._lock:
+            node_ids = [self._node_ids[doc] for doc in self._doc_numbers.values() if self._tenant(doc) == tenant]
+            self.remove_ids(node_ids)
+            return len(node_ids)
+
+    def _tenant(self, doc: int) -> str:
+        # Chunks indexed before tenants belong to the default tenant
+        return self._metadata[doc].get(TENANT_FIELD, default_tenant())
+
+    def _remove(self, node_id: str):
+        doc = self._doc_numbers.pop(node_id, None)
+        if doc is None:
+            return
+        for term_id in self._doc_terms[doc]:
+            self._df[term_id] -= 1
+        self._total_length -= self._lengths[doc]
+        self._norms = None
+        self._alive[doc] = 0
+        # The postings keep the document number until the next compaction, only the payload is released
+        self._texts[doc] = None
+        self._metadata[doc] = None
+        self._doc_terms[doc] = None
+
+    def _maybe_compact(self):
+        if len(self._node_ids) - len(self._doc_numbers) > len(self._doc_numbers):
+            self._compact()
+
+    def _compact(self):
+        """Drops the tombstoned documents and renumbers the remaining ones"""
+        if len(self._node_ids) == len(self._doc_numbers):
+            return
+        old_to_new = np.full(len(self._node_ids), -1, dtype=np.int64)
+        alive_docs = np.flatnonzero(np.frombuffer(bytes(self._alive), dtype=np.uint8))
+        old_to_new[alive_docs] = np.arange(len(alive_docs))
+
+        terms, postings_docs, postings_tfs, df = {}, [], [], []
+        for term, term_id in self._terms.items():
+            if self._df[term_id] == 0:
+                continue
+            docs = np.asarray(self._postings_docs[term_id], dtype=np.int64)
+            keep = old_to_new[docs] >= 0
+            terms[term] = len(postings_docs)
+            postings_docs.append(array("I", old_to_new[docs[keep]].astype(np.uint32).tobytes()))
+            postings_tfs.append(array("I", np.asarray(self._postings_tfs[term_id], dtype=np.uint32)[keep].tobytes()))
+            df.append(self._df[term_id])
+
+        term_remap = {old_id: terms[term] for term, old_id in self._terms.items() if term in terms}
+        self._terms, self._postings_docs, self._postings_tfs, self._df = terms, postings_docs, postings_tfs, df
+        self._node_ids = [self._node_ids[doc] for doc in alive_docs]
+        self._texts = [self._texts[doc] for doc in alive_docs]
+        self._metadata = [self._metadata[doc] for doc in alive_docs]
+        self._excluded = [self._excluded[doc] for doc in alive_docs]
+        self._lengths = array("I", (self._lengths[doc] for doc in alive_docs))
+        self._norms = None
+        self._doc_terms = [array("I", (term_remap[term_id] for term_id in self._doc_terms[doc])) for doc in alive_docs]
+        self._alive = bytearray(b"\x01" * len(alive_docs))
+        self._doc_numbers = {node_id: doc for doc, node_id in enumerate(self._node_ids)}
+
+    def search(self, query: str, top_k: int = 20, filters: Optional[MetadataFilters] = None) -> List[Tuple[str, float]]:
+        """Scores the chunks containing the query terms with BM25
+
+        Args:
+            query (str): Query
+            top_k (int): Number of results
+            filters (Optional[MetadataFilters]): Only chunks whose metadata match are returned
+
+        Returns:
+            List[Tuple[str, float]]: (chunk id, score) of the best chunks, best first
+        """
+        with self._lock:
+            num_docs = len(self._doc_numbers)
+            if not num_docs:
+                return []
+            if self._norms is None:
+                avg_length = self._total_length / num_docs
+                lengths = np.asarray(self._lengths, dtype=np.float32)
+                self._norms = (self.k1 * (1 - self.b + self.b * lengths / avg_length)).astype(np.float32)
+
+            doc_parts, score_parts = [], []
+            for term in set(tokenize(query)):
+                term_id = self._terms.get(term)
+                if term_id is None or not self._df[term_id]:
+                    continue
+                df = self._df[term_id]
+                idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+                docs = np.frombuffer(self._postings_docs[term_id], dtype=np.uint32)
+                tfs = np.frombuffer(self._postings_tfs[term_id], dtype=np.uint32).astype(np.float32)
+                doc_parts.append(docs)
+                score_parts.append(np.float32(idf * (self.k1 + 1)) * tfs / (tfs + self._norms[docs]))
+            if not doc_parts:
+                return []
+
+            # Sum the contributions per document, touching only the postings of the query terms
+            docs, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+            alive = np.frombuffer(self._alive, dtype=np.uint8)[docs].astype(bool)
+            docs, scores = docs[alive], scores[alive]
+            if filters is not None:
+                keep = np.fromiter((matches_filters(self._metadata[doc], filters) for doc in docs), dtype=bool, count=len(docs))
+                docs, scores = docs[keep], scores[keep]
+            if not len(docs):
+                return []
+
+            if len(docs) > top_k:
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+            else:
+                best = np.arange(len(docs))
+            best = best[np.argsort(-scores[best], kind="stable")]
+            return [(self._node_ids[docs[i]], float(scores[i])) for i in best]
+
+    def get_node(self, node_id: str) -> Optional[TextNode]:
+        """Rebuilds an indexed chunk, or returns None if it is not indexed"""
+        with self._lock:
+            doc = self._doc_numbers.get(node_id)
+            if doc is None:
+                return None
+            return TextNode(
+                id_=node_id,
+                text=self._texts[doc],
+                metadata=dict(self._metadata[doc]),
+                excluded_embed_metadata_keys=list(self._excluded[doc]),
+                excluded_llm_metadata_keys=list(self._excluded[doc]),
+            )
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            postings = sum(len(docs) for docs in self._postings_docs)
+            return {
+                "chunks": len(self._doc_numbers),
+                "terms": len(self._terms),
+                "postings": postings,
+                "postings_mb": round(postings * 8 / 2**20, 2),
+                "tombstones": len(self._node_ids) - len(self._doc_numbers),
+            }
+
+    def save(self, path: Optional[str] = None):
+        """Persists the index (defaults to the configured path)"""
+        path = path or self.path
+        with self._lock:
+            self._compact()
+            offsets = np.cumsum([0] + [len(docs) for docs in self._postings_docs], dtype=np.int64)
+            documents = {
+                "terms": sorted(self._terms, key=self._terms.get),
+                "node_ids": self._node_ids,
+                "texts": self._texts,
+                "metadata": self._metadata,
+                "excluded": self._excluded,
+            }
+            arrays = {
+                "offsets": offsets,
+                "postings_docs": np.frombuffer(b"".join(docs.tobytes() for docs in self._postings_docs), dtype=np.uint32),
+                "postings_tfs": np.frombuffer(b"".join(tfs.tobytes() for tfs in self._postings_tfs), dtype=np.uint32),
+                "lengths": np.asarray(self._lengths, dtype=np.uint32),
+                "documents": np.frombuffer(json.dumps(documents).encode("utf-8"), dtype=np.uint8),
+            }
+        # Concurrent indexing jobs may save at the same time, each writes its own temporary file
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str):
+        """Loads an index previously written by `save`"""
+        try:
+            with np.load(path) as data:
+                arrays = {key: data[key] for key in data.files}
+            documents = json.loads(arrays["documents"].tobytes().decode("utf-8"))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not load lexical index from {path}: {e}")
+            return
+
+        offsets = arrays["offsets"]
+        with self._lock:
+            self.clear()
+            self._terms = {term: term_id for term_id, term in enumerate(documents["terms"])}
+            for term_id in range(len(self._terms)):
+                start, end = offsets[term_id], offsets[term_id + 1]
+                self._postings_docs.append(array("I", arrays["postings_docs"][start:end].tobytes()))
+                self._postings_tfs.append(array("I", arrays["postings_tfs"][start:end].tobytes()))
+                self._df.append(int(end - start))
+
+            self._node_ids = documents["node_ids"]
+            self._texts = documents["texts"]
+            self._metadata = documents["metadata"]
+            self._excluded = [tuple(keys) for keys in documents["excluded"]]
+            self._lengths = array("I", arrays["lengths"].tobytes())
+            self._doc_terms = [array("I") for _ in self._node_ids]
+            for term_id in range(len(self._terms)):
+                for doc in self._postings_docs[term_id]:
+                    self._doc_terms[doc].append(term_id)
+            self._alive = bytearray(b"\x01" * len(self._node_ids))
+            self._doc_numbers = {node_id: doc for doc, node_id in enumerate(self._node_ids)}
+            self._total_length = int(sum(self._lengths))
+            self._norms = None
+        print(f"Loaded lexical index with {len(self)} chunks from {path}")
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuses rankings of ids: each id scores the sum of 1 / (k + rank) over the rankings it appears in
+
+    Args:
+        rankings (List[List[str]]): Ranked ids, best first
+        k (int): Damping constant, larger values flatten the contribution of the top ranks
+
+    Returns:
+        List[Tuple[str, float]]: (id, fused score), best first
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking, start=1):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+
+    """Fuses the dense (Milvus) results with the lexical BM25 results using reciprocal-rank fusion.
+
+       The lexical search runs on a local thread while the dense search waits on Milvus, and lexical hits are
+       rebuilt from the index itself, so hybrid retrieval costs no extra remote round trip.
+
+    Args:
+        dense_retriever (BaseRetriever): Vector retriever, should fetch at least `candidates` results
+        lexical_index (BM25Index): Lexical index of the same chunks
+        similarity_top_k (int): Number of fused results returned
+        candidates (int): Number of lexical results fused with the dense ones
+        rrf_k (int): Reciprocal-rank fusion constant
+        filters (Optional[MetadataFilters]): Filters of the lexical search, the dense retriever should apply the same
+
+    """
+
+    def __init__(self, dense_retriever: BaseRetriever, lexical_index: BM25Index, similarity_top_k: int = 5,
+                 candidates: int = 20, rrf_k: int = 60, filters: Optional[MetadataFilters] = None):
+        super().__init__()
+        self.dense_retriever = dense_retriever
+        self.lexical_index = lexical_index
+        self.similarity_top_k = similarity_top_k
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.filters = filters
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        lexical_future = _search_executor.submit(self.lexical_index.search, query_bundle.query_str, self.candidates, self.filters)
+        dense_nodes = self.dense_retriever.retrieve(query_bundle)
+        return self._fuse(dense_nodes, lexical_future.result())
+
+    def fuse(self, query_str: str, dense_nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        """Fuses dense results searched elsewhere (e.g. by a batched search) with the lexical results of the query"""
+        return self._fuse(dense_nodes, self.lexical_index.search(query_str, self.candidates, self.filters))
+
+    def _fuse(self, dense_nodes: List[NodeWithScore], lexical_hits: List[Tuple[str, float]]) -> List[NodeWithScore]:
+        nodes = {node.node.node_id: node.node for node in dense_nodes}
+        fused = reciprocal_rank_fusion(
+            [[node.node.node_id for node in dense_nodes], [node_id for node_id, _ in lexical_hits]], k=self.rrf_k
+        )
+
+        results = []
+        for node_id, score in fused:
+            node = nodes.get(node_id) or self.lexical_index.get_node(node_id)
+            if node is None:
+                # Removed from the index since the search
+                continue
+            results.append(NodeWithScore(node=node, score=score))
+            if len(results) == self.similarity_top_k:
+                break
+        return results
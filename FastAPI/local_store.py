@@ -0,0 +1,611 @@
+from dotenv import load_dotenv
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode, TextNode
+from llama_index.core.vector_stores import FilterCondition, FilterOperator, MetadataFilters
+from llama_index.core.vector_stores.types import BasePydanticVectorStore, VectorStoreQuery, VectorStoreQueryResult
+
+from FastAPI.milvus_index import TENANT_FIELD, default_tenant
+
+
+load_dotenv()
+
+VECTOR_STORE_BACKENDS = ("milvus", "local")
+LOCAL_STORE_DTYPES = ("float32", "int8")
+LOCAL_STORE_METRICS = ("IP", "COSINE")
+
+# Columns the searches filter on, one record per row. File names and tenants are codes into the string table.
+ROW_DTYPE = np.dtype([("file", "<i4"), ("tenant", "<i4"), ("page_num", "<i8")])
+# Where each row's text and metadata sit in payload.jsonl
+OFFSET_DTYPE = np.dtype([("start", "<i8"), ("length", "<i8")])
+
+# Rows scored per matrix product, so int8 rows are dequantized a block at a time
+SEARCH_BLOCK_ROWS = 16384
+# Query vectors scored together by `search_many`, each block of rows is read once per group of queries
+SEARCH_QUERY_BATCH = 256
+# Below this fraction of matching rows, filtered searches gather the matching rows instead of scanning every block
+GATHER_FRACTION = 0.25
+
+
+def _isin(column: np.ndarray, values: Sequence[Any], invert: bool = False) -> np.ndarray:
+    """np.isin, comparing against each value for the short value lists of filters (faster than sorting the column)"""
+    if len(values) > 8:
+        return np.isin(column, values, invert=invert)
+    mask = np.zeros(len(column), dtype=bool)
+    for value in values:
+        mask |= column == value
+    return ~mask if invert else mask
+
+
+def vector_store_backend(backend: Optional[str] = None) -> str:
+    """Where the chunk vectors are stored: "milvus" (the Milvus collection) or "local" (a `LocalVectorStore` on this
+    node, no Milvus or MinIO stack needed for search). Defaults to VECTOR_STORE_BACKEND or milvus."""
+    backend = (backend or os.getenv("VECTOR_STORE_BACKEND", "milvus")).lower()
+    if backend not in VECTOR_STORE_BACKENDS:
+        raise ValueError(f"Vector store backend '{backend}' not supported. Please choose one of {', '.join(VECTOR_STORE_BACKENDS)}.")
+    return backend
+
+
+def local_store_path(collection_name: str) -> str:
+    """Directory of a collection's local vector store, under LOCAL_VECTOR_STORE_PATH (defaults to local_vector_store)"""
+    return os.path.join(os.getenv("LOCAL_VECTOR_STORE_PATH", "local_vector_store"), collection_name)
+
+
+class _Snapshot():
+
+    """Memory maps of the first `count` rows. Appends and compactions map a new snapshot, searches running on the
+       previous one keep reading the rows (and payload file) they started with."""
+
+    def __init__(self, count: int, vectors: np.ndarray, scales: Optional[np.ndarray], rows: np.ndarray,
+                 alive: np.ndarray, offsets: np.ndarray, payload):
+        self.count = count
+        self.vectors = vectors
+        self.scales = scales
+        self.rows = rows
+        self.alive = alive
+        self.offsets = offsets
+        self.payload = payload
+
+    def read_payload(self, row: int) -> Dict[str, Any]:
+        start, length = self.offsets[row]
+        return json.loads(os.pread(self.payload.fileno(), int(length), int(start)))
+
+
+class LocalVectorStore(BasePydanticVectorStore):
+
+    """Embedded vector store for single-node deployments: the chunk vectors live in a memory-mapped float32 or int8
+       matrix on local disk, next to a sidecar table of per-row columns (file name, tenant, page number) and a
+       JSON-lines payload of the chunk text and metadata.
+
+       Searches are brute-force NumPy matrix-vector products over blocks of rows with a top-k selection; metadata
+       filters are evaluated on the column arrays, and selective ones (e.g. one file name) only score the matching
+       rows. Inserts are appended to the files and deletes clear the rows' alive flags in place, so neither rewrites
+       the store; `compact` drops the deleted rows (driven by the `CompactionScheduler` like a Milvus collection).
+       Nothing is read until the first call: opening the store maps the files, and the chunk ids are only loaded by
+       the calls that look rows up by id.
+
+       int8 rows are quantized symmetrically with one float32 scale per row: about 3.5x less disk and page cache than
+       float32, for a top-20 recall of 98-99% of the float32 results (see benchmarks/bench_local_store.py).
+
+    Args:
+        path (str): Directory of the store, created on the first insert
+        dtype (Optional[str]): float32 or int8 storage of new stores. Defaults to LOCAL_VECTOR_STORE_DTYPE or float32.
+            An existing store keeps the dtype it was created with.
+        metric_type (Optional[str]): IP or COSINE (vectors and queries normalized). Defaults to MILVUS_METRIC_TYPE or IP.
+
+    """
+
+    stores_text: bool = True
+    path: str
+    dtype: str = "float32"
+    metric_type: str = "IP"
+    dim: Optional[int] = None
+
+    _lock: threading.RLock = PrivateAttr()
+    _opened: bool = PrivateAttr(default=False)
+    _count: int = PrivateAttr(default=0)
+    _snapshot: Optional[_Snapshot] = PrivateAttr(default=None)
+    _strings: Optional[List[str]] = PrivateAttr(default=None)
+    _codes: Optional[Dict[str, int]] = PrivateAttr(default=None)
+    _ids: Optional[List[str]] = PrivateAttr(default=None)
+    _rows_by_id: Optional[Dict[str, int]] = PrivateAttr(default=None)
+
+    def __init__(self, path: str, dtype: Optional[str] = None, metric_type: Optional[str] = None, **kwargs: Any):
+        dtype = (dtype or os.getenv("LOCAL_VECTOR_STORE_DTYPE", "float32")).lower()
+        if dtype not in LOCAL_STORE_DTYPES:
+            raise ValueError(f"Local vector store dtype '{dtype}' not supported. Please choose one of {', '.join(LOCAL_STORE_DTYPES)}.")
+        metric_type = (metric_type or os.getenv("MILVUS_METRIC_TYPE", "IP")).upper()
+        if metric_type not in LOCAL_STORE_METRICS:
+            raise ValueError(f"Metric '{metric_type}' not supported by the local vector store. Please choose one of {', '.join(LOCAL_STORE_METRICS)}.")
+        super().__init__(path=path, dtype=dtype, metric_type=metric_type, **kwargs)
+        self._lock = threading.RLock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LocalVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return self
+
+    def exists(self) -> bool:
+        """Whether chunks were ever inserted (the store is created on the first insert)"""
+        return os.path.exists(self._file("meta.json"))
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _row_sizes(self) -> Dict[str, int]:
+        sizes = {
+            "vectors.bin": self.dim * np.dtype(self.dtype).itemsize,
+            "rows.bin": ROW_DTYPE.itemsize,
+            "alive.bin": 1,
+            "offsets.bin": OFFSET_DTYPE.itemsize,
+        }
+        if self.dtype == "int8":
+            sizes["scales.bin"] = 4
+        return sizes
+
+    def _open(self):
+        """Reads the store's settings and row count (on first use)"""
+        if self._opened:
+            return
+        if self.exists():
+            with open(self._file("meta.json")) as f:
+                meta = json.load(f)
+            self.dim, self.dtype, self.metric_type = meta["dim"], meta["dtype"], meta["metric_type"]
+            sizes = self._row_sizes()
+            counts = {name: os.path.getsize(self._file(name)) // size for name, size in sizes.items()}
+            self._count = min(counts.values())
+            # Rows are complete once their alive flag is written: drop the tail of an interrupted insert
+            for name, size in sizes.items():
+                if counts[name] > self._count:
+                    os.truncate(self._file(name), self._count * size)
+            self._snapshot = None
+        self._opened = True
+
+    def _map(self) -> _Snapshot:
+        count = self._count
+        if not count:
+            return _Snapshot(0, np.empty((0, self.dim or 0), dtype=self.dtype), np.empty(0, dtype=np.float32),
+                             np.empty(0, dtype=ROW_DTYPE), np.empty(0, dtype=np.uint8), np.empty(0, dtype=OFFSET_DTYPE), None)
+        return _Snapshot(
+            count,
+            np.memmap(self._file("vectors.bin"), dtype=self.dtype, mode="r", shape=(count, self.dim)),
+            np.memmap(self._file("scales.bin"), dtype=np.float32, mode="r", shape=(count,)) if self.dtype == "int8" else None,
+            np.memmap(self._file("rows.bin"), dtype=ROW_DTYPE, mode="r", shape=(count,)),
+            np.memmap(self._file("alive.bin"), dtype=np.uint8, mode="r+", shape=(count,)),
+            np.memmap(self._file("offsets.bin"), dtype=OFFSET_DTYPE, mode="r", shape=(count,)),
+            open(self._file("payload.jsonl"), "rb"),
+        )
+
+    def snapshot(self) -> _Snapshot:
+        """Current memory maps of the store, mapped on first use and after writes"""
+        with self._lock:
+            self._open()
+            if self._snapshot is None:
+                self._snapshot = self._map()
+            return self._snapshot
+
+    def _load_strings(self):
+        if self._strings is not None:
+            return
+        self._strings = []
+        if os.path.exists(self._file("strings.jsonl")):
+            with open(self._file("strings.jsonl")) as f:
+                self._strings = [json.loads(line) for line in f]
+        self._codes = {value: code for code, value in enumerate(self._strings)}
+
+    def _code(self, value: str) -> int:
+        """Code of a file name or tenant, added to the string table if new"""
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._strings)
+            self._strings.append(value)
+            with open(self._file("strings.jsonl"), "a") as f:
+                f.write(json.dumps(value) + "\n")
+        return code
+
+    def _load_ids(self):
+        """Loads the chunk ids (on the first call that looks rows up by id)"""
+        self._open()
+        if self._ids is not None:
+            return
+        ids = []
+        if os.path.exists(self._file("ids.txt")):
+            with open(self._file("ids.txt")) as f:
+                ids = f.read().splitlines()
+        if len(ids) > self._count:
+            ids = ids[:self._count]
+            with open(self._file("ids.txt"), "w") as f:
+                f.write("".join(f"{id_}\n" for id_ in ids))
+        alive = self.snapshot().alive
+        self._ids = ids
+        self._rows_by_id = {id_: row for row, id_ in enumerate(ids) if alive[row]}
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.metric_type == "COSINE":
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        if self.dtype == "float32":
+            return vectors.astype(np.float32), None
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+        return np.rint(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Appends the nodes, replacing the rows already stored with the same ids"""
+        # The last node with a given id wins
+        nodes = list({node.node_id: node for node in nodes}.values())
+        if not nodes:
+            return []
+        vectors = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        with self._lock:
+            self._open()
+            if self.dim is None:
+                os.makedirs(self.path, exist_ok=True)
+                self.dim = vectors.shape[1]
+                with open(self._file("meta.json"), "w") as f:
+                    json.dump({"dim": self.dim, "dtype": self.dtype, "metric_type": self.metric_type}, f)
+                for name in list(self._row_sizes()) + ["payload.jsonl", "ids.txt"]:
+                    open(self._file(name), "ab").close()
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Vectors of {vectors.shape[1]} dimensions cannot be stored in the local vector store of {self.dim} dimensions.")
+            self._load_ids()
+            self._load_strings()
+            self._delete_rows([self._rows_by_id[node.node_id] for node in nodes if node.node_id in self._rows_by_id])
+
+            encoded, scales = self._encode(vectors)
+            rows = np.array([
+                (self._code(node.metadata.get("file_name", "")), self._code(node.metadata.get(TENANT_FIELD, default_tenant())),
+                 int(node.metadata.get("page_num", -1)))
+                for node in nodes
+            ], dtype=ROW_DTYPE)
+            payloads = [
+                json.dumps({
+                    "id": node.node_id,
+                    "text": node.get_content(),
+                    "metadata": node.metadata,
+                    "excluded_embed_metadata_keys": node.excluded_embed_metadata_keys,
+                    "excluded_llm_metadata_keys": node.excluded_llm_metadata_keys,
+                    "ref_doc_id": node.ref_doc_id,
+                }).encode("utf-8") + b"\n"
+                for node in nodes
+            ]
+            with open(self._file("payload.jsonl"), "ab") as f:
+                start = f.tell()
+                f.write(b"".join(payloads))
+            lengths = np.array([len(payload) for payload in payloads], dtype=np.int64)
+            offsets = np.empty(len(nodes), dtype=OFFSET_DTYPE)
+            offsets["start"] = start + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            offsets["length"] = lengths
+
+            # The alive flags are written last, they mark the rows as complete
+            columns = [("ids.txt", "".join(f"{node.node_id}\n" for node in nodes).encode("utf-8")),
+                       ("offsets.bin", offsets.tobytes()), ("rows.bin", rows.tobytes()), ("vectors.bin", encoded.tobytes())]
+            if scales is not None:
+                columns.append(("scales.bin", scales.tobytes()))
+            columns.append(("alive.bin", np.ones(len(nodes), dtype=np.uint8).tobytes()))
+            for name, data in columns:
+                with open(self._file(name), "ab") as f:
+                    f.write(data)
+
+            first_row = self._count
+            for row, node in enumerate(nodes, start=first_row):
+                self._ids.append(node.node_id)
+                self._rows_by_id[node.node_id] = row
+            self._count += len(nodes)
+            self._snapshot = None
+        return [node.node_id for node in nodes]
+
+    def _delete_rows(self, rows: Iterable[int]) -> int:
+        rows = np.asarray(sorted(set(rows)), dtype=np.int64)
+        if not len(rows):
+            return 0
+        alive = self.snapshot().alive
+        rows = rows[alive[rows] != 0]
+        alive[rows] = 0
+        alive.flush()
+        if self._rows_by_id is not None:
+            for row in rows:
+                self._rows_by_id.pop(self._ids[row], None)
+        return len(rows)
+
+    def delete_ids(self, ids: Iterable[str]) -> int:
+        """Deletes the rows of the given chunk ids
+
+        Returns:
+            int: Number of rows deleted
+        """
+        with self._lock:
+            self._load_ids()
+            return self._delete_rows([self._rows_by_id[id_] for id_ in ids if id_ in self._rows_by_id])
+
+    def delete_where(self, file_names: Optional[Iterable[str]] = None, tenant: Optional[str] = None) -> int:
+        """Deletes the rows of the files (all files if not given) of the tenant (all tenants if not given)
+
+        Returns:
+            int: Number of rows deleted
+        """
+        with self._lock:
+            snapshot = self.snapshot()
+            mask = self._row_mask(snapshot, file_names=file_names, tenant=tenant)
+            return self._delete_rows(np.flatnonzero(mask))
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Deletes the rows of a source document (scans the payloads, the pipelines delete by file or id instead)"""
+        with self._lock:
+            snapshot = self.snapshot()
+            rows = [row for row in np.flatnonzero(snapshot.alive[:snapshot.count])
+                    if snapshot.read_payload(row).get("ref_doc_id") == ref_doc_id]
+            self._delete_rows(rows)
+
+    def _row_mask(self, snapshot: _Snapshot, file_names: Optional[Iterable[str]] = None, tenant: Optional[str] = None) -> np.ndarray:
+        with self._lock:
+            self._load_strings()
+            codes = self._codes
+        mask = snapshot.alive[:snapshot.count] != 0
+        if file_names is not None:
+            mask &= _isin(snapshot.rows["file"], [codes[name] for name in file_names if name in codes])
+        if tenant is not None:
+            mask &= snapshot.rows["tenant"] == codes.get(tenant, -1)
+        return mask
+
+    def file_names(self, prefix: str = "", tenant: Optional[str] = None) -> List[str]:
+        """Names of the stored files starting with the prefix (of the tenant only, if given)"""
+        snapshot = self.snapshot()
+        mask = self._row_mask(snapshot, tenant=tenant)
+        names = (self._strings[code] for code in np.unique(snapshot.rows["file"][mask]))
+        return sorted(name for name in names if name.startswith(prefix))
+
+    def indexed_chunks(self, file_name: str, tenant: Optional[str] = None) -> Dict[str, Tuple[Optional[int], Optional[str]]]:
+        """Returns {chunk id: (page_num, page_hash)} of the chunks stored for the file (of the tenant, if given)"""
+        snapshot = self.snapshot()
+        indexed = {}
+        for row in np.flatnonzero(self._row_mask(snapshot, file_names=[file_name], tenant=tenant)):
+            payload = snapshot.read_payload(row)
+            indexed[payload["id"]] = (payload["metadata"].get("page_num"), payload["metadata"].get("page_hash"))
+        return indexed
+
+    def fetch_embeddings(self, ids: Iterable[str]) -> Dict[str, List[float]]:
+        """Stored vectors of the given chunk ids (dequantized for int8 stores)"""
+        with self._lock:
+            self._load_ids()
+            found = [(id_, self._rows_by_id[id_]) for id_ in ids if id_ in self._rows_by_id]
+            snapshot = self.snapshot()
+        if not found:
+            return {}
+        rows = np.asarray([row for _, row in found], dtype=np.int64)
+        vectors = np.asarray(snapshot.vectors[rows], dtype=np.float32)
+        if snapshot.scales is not None:
+            vectors *= snapshot.scales[rows][:, None]
+        return {id_: vector.tolist() for (id_, _), vector in zip(found, vectors)}
+
+    def _filter_mask(self, snapshot: _Snapshot, filters: MetadataFilters) -> np.ndarray:
+        """Evaluates metadata filters (see `FastAPI.milvus_index.metadata_filters`) on the row columns"""
+        with self._lock:
+            self._load_strings()
+            codes = self._codes
+        masks = []
+        for f in filters.filters:
+            if isinstance(f, MetadataFilters):
+                masks.append(self._filter_mask(snapshot, f))
+                continue
+            values = f.value if isinstance(f.value, list) else [f.value]
+            if f.key == "page_num":
+                column = snapshot.rows["page_num"]
+            elif f.key in ("file_name", TENANT_FIELD):
+                column = snapshot.rows["file" if f.key == "file_name" else "tenant"]
+                if f.operator not in (FilterOperator.EQ, FilterOperator.NE, FilterOperator.IN, FilterOperator.NIN):
+                    raise ValueError(f"Filter operator '{f.operator.value}' not supported on '{f.key}'.")
+                values = [codes.get(value, -1) for value in values]
+            else:
+                raise ValueError(f"Cannot filter on '{f.key}' in the local vector store.")
+
+            if f.operator in (FilterOperator.IN, FilterOperator.NIN):
+                mask = _isin(column, values, invert=f.operator == FilterOperator.NIN)
+            elif f.operator == FilterOperator.EQ:
+                mask = column == values[0]
+            elif f.operator == FilterOperator.NE:
+                mask = column != values[0]
+            elif f.operator == FilterOperator.GT:
+                mask = column > values[0]
+            elif f.operator == FilterOperator.GTE:
+                mask = column >= values[0]
+            elif f.operator == FilterOperator.LT:
+                mask = column < values[0]
+            elif f.operator == FilterOperator.LTE:
+                mask = column <= values[0]
+            else:
+                raise ValueError(f"Filter operator '{f.operator.value}' not supported by the local vector store.")
+            masks.append(mask)
+        if not masks:
+            return np.ones(snapshot.count, dtype=bool)
+        combine = np.logical_or if filters.condition == FilterCondition.OR else np.logical_and
+        return combine.reduce(masks)
+
+    def _scores(self, snapshot: _Snapshot, rows, queries: np.ndarray) -> np.ndarray:
+        # (rows, queries) matrix, so every block read from the page cache is scored against all the queries at once
+        vectors = snapshot.vectors[rows]
+        if snapshot.scales is None:
+            return vectors @ queries.T
+        return (vectors.astype(np.float32) @ queries.T) * snapshot.scales[rows][:, None]
+
+    @staticmethod
+    def _top_k(rows: np.ndarray, scores: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # Best top_k rows of each query (column), unordered
+        if len(scores) <= top_k:
+            return rows, scores
+        keep = np.argpartition(-scores, top_k - 1, axis=0)[:top_k]
+        return np.take_along_axis(rows, keep, axis=0), np.take_along_axis(scores, keep, axis=0)
+
+    def search(self, embedding: Sequence[float], top_k: int = 5, filters: Optional[MetadataFilters] = None) -> List[Tuple[int, float]]:
+        """Scores the rows matching the filters against the query vector
+
+        Args:
+            embedding (Sequence[float]): Query vector
+            top_k (int): Number of results
+            filters (Optional[MetadataFilters]): Only rows whose columns match are scored
+
+        Returns:
+            List[Tuple[int, float]]: (row, score) of the best rows, best first
+        """
+        return self.search_many([embedding], top_k, filters)[0]
+
+    def search_many(self, embeddings: Sequence[Sequence[float]], top_k: int = 5,
+                    filters: Optional[MetadataFilters] = None) -> List[List[Tuple[int, float]]]:
+        """Same as `search` for many query vectors, scanning the matching rows once for up to SEARCH_QUERY_BATCH queries
+
+        Returns:
+            List[List[Tuple[int, float]]]: (row, score) of the best rows of each query, best first
+        """
+        snapshot = self.snapshot()
+        if not snapshot.count or top_k <= 0 or not len(embeddings):
+            return [[] for _ in embeddings]
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        if self.metric_type == "COSINE":
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        mask = snapshot.alive[:snapshot.count] != 0
+        if filters is not None:
+            mask &= self._filter_mask(snapshot, filters)
+        selected = np.flatnonzero(mask)
+        if not len(selected):
+            return [[] for _ in embeddings]
+
+        results = []
+        for query_start in range(0, len(queries), SEARCH_QUERY_BATCH):
+            batch = queries[query_start:query_start + SEARCH_QUERY_BATCH]
+            best_rows, best_scores = [], []
+            if len(selected) <= GATHER_FRACTION * snapshot.count:
+                # Selective filter: score the matching rows only
+                for start in range(0, len(selected), SEARCH_BLOCK_ROWS):
+                    rows = selected[start:start + SEARCH_BLOCK_ROWS]
+                    scores = self._scores(snapshot, rows, batch)
+                    rows, scores = self._top_k(np.broadcast_to(rows[:, None], scores.shape), scores, top_k)
+                    best_rows.append(rows)
+                    best_scores.append(scores)
+            else:
+                for start in range(0, snapshot.count, SEARCH_BLOCK_ROWS):
+                    block = slice(start, min(start + SEARCH_BLOCK_ROWS, snapshot.count))
+                    scores = self._scores(snapshot, block, batch)
+                    scores[~mask[block]] = -np.inf
+                    rows = np.broadcast_to(np.arange(block.start, block.stop)[:, None], scores.shape)
+                    rows, scores = self._top_k(rows, scores, top_k)
+                    best_rows.append(rows)
+                    best_scores.append(scores)
+
+            rows, scores = self._top_k(np.concatenate(best_rows), np.concatenate(best_scores), top_k)
+            order = np.argsort(-scores, axis=0, kind="stable")
+            rows, scores = np.take_along_axis(rows, order, axis=0), np.take_along_axis(scores, order, axis=0)
+            for column in range(len(batch)):
+                results.append([(int(row), float(score)) for row, score in zip(rows[:, column], scores[:, column]) if score != -np.inf])
+        return results
+
+    @staticmethod
+    def _node(snapshot: _Snapshot, row: int) -> TextNode:
+        payload = snapshot.read_payload(row)
+        return TextNode(
+            id_=payload["id"],
+            text=payload["text"],
+            metadata=payload["metadata"],
+            excluded_embed_metadata_keys=payload["excluded_embed_metadata_keys"],
+            excluded_llm_metadata_keys=payload["excluded_llm_metadata_keys"],
+        )
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.query_embedding is None:
+            raise ValueError("The local vector store only supports queries with an embedding.")
+        return self.query_many([query.query_embedding], query.similarity_top_k, query.filters)[0]
+
+    def query_many(self, embeddings: Sequence[Sequence[float]], top_k: int = 5,
+                   filters: Optional[MetadataFilters] = None) -> List[VectorStoreQueryResult]:
+        """Top-k chunks of many query vectors (see `search_many`). A chunk retrieved by several queries is read and
+        built once, and the same node is returned to each of them."""
+        snapshot = self.snapshot()
+        nodes_by_row: Dict[int, TextNode] = {}
+        results = []
+        for hits in self.search_many(embeddings, top_k, filters):
+            nodes = []
+            for row, _ in hits:
+                node = nodes_by_row.get(row)
+                if node is None:
+                    node = nodes_by_row[row] = self._node(snapshot, row)
+                nodes.append(node)
+            results.append(VectorStoreQueryResult(nodes=nodes, similarities=[score for _, score in hits],
+                                                  ids=[node.node_id for node in nodes]))
+        return results
+
+    @property
+    def num_entities(self) -> int:
+        """Rows in the store, including the deleted ones not compacted yet (as Milvus counts them)"""
+        return self.snapshot().count
+
+    def compact(self):
+        """Rewrites the store without its deleted rows"""
+        with self._lock:
+            snapshot = self.snapshot()
+            keep = np.flatnonzero(snapshot.alive[:snapshot.count] != 0)
+            if len(keep) == snapshot.count:
+                return
+            self._load_ids()
+            payloads = [os.pread(snapshot.payload.fileno(), int(length), int(start)) for start, length in snapshot.offsets[keep]]
+            lengths = np.array([len(payload) for payload in payloads], dtype=np.int64)
+            offsets = np.empty(len(keep), dtype=OFFSET_DTYPE)
+            offsets["start"] = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(keep) else []
+            offsets["length"] = lengths
+
+            files = {
+                "payload.jsonl": b"".join(payloads),
+                "ids.txt": "".join(f"{self._ids[row]}\n" for row in keep).encode("utf-8"),
+                "offsets.bin": offsets.tobytes(),
+                "rows.bin": np.ascontiguousarray(snapshot.rows[keep]).tobytes(),
+                "vectors.bin": np.ascontiguousarray(snapshot.vectors[keep]).tobytes(),
+                "alive.bin": np.ones(len(keep), dtype=np.uint8).tobytes(),
+            }
+            if snapshot.scales is not None:
+                files["scales.bin"] = np.ascontiguousarray(snapshot.scales[keep]).tobytes()
+            # Searches still running on the previous snapshot keep reading the replaced files
+            for name, data in files.items():
+                with open(self._file(f"{name}.tmp"), "wb") as f:
+                    f.write(data)
+                os.replace(self._file(f"{name}.tmp"), self._file(name))
+
+            self._ids = [self._ids[row] for row in keep]
+            self._rows_by_id = {id_: row for row, id_ in enumerate(self._ids)}
+            self._count = len(keep)
+            self._snapshot = None
+        print(f"Compacted local vector store {self.path}: {snapshot.count - len(keep)} deleted rows dropped")
+
+    def clear(self) -> None:
+        """Deletes every row and the store's files"""
+        with self._lock:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.close()
+            self.dim = None
+            self._count = 0
+
+    def close(self):
+        """Unmaps the files, they are mapped again on the next call"""
+        with self._lock:
+            self._opened = False
+            self._snapshot = None
+            self._strings = self._codes = None
+            self._ids = self._rows_by_id = None
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot()
+        alive = int(np.count_nonzero(snapshot.alive[:snapshot.count]))
+        disk_bytes = sum(os.path.getsize(os.path.join(self.path, name)) for name in os.listdir(self.path)) if self.exists() else 0
+        return {
+            "rows": alive,
+            "deleted_rows": snapshot.count - alive,
+            "dim": self.dim,
+            "dtype": self.dtype,
+            "metric_type": self.metric_type,
+            "disk_mb": round(disk_bytes / 2**20, 2),
+        }
@@ -0,0 +1,220 @@
+from dotenv import load_dotenv
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import json
+import os
+import threading
+import time
+
+
+load_dotenv()
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Query timings (see Query_Pipeline.run) recorded as stages of the query pipeline
+QUERY_STAGES = {
+    "embed_ms": "embed",
+    "setup_ms": "setup",
+    "search_ms": "milvus_search",
+    "rerank_ms": "rerank",
+    "prompt_ms": "prompt",
+    "llm_ms": "llm",
+    "first_token_ms": "llm_first_token",
+    "total_ms": "total",
+}
+
+_HELP = {
+    "rag_stage_seconds": "Time spent in each stage of the indexing and query pipelines",
+    "rag_request_seconds": "HTTP request latency by route",
+    "rag_requests_total": "HTTP requests by route and status code",
+    "rag_queries_total": "Queries answered, by answer cache outcome",
+    "rag_query_batches_total": "Batches of queries answered by /query/batch",
+    "rag_context_tokens_total": "Tokens of retrieved context passed to the LLM",
+    "rag_generated_tokens_total": "Streamed LLM tokens",
+    "rag_chunks_retrieved_total": "Chunks passed to the LLM",
+    "rag_pages_parsed_total": "PDF pages extracted by the indexing pipeline",
+    "rag_chunks_embedded_total": "Chunks embedded by the indexing pipeline",
+    "rag_vectors_written_total": "Vectors inserted into Milvus by the indexing pipeline",
+}
+
+_Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> _Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: _Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class _Histogram():
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, buckets: Tuple[float, ...], value: float):
+        self.counts[bisect_left(buckets, value)] += 1
+        self.total += value
+
+
+class Metrics():
+
+    """Process-wide counters and latency histograms of the RAG pipeline, rendered in the Prometheus text format.
+
+       The pipelines already fill a `timings` dict per query and per-stage metrics per indexing run; `record_query`
+       and `record_indexing` turn them into histograms, and `timer` times the remaining hot paths. With
+       METRICS_ENABLED=false every call returns immediately. Setting METRICS_TRACE_FILE (or `trace_hook`) dumps one
+       JSON trace per query, indexing run and HTTP request for profiling.
+
+    Args:
+        enabled (Optional[bool]): Record metrics. Defaults to METRICS_ENABLED or True
+        trace_file (Optional[str]): JSON-lines file the traces are appended to. Defaults to METRICS_TRACE_FILE
+
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, trace_file: Optional[str] = None):
+        self.enabled = enabled if enabled is not None else os.getenv("METRICS_ENABLED", "true").lower() == "true"
+        self.trace_file = trace_file if trace_file is not None else os.getenv("METRICS_TRACE_FILE")
+        self.trace_hook: Optional[Callable[[Dict[str, Any]], None]] = self._write_trace if self.trace_file else None
+        self.buckets = LATENCY_BUCKETS
+        self._counters: Dict[str, Dict[_Labels, float]] = {}
+        self._histograms: Dict[str, Dict[_Labels, _Histogram]] = {}
+        self._lock = threading.Lock()
+        self._trace_lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Adds value to a counter"""
+        if not self.enabled:
+            return
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Records a latency in a histogram"""
+        if not self.enabled:
+            return
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self.buckets)
+            histogram.observe(self.buckets, seconds)
+
+    @contextmanager
+    def _timer(self, stage: str, pipeline: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("rag_stage_seconds", time.perf_counter() - start, pipeline=pipeline, stage=stage)
+
+    def timer(self, stage: str, pipeline: str = "indexing"):
+        """Context manager recording the time spent in its block as a pipeline stage
+
+        Args:
+            stage (str): Stage name (e.g. "embed", "milvus_insert")
+            pipeline (str): "indexing" or "query"
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._timer(stage, pipeline)
+
+    def record_query(self, timings: Dict[str, Any], kind: str = "run"):
+        """Records the per-stage timings, chunk and token counts of one query
+
+        Args:
+            timings (Dict[str, Any]): Timings filled by Query_Pipeline (milliseconds, plus counts and cache_hit)
+            kind (str): "run", "stream" or "batch"
+        """
+        if not self.enabled:
+            return
+        for key, stage in QUERY_STAGES.items():
+            if key in timings:
+                self.observe("rag_stage_seconds", timings[key] / 1000, pipeline="query", stage=stage)
+        self.inc("rag_queries_total", kind=kind, cache="hit" if timings.get("cache_hit") else "miss")
+        if "context_tokens" in timings:
+            self.inc("rag_context_tokens_total", timings["context_tokens"])
+        if "chunks" in timings:
+            self.inc("rag_chunks_retrieved_total", timings["chunks"])
+        if "generated_tokens" in timings:
+            self.inc("rag_generated_tokens_total", timings["generated_tokens"])
+        self.trace("query", kind=kind, timings=timings)
+
+    def record_batch(self, summary: Dict[str, Any]):
+        """Records one batch of queries (see Query_Pipeline.abatch). Its shared stages (one embed call and one search
+        for the whole batch) are recorded here, each query's own stages by `record_query`."""
+        if not self.enabled:
+            return
+        for key, stage in QUERY_STAGES.items():
+            if key in summary:
+                self.observe("rag_stage_seconds", summary[key] / 1000, pipeline="query_batch", stage=stage)
+        self.inc("rag_query_batches_total")
+        self.trace("query_batch", summary=summary)
+
+    def record_indexing(self, summary: Dict[str, Any]):
+        """Records the page, chunk and vector counts of one indexing run (see Indexing_Pipeline.run)"""
+        if not self.enabled:
+            return
+        self.inc("rag_pages_parsed_total", summary.get("pages", 0))
+        self.inc("rag_chunks_embedded_total", summary.get("chunks_added", 0))
+        self.inc("rag_vectors_written_total", summary.get("vectors_written", 0))
+        self.trace("indexing", summary=summary)
+
+    def record_request(self, route: str, method: str, status: int, seconds: float):
+        """Records the latency and status code of one HTTP request"""
+        if not self.enabled:
+            return
+        self.observe("rag_request_seconds", seconds, route=route, method=method)
+        self.inc("rag_requests_total", route=route, method=method, status=status)
+        self.trace("request", route=route, method=method, status=status, ms=round(seconds * 1000, 3))
+
+    def trace(self, event: str, **data):
+        """Passes a trace ("query", "query_batch", "indexing" or "request") to the profiling hook, if one is set"""
+        if self.trace_hook is None:
+            return
+        self.trace_hook({"event": event, "time": time.time(), **data})
+
+    def _write_trace(self, trace: Dict[str, Any]):
+        line = json.dumps(trace, default=str)
+        with self._trace_lock:
+            with open(self.trace_file, "a") as f:
+                f.write(line + "\n")
+
+    def render(self) -> str:
+        """Renders every counter and histogram in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines += [f"# HELP {name} {_HELP.get(name, name)}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_format_labels(labels)} {value}" for labels, value in sorted(series.items())]
+            for name, series in sorted(self._histograms.items()):
+                lines += [f"# HELP {name} {_HELP.get(name, name)}", f"# TYPE {name} histogram"]
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Clears every counter and histogram"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# Process-wide metrics shared by the pipelines and the routes
+metrics = Metrics()
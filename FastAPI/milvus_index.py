@@ -0,0 +1,455 @@
+from dotenv import load_dotenv
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import json
+import os
+import threading
+import time
+
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores import FilterOperator, MetadataFilter, MetadataFilters
+from llama_index.core.vector_stores.types import VectorStoreQueryResult
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+
+
+load_dotenv()
+
+# Build parameters used when MILVUS_INDEX_PARAMS is not set
+DEFAULT_INDEX_PARAMS = {
+    "FLAT": {},
+    "IVF_FLAT": {"nlist": 1024},
+    "IVF_SQ8": {"nlist": 1024},
+    "IVF_PQ": {"nlist": 1024, "m": 16, "nbits": 8},
+    "HNSW": {"M": 16, "efConstruction": 200},
+}
+
+# Search parameters used when MILVUS_SEARCH_PARAMS is not set: nprobe for the IVF indexes, ef for HNSW
+DEFAULT_SEARCH_PARAMS = {
+    "FLAT": {},
+    "IVF_FLAT": {"nprobe": 16},
+    "IVF_SQ8": {"nprobe": 16},
+    "IVF_PQ": {"nprobe": 16},
+    "HNSW": {"ef": 64},
+}
+
+CONSISTENCY_LEVELS = ("Strong", "Bounded", "Session", "Eventually")
+
+# Scalar fields queries can be restricted on, and the type of their values. Each one is backed by an inverted
+# index, so a filtered search only scans the matching rows instead of the whole collection.
+FILTERABLE_FIELDS = {"file_name": str, "page_num": int}
+
+# Tenant (user or workspace) owning each chunk. It is the collection's partition key, so Milvus hashes tenants into
+# partitions and a search or delete filtered on one tenant only touches that tenant's partition.
+TENANT_FIELD = "tenant"
+
+# Query vectors sent per Milvus search by `search_many`, well under the server's limit on vectors per request
+SEARCH_BATCH_SIZE = 256
+
+FILTER_OPERATORS = (
+    FilterOperator.EQ, FilterOperator.NE, FilterOperator.GT, FilterOperator.GTE,
+    FilterOperator.LT, FilterOperator.LTE, FilterOperator.IN, FilterOperator.NIN,
+)
+
+
+def _json_env(name: str) -> Optional[Dict[str, Any]]:
+    value = os.getenv(name)
+    return json.loads(value) if value else None
+
+
+def index_params(index_type: Optional[str] = None, params: Optional[Dict[str, Any]] = None,
+                 metric_type: Optional[str] = None) -> Dict[str, Any]:
+    """Vector index definition passed to `Collection.create_index`
+
+    Args:
+        index_type (Optional[str]): FLAT, IVF_FLAT, IVF_SQ8 (scalar quantized), IVF_PQ or HNSW. Defaults to MILVUS_INDEX_TYPE or HNSW.
+        params (Optional[Dict[str, Any]]): Build parameters (e.g. {"nlist": 1024} or {"M": 16, "efConstruction": 200}).
+            Defaults to MILVUS_INDEX_PARAMS (JSON) or the defaults of the index type.
+        metric_type (Optional[str]): IP, COSINE or L2. Defaults to MILVUS_METRIC_TYPE or IP.
+
+    Returns:
+        Dict[str, Any]: {"index_type", "metric_type", "params"}
+    """
+    index_type = (index_type or os.getenv("MILVUS_INDEX_TYPE", "HNSW")).upper()
+    if index_type not in DEFAULT_INDEX_PARAMS:
+        raise ValueError(f"Milvus index type '{index_type}' not supported. Please choose one of {', '.join(DEFAULT_INDEX_PARAMS)}.")
+    if params is None:
+        params = _json_env("MILVUS_INDEX_PARAMS") or DEFAULT_INDEX_PARAMS[index_type]
+
+    return {
+        "index_type": index_type,
+        "metric_type": metric_type or os.getenv("MILVUS_METRIC_TYPE", "IP"),
+        "params": dict(params),
+    }
+
+
+def search_params(index_type: Optional[str] = None, params: Optional[Dict[str, Any]] = None,
+                  metric_type: Optional[str] = None) -> Dict[str, Any]:
+    """Search parameters passed with every vector search
+
+    Args:
+        index_type (Optional[str]): Index type the collection was built with. Defaults to MILVUS_INDEX_TYPE or HNSW.
+        params (Optional[Dict[str, Any]]): Search parameters (e.g. {"nprobe": 16} or {"ef": 64}).
+            Defaults to MILVUS_SEARCH_PARAMS (JSON) or the defaults of the index type.
+        metric_type (Optional[str]): Metric of the index. Defaults to MILVUS_METRIC_TYPE or IP.
+
+    Returns:
+        Dict[str, Any]: {"metric_type", "params"}
+    """
+    index_type = (index_type or os.getenv("MILVUS_INDEX_TYPE", "HNSW")).upper()
+    if params is None:
+        params = _json_env("MILVUS_SEARCH_PARAMS") or DEFAULT_SEARCH_PARAMS.get(index_type, {})
+
+    return {
+        "metric_type": metric_type or os.getenv("MILVUS_METRIC_TYPE", "IP"),
+        "params": dict(params),
+    }
+
+
+def consistency_level(level: Optional[str] = None) -> str:
+    """Consistency level of the reads. Defaults to MILVUS_CONSISTENCY_LEVEL or Bounded, which does not wait for the
+    latest writes to be searchable like Strong does"""
+    level = level or os.getenv("MILVUS_CONSISTENCY_LEVEL", "Bounded")
+    if level not in CONSISTENCY_LEVELS:
+        raise ValueError(f"Milvus consistency level '{level}' not supported. Please choose one of {', '.join(CONSISTENCY_LEVELS)}.")
+    return level
+
+
+def default_tenant() -> str:
+    """Tenant of the requests that do not name one. Defaults to DEFAULT_TENANT or "default"."""
+    return os.getenv("DEFAULT_TENANT", "default")
+
+
+def partition_key_enabled() -> bool:
+    """Whether new collections use the tenant field as partition key. Defaults to MILVUS_PARTITION_KEY or true;
+    Milvus Lite does not support partition keys, the tenant field is then a plain field with an inverted index."""
+    return os.getenv("MILVUS_PARTITION_KEY", "true").lower() == "true"
+
+
+def has_tenants(collection: Collection) -> bool:
+    """Whether the collection stores the tenant of its chunks (collections created before tenants only serve the default tenant)"""
+    return any(field.name == TENANT_FIELD for field in collection.schema.fields)
+
+
+def collection_schema(dim: int, partition_key: Optional[bool] = None) -> CollectionSchema:
+    """Schema of the chunk collection. The node text and the remaining metadata written by MilvusVectorStore
+    are stored as dynamic fields."""
+    partition_key = partition_key if partition_key is not None else partition_key_enabled()
+    fields = [
+        FieldSchema(name="id", dtype=DataType.VARCHAR, is_primary=True, auto_id=False, max_length=65535),
+        FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=dim),
+        FieldSchema(name="file_name", dtype=DataType.VARCHAR, max_length=65535),
+        FieldSchema(name="page_num", dtype=DataType.INT64),
+        FieldSchema(name="page_hash", dtype=DataType.VARCHAR, max_length=64),
+        FieldSchema(name="content_hash", dtype=DataType.VARCHAR, max_length=64),
+        FieldSchema(name=TENANT_FIELD, dtype=DataType.VARCHAR, max_length=256, is_partition_key=partition_key),
+    ]
+    return CollectionSchema(fields=fields, enable_dynamic_field=True)
+
+
+def ensure_collection(collection_name: str, dim: int, index: Optional[Dict[str, Any]] = None,
+                      level: Optional[str] = None, using: str = "default", partition_key: Optional[bool] = None) -> Collection:
+    """Creates the collection, its vector index and the scalar indexes of the filterable fields if they do not exist
+    yet, and loads the collection into memory
+
+    Args:
+        collection_name (str): Name of the collection
+        dim (int): Dimension of the vectors
+        index (Optional[Dict[str, Any]]): Index definition (see `index_params`). Defaults to the environment's.
+        level (Optional[str]): Default consistency level of the collection. Defaults to the environment's.
+        using (str): Milvus connection alias
+        partition_key (Optional[bool]): Partition a new collection by tenant (see `partition_key_enabled`)
+
+    Returns:
+        Collection: The loaded collection
+    """
+    if utility.has_collection(collection_name, using=using):
+        collection = Collection(name=collection_name, using=using)
+    else:
+        partition_key = partition_key if partition_key is not None else partition_key_enabled()
+        # Tenants are hashed into MILVUS_NUM_PARTITIONS partitions
+        partitions = {"num_partitions": int(os.getenv("MILVUS_NUM_PARTITIONS", 64))} if partition_key else {}
+        collection = Collection(
+            name=collection_name,
+            schema=collection_schema(dim, partition_key=partition_key),
+            consistency_level=consistency_level(level),
+            using=using,
+            **partitions,
+        )
+        print(f"Created Milvus collection '{collection_name}' with {dim} dimensions"
+              f"{', partitioned by tenant' if partition_key else ''}")
+
+    indexed_fields = {existing.field_name for existing in collection.indexes}
+    if "embedding" not in indexed_fields:
+        index = index or index_params()
+        collection.create_index(field_name="embedding", index_params=index)
+        print(f"Built {index['index_type']} index on '{collection_name}' with {index['params']}")
+
+    scalar_fields = list(FILTERABLE_FIELDS)
+    if has_tenants(collection) and collection.schema.partition_key_field is None:
+        scalar_fields.append(TENANT_FIELD)
+    missing_scalar_indexes = [field for field in scalar_fields if field not in indexed_fields]
+    if missing_scalar_indexes:
+        # Collections created before the filterable fields were indexed may already be loaded
+        collection.release()
+        for field in missing_scalar_indexes:
+            collection.create_index(field_name=field, index_params={"index_type": "INVERTED"}, index_name=f"{field}_index")
+        print(f"Built INVERTED indexes on '{collection_name}' for {', '.join(missing_scalar_indexes)}")
+
+    # Loading an already loaded collection is a no-op, it then stays in memory across requests
+    collection.load()
+    return collection
+
+
+def in_expression(field: str, values: Iterable[Any]) -> str:
+    """Milvus expression matching the rows whose field is one of the values, with the strings escaped"""
+    return f"{field} in [{', '.join(json.dumps(value) for value in values)}]"
+
+
+def fetch_embeddings(collection: Collection, ids: List[str], **kwargs) -> Dict[str, List[float]]:
+    """Stored vectors of the given chunk ids, queried in batches of 1000 (kwargs are passed to `Collection.query`)"""
+    embeddings = {}
+    for i in range(0, len(ids), 1000):
+        expr = in_expression("id", ids[i:i + 1000])
+        for row in collection.query(expr=expr, output_fields=["id", "embedding"], **kwargs):
+            embeddings[row["id"]] = row["embedding"]
+    return embeddings
+
+
+def search_many(vector_store: Any, embeddings: List[List[float]], top_k: int,
+                filters: Optional[MetadataFilters] = None) -> List[VectorStoreQueryResult]:
+    """Top-k chunks of many query vectors, with one Milvus search per SEARCH_BATCH_SIZE vectors instead of one per
+    query. A chunk retrieved by several queries is parsed once, and the same node is returned to each of them.
+
+    Args:
+        vector_store (MilvusVectorStore): Store of the collection, whose search parameters are used
+        embeddings (List[List[float]]): Query vectors
+        top_k (int): Results per query
+        filters (Optional[MetadataFilters]): Filters of every query, translated as in `MilvusVectorStore.query`
+
+    Returns:
+        List[VectorStoreQueryResult]: One result per query vector
+    """
+    # The same translation as the single-query path, so both search the same chunks
+    from llama_index.vector_stores.milvus.base import _to_milvus_filter
+
+    expr = _to_milvus_filter(filters) if filters is not None else ""
+    nodes_by_id: Dict[str, BaseNode] = {}
+    results = []
+    for i in range(0, len(embeddings), SEARCH_BATCH_SIZE):
+        hits_per_query = vector_store.client.search(
+            collection_name=vector_store.collection_name,
+            data=embeddings[i:i + SEARCH_BATCH_SIZE],
+            filter=expr,
+            limit=top_k,
+            output_fields=["_node_content", "_node_type"],
+            search_params=vector_store.search_config,
+            anns_field=vector_store.embedding_field,
+        )
+        for hits in hits_per_query:
+            nodes = []
+            for hit in hits:
+                node = nodes_by_id.get(hit["id"])
+                if node is None:
+                    node = nodes_by_id[hit["id"]] = metadata_dict_to_node(
+                        {"_node_content": hit["entity"].get("_node_content"), "_node_type": hit["entity"].get("_node_type")}
+                    )
+                nodes.append(node)
+            results.append(VectorStoreQueryResult(nodes=nodes, similarities=[hit["distance"] for hit in hits],
+                                                  ids=[hit["id"] for hit in hits]))
+    return results
+
+
+def metadata_filters(documents: Optional[List[str]] = None, filters: Optional[List[Dict[str, Any]]] = None,
+                     tenant: Optional[str] = None) -> Optional[MetadataFilters]:
+    """Filters restricting a query to some documents or pages, pushed down to Milvus as a scalar filter expression
+
+    Args:
+        documents (Optional[List[str]]): File names of the documents to search
+        filters (Optional[List[Dict[str, Any]]]): Conditions on the filterable fields, all of which must hold, as
+            {"key": "page_num", "operator": ">=", "value": 10}. Operators: ==, !=, >, >=, <, <=, in, nin.
+        tenant (Optional[str]): Tenant whose chunks are searched. The filter on the partition key lets Milvus
+            search that tenant's partition only.
+
+    Raises:
+        ValueError: On an unknown field or operator, or a value of the wrong type
+
+    Returns:
+        Optional[MetadataFilters]: None when the query is not restricted
+    """
+    conditions = [{"key": "file_name", "operator": "in", "value": list(documents)}] if documents else []
+    conditions.extend(filters or [])
+
+    metadata_filters = [MetadataFilter(key=TENANT_FIELD, operator=FilterOperator.IN, value=[tenant])] if tenant is not None else []
+    for condition in conditions:
+        key = condition.get("key")
+        if key not in FILTERABLE_FIELDS:
+            raise ValueError(f"Cannot filter on '{key}'. Please choose one of {', '.join(FILTERABLE_FIELDS)}.")
+        try:
+            operator = FilterOperator(condition.get("operator", "=="))
+        except ValueError:
+            operator = None
+        if operator not in FILTER_OPERATORS:
+            raise ValueError(f"Filter operator '{condition.get('operator')}' not supported. Please choose one of {', '.join(op.value for op in FILTER_OPERATORS)}.")
+
+        value_type = FILTERABLE_FIELDS[key]
+        values = condition.get("value")
+        values = values if isinstance(values, list) else [values]
+        if not values or not all(isinstance(value, value_type) and not isinstance(value, bool) for value in values):
+            raise ValueError(f"Filter on '{key}' expects {value_type.__name__} values, got {condition.get('value')!r}.")
+        if operator not in (FilterOperator.IN, FilterOperator.NIN) and len(values) != 1:
+            raise ValueError(f"Filter operator '{operator.value}' expects a single value, got {condition.get('value')!r}.")
+
+        if value_type is str:
+            # Single string values are written into the expression unescaped, lists are written with their escaped repr
+            if operator in (FilterOperator.EQ, FilterOperator.NE):
+                operator = FilterOperator.IN if operator == FilterOperator.EQ else FilterOperator.NIN
+            elif operator not in (FilterOperator.IN, FilterOperator.NIN):
+                raise ValueError(f"Filter operator '{operator.value}' not supported on '{key}'.")
+        value = values if operator in (FilterOperator.IN, FilterOperator.NIN) else values[0]
+        metadata_filters.append(MetadataFilter(key=key, operator=operator, value=value))
+
+    return MetadataFilters(filters=metadata_filters) if metadata_filters else None
+
+
+def tenant_expression(tenant: str) -> str:
+    """Milvus expression matching the chunks of a tenant"""
+    return f"{TENANT_FIELD} == {json.dumps(tenant)}"
+
+
+def file_names_with_prefix(collection: Collection, prefix: str, expr: Optional[str] = None, **kwargs) -> List[str]:
+    """Names of the indexed files starting with the prefix (kwargs are passed to `Collection.query_iterator`)
+
+    Args:
+        collection (Collection): Chunk collection
+        prefix (str): File name prefix
+        expr (Optional[str]): Additional condition on the chunks, e.g. a tenant expression
+    """
+    # LIKE treats "%" and "_" as wildcards and backslashes as escapes: match a superset (up to the first
+    # backslash), then keep the exact prefix matches
+    like_prefix = prefix.split("\\")[0]
+    like = f"file_name like {json.dumps(like_prefix + '%')}"
+    iterator = collection.query_iterator(
+        batch_size=1000, expr=f"{expr} and {like}" if expr else like, output_fields=["file_name"], **kwargs
+    )
+    file_names = set()
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            file_names.update(row["file_name"] for row in rows if row["file_name"].startswith(prefix))
+    finally:
+        iterator.close()
+    return sorted(file_names)
+
+
+def indexed_file_names(collection: Collection, file_names: Iterable[str], **kwargs) -> List[str]:
+    """Names among the given files that still have chunks in the collection, of any tenant (kwargs are passed to
+    `Collection.query_iterator`)"""
+    file_names = sorted(set(file_names))
+    indexed = set()
+    for i in range(0, len(file_names), 1000):
+        iterator = collection.query_iterator(
+            batch_size=1000, expr=in_expression("file_name", file_names[i:i + 1000]), output_fields=["file_name"], **kwargs
+        )
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                indexed.update(row["file_name"] for row in rows)
+        finally:
+            iterator.close()
+    return sorted(indexed)
+
+
+class CompactionScheduler():
+
+    """Compacts a collection in the background once enough rows were deleted, instead of after every delete.
+
+       Deletes only mark rows as deleted; compaction rewrites the segments without them. Deletes are recorded with
+       `record_deletes`, and a background thread checks every `interval_s` whether the rows deleted since the last
+       compaction reach `min_deletes` or `delete_ratio` of the collection, or have been pending for `max_delay_s`.
+       The thread is started on the first recorded delete.
+
+    Args:
+        get_collection (Callable[[], Collection]): Returns the collection to compact
+        min_deletes (Optional[int]): Defaults to MILVUS_COMPACTION_MIN_DELETES or 10000.
+        delete_ratio (Optional[float]): Defaults to MILVUS_COMPACTION_DELETE_RATIO or 0.1.
+        interval_s (Optional[float]): Defaults to MILVUS_COMPACTION_INTERVAL_S or 60.
+        max_delay_s (Optional[float]): Defaults to MILVUS_COMPACTION_MAX_DELAY_S or 3600.
+
+    """
+
+    def __init__(self, get_collection: Callable[[], Collection], min_deletes: Optional[int] = None,
+                 delete_ratio: Optional[float] = None, interval_s: Optional[float] = None, max_delay_s: Optional[float] = None):
+        self.get_collection = get_collection
+        self.min_deletes = min_deletes if min_deletes is not None else int(os.getenv("MILVUS_COMPACTION_MIN_DELETES", 10000))
+        self.delete_ratio = delete_ratio if delete_ratio is not None else float(os.getenv("MILVUS_COMPACTION_DELETE_RATIO", 0.1))
+        self.interval_s = interval_s if interval_s is not None else float(os.getenv("MILVUS_COMPACTION_INTERVAL_S", 60))
+        self.max_delay_s = max_delay_s if max_delay_s is not None else float(os.getenv("MILVUS_COMPACTION_MAX_DELAY_S", 3600))
+        self._pending = 0
+        self._first_pending_at = None
+        self._counters = {"deletes_recorded": 0, "compactions": 0, "errors": 0}
+        self._last_compaction_at = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def record_deletes(self, count: int):
+        """Records rows deleted from the collection"""
+        if count <= 0:
+            return
+        with self._lock:
+            self._pending += count
+            self._counters["deletes_recorded"] += count
+            if self._first_pending_at is None:
+                self._first_pending_at = time.monotonic()
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._loop, name="milvus-compaction", daemon=True)
+                self._thread.start()
+
+    def due(self) -> bool:
+        """Whether the pending deletes reach one of the thresholds"""
+        with self._lock:
+            pending, first_pending_at = self._pending, self._first_pending_at
+        if not pending:
+            return False
+        if pending >= self.min_deletes or time.monotonic() - first_pending_at >= self.max_delay_s:
+            return True
+        return pending >= self.delete_ratio * max(self.get_collection().num_entities, 1)
+
+    def compact(self):
+        """Triggers a compaction of the collection (Milvus runs it asynchronously) and resets the pending deletes"""
+        with self._lock:
+            pending = self._pending
+            self._pending = 0
+            self._first_pending_at = None
+        try:
+            self.get_collection().compact()
+        except Exception:
+            with self._lock:
+                self._pending += pending
+                if self._first_pending_at is None:
+                    self._first_pending_at = time.monotonic()
+                self._counters["errors"] += 1
+            raise
+        with self._lock:
+            self._counters["compactions"] += 1
+            self._last_compaction_at = time.time()
+        print(f"Triggered Milvus compaction after {pending} deleted rows")
+
+    def _loop(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                if self.due():
+                    self.compact()
+            except Exception as e:
+                print(f"Error compacting Milvus collection: {e}")
+
+    def shutdown(self):
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"pending_deletes": self._pending, "last_compaction_at": self._last_compaction_at, **self._counters}
@@ -0,0 +1,146 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+import multiprocessing
+import os
+import resource
+import tempfile
+import threading
+import time
+
+import PyPDF2
+
+
+# Size of the reads used to spool MinIO objects to disk
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def spool_object(minio_client, bucket_name: str, object_name: str) -> str:
+    """Streams a MinIO object to a temporary file without holding it in memory
+
+    Args:
+        minio_client (Minio): MinIO client
+        bucket_name (str): Bucket of the object
+        object_name (str): Name of the object
+
+    Returns:
+        str: Path of the temporary file (to be removed by the caller)
+    """
+    suffix = os.path.splitext(object_name)[1]
+    response = minio_client.get_object(bucket_name, object_name)
+    try:
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+            for data in response.stream(SPOOL_CHUNK_SIZE):
+                f.write(data)
+            return f.name
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def _sanitize(text: str) -> str:
+    return text.encode('utf-8', 'ignore').decode('utf-8', 'ignore')
+
+
+def extract_page_range(pdf_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extracts the text of pages [start, end) of a PDF. Runs in the worker processes.
+
+    Args:
+        pdf_path (str): Path of the PDF file
+        start (int): First page number
+        end (int): Page number after the last one
+
+    Returns:
+        List[Tuple[int, str]]: (page number, text) of every page in the range
+    """
+    # An open file handle keeps PyPDF2 reading from disk instead of loading the whole file into memory
+    with open(pdf_path, "rb") as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        return [(page_num, _sanitize(pdf_reader.pages[page_num].extract_text() or "")) for page_num in range(start, end)]
+
+
+def count_pages(pdf_path: str) -> int:
+    with open(pdf_path, "rb") as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    # Spawned (not forked) workers: the API process runs threads, and the workers only need PyPDF2
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def iter_pdf_pages(pdf_path: str, workers: Optional[int] = None, pages_per_task: Optional[int] = None,
+                   stats: Optional[Dict] = None) -> Iterator[Tuple[int, str]]:
+    """Extracts the pages of a PDF in parallel over page ranges, yielding them in page order as soon as they are ready
+
+    Args:
+        pdf_path (str): Path of the PDF file
+        workers (Optional[int]): Number of extraction processes. Defaults to PDF_EXTRACT_WORKERS or the number of CPUs, 1 extracts in-process.
+        pages_per_task (Optional[int]): Pages extracted per task. Defaults to PDF_PAGES_PER_TASK or 16.
+        stats (Optional[Dict]): If given, filled with pages, seconds, pages_per_s and peak_rss_mb
+
+    Yields:
+        Tuple[int, str]: (page number, text) of each page
+    """
+    workers = workers or int(os.getenv("PDF_EXTRACT_WORKERS", os.cpu_count() or 1))
+    pages_per_task = pages_per_task or int(os.getenv("PDF_PAGES_PER_TASK", 16))
+    stats = {} if stats is None else stats
+
+    start_time = time.perf_counter()
+    num_pages = count_pages(pdf_path)
+    ranges = [(start, min(start + pages_per_task, num_pages)) for start in range(0, num_pages, pages_per_task)]
+
+    if workers <= 1 or len(ranges) <= 1:
+        for start, end in ranges:
+            yield from extract_page_range(pdf_path, start, end)
+    else:
+        pool = _get_pool(workers)
+        futures = [pool.submit(extract_page_range, pdf_path, start, end) for start, end in ranges]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    seconds = time.perf_counter() - start_time
+    stats.update({
+        "pages": num_pages,
+        "seconds": round(seconds, 3),
+        "pages_per_s": round(num_pages / seconds, 2) if seconds else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    })
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Peak resident set size of this process and of the extraction worker processes, in MB"""
+    # ru_maxrss is reported in kilobytes on Linux
+    peaks = {"self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    if _pool is not None:
+        # The workers stay alive between jobs, read their high-water mark from /proc where available
+        worker_peaks = [_proc_peak_rss_mb(pid) for pid in list(getattr(_pool, "_processes", None) or {})]
+        worker_peaks = [peak for peak in worker_peaks if peak is not None]
+        if worker_peaks:
+            peaks["worker_max"] = max(worker_peaks)
+    return peaks
+
+
+def _proc_peak_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
@@ -1,25 +1,63 @@
 from dotenv import load_dotenv
-from typing import Union
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import json
 import os
+import threading
+import time
 
 from pydantic import BaseModel, Field
 from llama_index.core import PromptTemplate
 from llama_index.core.query_engine import CustomQueryEngine
 from llama_index.core.retrievers import BaseRetriever
-from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.llms import LLM, ChatMessage, MessageRole
 from llama_index.core import VectorStoreIndex
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.core.vector_stores import MetadataFilters
+from llama_index.core.vector_stores.types import VectorStoreQueryResult
 
-from llama_index.embeddings.nvidia import NVIDIAEmbedding
-from llama_index.llms.nvidia import NVIDIA
-from llama_index.llms.azure_openai import AzureOpenAI
-from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
 
-from llama_index.vector_stores.milvus import MilvusVectorStore
-from pymilvus import connections, utility
+from pymilvus import Collection, utility
+
+from FastAPI.cache import AnswerCache
+from FastAPI.clients import clients, milvus_uri
+from FastAPI.concurrency import limiter
+from FastAPI.lexical import BM25Index, HybridRetriever
+from FastAPI.metrics import metrics
+from FastAPI.local_store import LocalVectorStore, vector_store_backend
+from FastAPI.milvus_index import consistency_level, default_tenant, fetch_embeddings, has_tenants, metadata_filters, search_many, search_params
+from FastAPI.rerank import ContextReranker
 
 
 load_dotenv()
 
+QA_PROMPT_TMPL = (
+    "You are a chatbot assisting a user with a question specific to the provided context. Keep your answers concise and straight to the point.\n"
+    "The context below is retreived from the user's documents. You SHOULD ONLY USE THE USER'S CONTEXT BELOW.\n"
+    "---------------------\n"
+    "User's context: {context_str}\n"
+    "---------------------\n"
+    "If the user's context is not provided or is irrelevant to the query, say I don't have the required context, please upload documents on the left.\n"
+    "DO NOT USE YOUR OWN PRIOR KNOWLEDGE.\n"
+    "Query: {query_str}\n"
+    "You can help the user by formatting your response if the response is long.\n"
+    "Answer: "
+)
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _filter_scope(filters: Optional[MetadataFilters], tenant: Optional[str] = None) -> str:
+    """Answer cache scope of a query, so answers of different tenants or restricted to different documents are cached apart"""
+    scope = [tenant or default_tenant()]
+    if filters is not None:
+        scope += [filters.condition.value] + [[f.key, f.operator.value, f.value] for f in filters.filters]
+    return json.dumps(scope)
+
+
 class Query_Pipeline():
 
     """Pipeline for querying the vector store. 
@@ -28,54 +66,99 @@ class Query_Pipeline():
     Args:
         model_host (Optional[str], optional): Host of the model (E.g. Azure, NVIDIA). Defaults to "NVIDIA".
         model_name (Optional[str], optional): Name of the model (E.g. gpt-35-turbo, mistralai/mistral-7b-instruct-v0.2). Defaults to "mistralai/mistral-7b-instruct-v0.2".
+        embedder (optional): Pre-built embedder to share with other pipelines. Taken from the client registry on first use if not given.
+        llm_model (optional): Pre-built LLM to share with other pipelines. Taken from the client registry on first use if not given.
+        answer_cache (Optional[AnswerCache], optional): Cache of answers in front of the query engine. Configured from the environment if not given.
+        lexical_index (Optional[BM25Index], optional): Lexical index fused with the Milvus results when enabled. Configured from the environment if not given.
+        reranker (Optional[ContextReranker], optional): Post-retrieval stage packing the prompt context. Configured from the environment if not given.
+
+    The pipeline is meant to be built once per process and shared across requests. The Milvus
+    connection, retriever and query engine are built lazily on the first query and reused until
+    `refresh` is called (e.g. after the collection is created, re-indexed or dropped), which also
+    invalidates the answer cache. Queries restricted with metadata filters get a query engine of their
+    own over the same index, and the filters are pushed down to the Milvus search. In collections
+    partitioned by tenant, every query is restricted to the caller's tenant (DEFAULT_TENANT if not given).
     
     """
-    def __init__(self):
+    def __init__(self, embedder=None, llm_model=None, answer_cache: Optional[AnswerCache] = None,
+                 lexical_index: Optional[BM25Index] = None, reranker: Optional[ContextReranker] = None):
         self.model_host = os.getenv("MODEL_HOST", "NVIDIA")
         self.collection_name = os.getenv("MILVUS_COLLECTION_NAME", "test")
-        self.embedder = self.initialize_embedder()  
-        self.llm_model = self.initialize_llm_model()
+        self.vector_store_backend = vector_store_backend()
+        # Built on first use (or by the startup warm-up), so that building the pipeline does not import the provider SDKs
+        self._embedder = embedder
+        self._llm_model = llm_model
+        self.qa_prompt = PromptTemplate(QA_PROMPT_TMPL)
+        self.answer_cache = answer_cache if answer_cache is not None else AnswerCache()
+        self.lexical_index = lexical_index if lexical_index is not None else BM25Index()
+        self.similarity_top_k = int(os.getenv("SIMILARITY_TOP_K", 5))
+        self.hybrid_candidates = int(os.getenv("HYBRID_CANDIDATES", 20))
+        # LLM calls in flight per /query/batch request (also bounded by the process-wide LLM limit), and questions per batch
+        self.batch_concurrency = int(os.getenv("BATCH_QUERY_CONCURRENCY", 8))
+        self.max_batch_size = int(os.getenv("BATCH_QUERY_MAX_SIZE", 1000))
+        self.reranker = reranker if reranker is not None else ContextReranker(fetch_vectors=self.fetch_vectors, top_k=self.similarity_top_k)
+        self.multi_tenant = False
+        self._index = None
+        self._query_engine = None
+        self._lock = threading.RLock()
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = self.initialize_embedder()
+        return self._embedder
+
+    @embedder.setter
+    def embedder(self, embedder):
+        self._embedder = embedder
+
+    @property
+    def llm_model(self):
+        if self._llm_model is None:
+            self._llm_model = self.initialize_llm_model()
+        return self._llm_model
+
+    @llm_model.setter
+    def llm_model(self, llm_model):
+        self._llm_model = llm_model
 
     def initialize_embedder(self):
-        if self.model_host == "NVIDIA":
-            os.environ["NVIDIA_API_KEY"] = os.getenv("NVIDIA_API_KEY")
-            embedder = NVIDIAEmbedding(
-                model=os.getenv('EMBEDDING_MODEL', 'nvidia/nv-embedqa-e5-v5'),
-                truncate="END")
-
-        elif self.model_host == "AZURE":
-            embedder = AzureOpenAIEmbedding(
-                model=os.getenv('EMBEDDING_MODEL'),
-                engine=os.getenv('EMBEDDING_MODEL'),
-                api_version=os.getenv('LLM_API_VERSION'),
-                azure_endpoint=os.getenv('LLM_ENDPOINT'),
-                api_key=os.getenv('LLM_API_KEY')
-            )  
-
-        return embedder
+        # Shared through the client registry, it caches repeated query embeddings and merges concurrent ones
+        return clients.embedder()
     
     def connect_to_milvus_store(self):
         """
-        Connects to an existing Milvus collection if it exists.
+        Connects to an existing Milvus collection if it exists, and loads it into memory so it stays loaded
+        across requests. Searches use the MILVUS_SEARCH_PARAMS (nprobe / ef) and MILVUS_CONSISTENCY_LEVEL settings.
+        With VECTOR_STORE_BACKEND=local, returns the collection's embedded vector store instead (see `FastAPI.local_store`).
 
         Returns:
             str: Message indicating the status of the connection
         """
+        if self.vector_store_backend == "local":
+            local_store = clients.local_store(self.collection_name)
+            if not local_store.exists():
+                raise Exception(f"Local vector store '{self.collection_name}' does not exist. Please index documents before querying.")
+            # Every chunk of the local store records its tenant
+            self.multi_tenant = True
+            return local_store
         
-        # Establish a connection to Milvus
-        milvus_host = os.getenv("MILVUS_HOST", "localhost")
-        milvus_port = os.getenv("MILVUS_PORT", 19530)
-
-        connections.connect(host=milvus_host, port=milvus_port)
+        # Shared connection, opened once per process
+        using = clients.milvus()
         
         # Check if the collection already exists
-        if utility.has_collection(self.collection_name):
+        if utility.has_collection(self.collection_name, using=using):
             print(f"Milvus collection '{self.collection_name}' exists. Querying from collection.")
-            milvus_store = MilvusVectorStore(
-                collection_name=self.collection_name,
-                uri=f"http://{milvus_host}:{milvus_port}/",
+            collection = Collection(name=self.collection_name, using=using)
+            collection.load()
+            self.multi_tenant = has_tenants(collection)
+            # Reused across refreshes, so reconnecting after an indexing job does not open a new Milvus client
+            milvus_store = clients.milvus_store(
+                self.collection_name,
+                uri=milvus_uri(),
                 overwrite=False,
-                consistency_level="Strong"
+                consistency_level=consistency_level(),
+                search_config=search_params(),
             )
             
             return milvus_store
@@ -83,100 +166,696 @@ class Query_Pipeline():
         else:
             raise Exception(f"Milvus collection '{self.collection_name}' does not exist. Please index documents before querying.")
         
-    def initalize_retriever(self):
-        milvus_store = self.connect_to_milvus_store()
-        index = VectorStoreIndex.from_vector_store(vector_store=milvus_store, embed_model=self.embedder)
-        retriever = index.as_retriever(
-            similarity_top_k=5,
+    def get_index(self) -> VectorStoreIndex:
+        """Returns the shared index over the Milvus collection, connecting on first use"""
+        with self._lock:
+            if self._index is None:
+                milvus_store = self.connect_to_milvus_store()
+                self._index = VectorStoreIndex.from_vector_store(vector_store=milvus_store, embed_model=self.embedder)
+            return self._index
+
+    def _retrieval_top_k(self) -> int:
+        # With the reranker on, over-fetch candidates and let it choose the chunks that go into the prompt
+        return max(self.similarity_top_k, self.reranker.fetch_k) if self.reranker.enabled else self.similarity_top_k
+
+    def initalize_retriever(self, filters: Optional[MetadataFilters] = None):
+        index = self.get_index()
+        top_k = self._retrieval_top_k()
+        if not self.lexical_index.enabled:
+            return index.as_retriever(similarity_top_k=top_k, filters=filters)
+
+        # Over-fetch from Milvus so reciprocal-rank fusion has candidates from both sides
+        candidates = max(top_k, self.hybrid_candidates)
+        retriever = HybridRetriever(
+            dense_retriever=index.as_retriever(similarity_top_k=candidates, filters=filters),
+            lexical_index=self.lexical_index,
+            similarity_top_k=top_k,
+            candidates=candidates,
+            filters=filters,
         )
 
         return retriever
 
+    def fetch_vectors(self, ids: List[str]) -> Dict[str, List[float]]:
+        """Stored vectors of the given chunk ids, used by the reranker on vector cache misses"""
+        if self.vector_store_backend == "local":
+            return clients.local_store(self.collection_name).fetch_embeddings(ids)
+        return fetch_embeddings(Collection(name=self.collection_name, using=clients.milvus()), ids)
+
     def initialize_llm_model(self):
-        if self.model_host == "AZURE":
-            llm_model = AzureOpenAI(model=os.getenv('LLM_MODEL'),
-                                    engine=os.getenv('LLM_MODEL'),
-                                    api_version=os.getenv('LLM_API_VERSION'),
-                                    azure_endpoint=os.getenv('LLM_ENDPOINT'),
-                                    api_key=os.getenv('LLM_API_KEY')
-                                    )
+        return clients.llm()
+    
+    
+    def _build_query_engine(self, filters: Optional[MetadataFilters] = None) -> "RAGStringQueryEngine":
+        return RAGStringQueryEngine(
+            retriever=self.initalize_retriever(filters),
+            llm=self.llm_model,
+            qa_prompt=self.qa_prompt,
+            embed_model=self.embedder,
+            use_chat=self.model_host != "AZURE",
+            reranker=self.reranker if self.reranker.enabled else None,
+        )
 
-        elif self.model_host == "NVIDIA":
-            llm_model = NVIDIA(model=os.getenv('LLM_MODEL'))
+    def tenant_filters(self, filters: Optional[MetadataFilters], tenant: Optional[str]) -> Optional[MetadataFilters]:
+        """Adds the tenant restriction to the query filters, once connected to the collection
 
-        else:
-            raise ValueError("Unsupported model host specified in configuration.")
+        Raises:
+            ValueError: If the collection was created without tenants and the tenant is not the default one
+        """
+        tenant = tenant or default_tenant()
+        if not self.multi_tenant:
+            if tenant != default_tenant():
+                raise ValueError(f"Milvus collection '{self.collection_name}' was created without tenants, only the default tenant can query it.")
+            return filters
 
-        return llm_model
-    
-    
-    def run(self, query:str):
+        scoped = metadata_filters(tenant=tenant)
+        return scoped if filters is None else MetadataFilters(filters=scoped.filters + filters.filters)
+
+    def get_query_engine(self, filters: Optional[MetadataFilters] = None, tenant: Optional[str] = None) -> "RAGStringQueryEngine":
+        """Returns the shared query engine, building the retriever on first use.
+
+        Args:
+            filters (Optional[MetadataFilters]): Restricts retrieval to the matching chunks. A filtered query engine
+                is built over the shared index for each call.
+            tenant (Optional[str]): Tenant whose chunks are searched. Defaults to DEFAULT_TENANT.
+
+        Returns:
+            RAGStringQueryEngine: Query engine reused across requests until `refresh` is called
+        """
+        self.get_index()
+        filters = self.tenant_filters(filters, tenant)
+        if filters is not None:
+            return self._build_query_engine(filters)
+
+        query_engine = self._query_engine
+        if query_engine is None:
+            with self._lock:
+                if self._query_engine is None:
+                    self._query_engine = self._build_query_engine()
+                query_engine = self._query_engine
+
+        return query_engine
+
+    def refresh(self):
+        """
+        Drops the cached retriever, query engine and answers so the next query reconnects to the collection
+        """
+        with self._lock:
+            self._index = None
+            self._query_engine = None
+        self.answer_cache.invalidate()
+
+    def run(self, query:str, timings: Optional[Dict[str, float]] = None, filters: Optional[MetadataFilters] = None,
+            tenant: Optional[str] = None):
         
         """Run the query pipeline.
 
         Args:
             query (str): Query
+            timings (Optional[Dict[str, float]]): If given, filled with the per-stage latency breakdown in milliseconds
+            filters (Optional[MetadataFilters]): Restricts retrieval to some documents or pages (see `milvus_index.metadata_filters`)
+            tenant (Optional[str]): Tenant whose documents are searched. Defaults to DEFAULT_TENANT.
 
         Returns:
             response: Response to query
         """
+        timings = {} if timings is None else timings
+        scope = _filter_scope(filters, tenant)
 
-        qa_prompt = PromptTemplate( "You are a chatbot assisting a user with a question specific to the provided context. Keep your answers concise and straight to the point.\n"
-                                "The context below is retreived from the user's documents. You SHOULD ONLY USE THE USER'S CONTEXT BELOW.\n"
-                                "---------------------\n"
-                                "User's context: {context_str}\n"
-                                "---------------------\n"
-                                "If the user's context is not provided or is irrelevant to the query, say I don't have the required context, please upload documents on the left.\n"
-                                "DO NOT USE YOUR OWN PRIOR KNOWLEDGE.\n"
-                                "Query: {query_str}\n"
-                                "You can help the user by formatting your response if the response is long.\n"
-                                "Answer: "
-                                )
-        
-        
-        # Set up retriever, LLM, and query engine
-        retriever = self.initalize_retriever()
-        llm = self.llm_model
-
-        query_engine = RAGStringQueryEngine(
-            retriever=retriever,
-            llm=llm,
-            qa_prompt=qa_prompt,
-        )
+        start = time.perf_counter()
+        generation = self.answer_cache.generation
+        cached, query_embedding = self._lookup_cache(query, timings, scope)
+        if cached is not None:
+            self._finish(timings, start, "run")
+            return cached["response"]
+
+        setup_start = time.perf_counter()
+        query_engine = self.get_query_engine(filters, tenant)
+        timings["setup_ms"] = _elapsed_ms(setup_start)
 
-        response = query_engine.custom_query(query_str=query)
+        response, sources = query_engine.query_with_sources(query_str=query, timings=timings, query_embedding=query_embedding)
+        self.answer_cache.put(query, {"response": response, "sources": sources}, query_embedding, generation, scope)
+        self._finish(timings, start, "run")
 
         return response
+
+    def stream(self, query:str, timings: Optional[Dict[str, float]] = None, filters: Optional[MetadataFilters] = None,
+               tenant: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Run the query pipeline, yielding the answer as it is generated.
+
+        Args:
+            query (str): Query
+            timings (Optional[Dict[str, float]]): If given, filled with the per-stage latency breakdown in milliseconds
+            filters (Optional[MetadataFilters]): Restricts retrieval to some documents or pages (see `milvus_index.metadata_filters`)
+            tenant (Optional[str]): Tenant whose documents are searched. Defaults to DEFAULT_TENANT.
+
+        Yields:
+            Dict[str, Any]: A "sources" event with the retrieved chunk metadata, then one "token" event per LLM delta
+        """
+        timings = {} if timings is None else timings
+        scope = _filter_scope(filters, tenant)
+
+        start = time.perf_counter()
+        generation = self.answer_cache.generation
+        cached, query_embedding = self._lookup_cache(query, timings, scope)
+        if cached is not None:
+            yield from self._cached_events(cached)
+            self._finish(timings, start, "stream")
+            return
+
+        setup_start = time.perf_counter()
+        query_engine = self.get_query_engine(filters, tenant)
+        timings["setup_ms"] = _elapsed_ms(setup_start)
+
+        events = query_engine.custom_query_stream(query_str=query, timings=timings, query_embedding=query_embedding)
+        yield from self._caching_events(events, query, query_embedding, generation, scope)
+        self._finish(timings, start, "stream")
+
+    async def aget_query_engine(self, filters: Optional[MetadataFilters] = None, tenant: Optional[str] = None) -> "RAGStringQueryEngine":
+        """Async version of `get_query_engine`, connecting to Milvus in a worker thread on first use"""
+        if self._index is not None:
+            return self.get_query_engine(filters, tenant)
+        return await asyncio.to_thread(self.get_query_engine, filters, tenant)
+
+    async def arun(self, query:str, timings: Optional[Dict[str, float]] = None, filters: Optional[MetadataFilters] = None,
+                   tenant: Optional[str] = None):
+        """Async version of `run`. Retrieval and generation never block the event loop.
+
+        Args:
+            query (str): Query
+            timings (Optional[Dict[str, float]]): If given, filled with the per-stage latency breakdown in milliseconds
+            filters (Optional[MetadataFilters]): Restricts retrieval to some documents or pages (see `milvus_index.metadata_filters`)
+            tenant (Optional[str]): Tenant whose documents are searched. Defaults to DEFAULT_TENANT.
+
+        Returns:
+            response: Response to query
+        """
+        timings = {} if timings is None else timings
+        scope = _filter_scope(filters, tenant)
+
+        start = time.perf_counter()
+        generation = self.answer_cache.generation
+        cached, query_embedding = await self._alookup_cache(query, timings, scope)
+        if cached is not None:
+            self._finish(timings, start, "run")
+            return cached["response"]
+
+        setup_start = time.perf_counter()
+        query_engine = await self.aget_query_engine(filters, tenant)
+        timings["setup_ms"] = _elapsed_ms(setup_start)
+
+        response, sources = await query_engine.aquery_with_sources(query_str=query, timings=timings, query_embedding=query_embedding)
+        self.answer_cache.put(query, {"response": response, "sources": sources}, query_embedding, generation, scope)
+        self._finish(timings, start, "run")
+
+        return response
+
+    async def astream(self, query:str, timings: Optional[Dict[str, float]] = None, filters: Optional[MetadataFilters] = None,
+                      tenant: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Async version of `stream`.
+
+        Args:
+            query (str): Query
+            timings (Optional[Dict[str, float]]): If given, filled with the per-stage latency breakdown in milliseconds
+            filters (Optional[MetadataFilters]): Restricts retrieval to some documents or pages (see `milvus_index.metadata_filters`)
+            tenant (Optional[str]): Tenant whose documents are searched. Defaults to DEFAULT_TENANT.
+
+        Yields:
+            Dict[str, Any]: A "sources" event with the retrieved chunk metadata, then one "token" event per LLM delta
+        """
+        timings = {} if timings is None else timings
+        scope = _filter_scope(filters, tenant)
+
+        start = time.perf_counter()
+        generation = self.answer_cache.generation
+        cached, query_embedding = await self._alookup_cache(query, timings, scope)
+        if cached is not None:
+            for event in self._cached_events(cached):
+                yield event
+            self._finish(timings, start, "stream")
+            return
+
+        setup_start = time.perf_counter()
+        query_engine = await self.aget_query_engine(filters, tenant)
+        timings["setup_ms"] = _elapsed_ms(setup_start)
+
+        sources, tokens = [], []
+        async for event in query_engine.acustom_query_stream(query_str=query, timings=timings, query_embedding=query_embedding):
+            self._collect_event(event, sources, tokens)
+            yield event
+        self.answer_cache.put(query, {"response": "".join(tokens), "sources": sources}, query_embedding, generation, scope)
+        self._finish(timings, start, "stream")
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embeds many queries, in batched calls when the embedder supports it (see `CachedBatchingEmbedding.get_query_embeddings`)"""
+        if hasattr(self.embedder, "get_query_embeddings"):
+            return self.embedder.get_query_embeddings(queries)
+        return [self.embedder.get_query_embedding(query) for query in queries]
+
+    def search_many(self, queries: List[str], embeddings: List[List[float]], top_k: int,
+                    filters: Optional[MetadataFilters] = None) -> List[List[NodeWithScore]]:
+        """Dense top-k chunks of many queries: one multi-vector search on Milvus and the local store, one retrieval
+        per query on other vector stores. Chunks retrieved by several queries are shared, not fetched again."""
+        index = self.get_index()
+        vector_store = index.vector_store
+        results: Optional[List[VectorStoreQueryResult]] = None
+        if isinstance(vector_store, LocalVectorStore):
+            results = vector_store.query_many(embeddings, top_k, filters)
+        elif self.vector_store_backend == "milvus":
+            from llama_index.vector_stores.milvus import MilvusVectorStore
+
+            if isinstance(vector_store, MilvusVectorStore):
+                results = search_many(vector_store, embeddings, top_k, filters)
+        if results is None:
+            retriever = index.as_retriever(similarity_top_k=top_k, filters=filters)
+            return [retriever.retrieve(QueryBundle(query_str=query, embedding=embedding)) for query, embedding in zip(queries, embeddings)]
+        return [
+            [NodeWithScore(node=node, score=score) for node, score in zip(result.nodes, result.similarities)]
+            for result in results
+        ]
+
+    def retrieve_many(self, queries: List[str], embeddings: List[List[float]], filters: Optional[MetadataFilters] = None,
+                      tenant: Optional[str] = None, timings: Optional[Dict[str, float]] = None) -> List[Tuple[List[NodeWithScore], Dict[str, Any]]]:
+        """Retrieves the prompt context of many queries at once: a single vector search for all of them, the lexical
+        fusion of each query when enabled, then one vector fetch for the union of the candidates and the reranking
+        of each query.
+
+        Args:
+            queries (List[str]): Queries
+            embeddings (List[List[float]]): Query embeddings
+            filters (Optional[MetadataFilters]): Restricts retrieval to some documents or pages
+            tenant (Optional[str]): Tenant whose documents are searched. Defaults to DEFAULT_TENANT.
+            timings (Optional[Dict[str, float]]): If given, filled with the search and rerank time of the whole batch
+
+        Returns:
+            List[Tuple[List[NodeWithScore], Dict[str, Any]]]: Chunks of each query, with its rerank timings and counts
+        """
+        timings = {} if timings is None else timings
+        self.get_index()
+        filters = self.tenant_filters(filters, tenant)
+
+        start = time.perf_counter()
+        retriever = self.initalize_retriever(filters)
+        if isinstance(retriever, HybridRetriever):
+            dense = self.search_many(queries, embeddings, retriever.candidates, filters)
+            candidates = [retriever.fuse(query, nodes) for query, nodes in zip(queries, dense)]
+        else:
+            candidates = self.search_many(queries, embeddings, self._retrieval_top_k(), filters)
+        timings["search_ms"] = _elapsed_ms(start)
+
+        if not self.reranker.enabled:
+            return [(nodes, {}) for nodes in candidates]
+        start = time.perf_counter()
+        self.reranker.prefetch([node for nodes in candidates for node in nodes])
+        results = []
+        for nodes, embedding in zip(candidates, embeddings):
+            rerank_start = time.perf_counter()
+            nodes, rerank_stats = self.reranker.rerank(nodes, embedding)
+            results.append((nodes, {"rerank_ms": _elapsed_ms(rerank_start), "context_tokens": rerank_stats["context_tokens"]}))
+        timings["rerank_ms"] = _elapsed_ms(start)
+        return results
+
+    async def abatch(self, queries: List[str], filters: Optional[MetadataFilters] = None, tenant: Optional[str] = None,
+                     max_concurrency: Optional[int] = None, summary: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Answers many queries, sharing the embedding and retrieval work between them. Cached answers are returned
+        first, the other queries are embedded in batched calls and searched with a single multi-vector search, and the
+        answers are generated concurrently, yielded in the order they finish. Identical queries are answered once.
+
+        Args:
+            queries (List[str]): Queries
+            filters (Optional[MetadataFilters]): Restricts retrieval to some documents or pages (see `milvus_index.metadata_filters`)
+            tenant (Optional[str]): Tenant whose documents are searched. Defaults to DEFAULT_TENANT.
+            max_concurrency (Optional[int]): LLM calls in flight. Defaults to BATCH_QUERY_CONCURRENCY or 8.
+            summary (Optional[Dict[str, Any]]): If given, filled with the batch counts and the time of the shared stages
+
+        Raises:
+            ValueError: If there are more than BATCH_QUERY_MAX_SIZE queries (1000 by default)
+
+        Yields:
+            Dict[str, Any]: {"index", "query", "response", "sources", "timings"} per query, or {"index", "query", "error"}
+        """
+        if len(queries) > self.max_batch_size:
+            raise ValueError(f"A batch holds at most {self.max_batch_size} queries, got {len(queries)}.")
+        summary = {} if summary is None else summary
+        summary.update({"queries": len(queries), "cache_hits": 0, "errors": 0})
+        scope = _filter_scope(filters, tenant)
+
+        start = time.perf_counter()
+        generation = self.answer_cache.generation
+        # Positions of each distinct query that missed the exact cache
+        pending: Dict[str, List[int]] = {}
+        for i, query in enumerate(queries):
+            cached = self.answer_cache.get(query, scope)
+            if cached is None:
+                pending.setdefault(query, []).append(i)
+                continue
+            summary["cache_hits"] += 1
+            yield self._batch_result(i, query, cached, {"cache_hit": True}, start)
+        if not pending:
+            self._finish_batch(summary, start)
+            return
+
+        distinct = list(pending)
+        try:
+            embed_start = time.perf_counter()
+            embeddings = await limiter.run_in_thread("EMBEDDING", self.embed_queries, distinct)
+            summary["embed_ms"] = _elapsed_ms(embed_start)
+
+            if self.answer_cache.semantic:
+                misses = []
+                for query, embedding in zip(distinct, embeddings):
+                    cached = self.answer_cache.get_semantic(embedding, scope)
+                    if cached is None:
+                        misses.append((query, embedding))
+                        continue
+                    for i in pending[query]:
+                        summary["cache_hits"] += 1
+                        yield self._batch_result(i, query, cached, {"cache_hit": True}, start)
+                distinct, embeddings = [query for query, _ in misses], [embedding for _, embedding in misses]
+
+            setup_start = time.perf_counter()
+            query_engine = await self.aget_query_engine(filters, tenant)
+            summary["setup_ms"] = _elapsed_ms(setup_start)
+            retrieved = await limiter.run_in_thread("MILVUS", self.retrieve_many, distinct, embeddings, filters, tenant, summary)
+        except Exception as e:
+            for query in distinct:
+                for i in pending[query]:
+                    summary["errors"] += 1
+                    yield {"index": i, "query": query, "error": str(e)}
+            self._finish_batch(summary, start)
+            return
+
+        semaphore = asyncio.Semaphore(max_concurrency or self.batch_concurrency)
+
+        async def answer(query: str, embedding: List[float], nodes: List[NodeWithScore], timings: Dict[str, Any]):
+            timings["cache_hit"] = False
+            try:
+                async with semaphore:
+                    response, sources = await query_engine.agenerate(nodes, query, timings)
+            except Exception as e:
+                return query, None, timings, str(e)
+            cached = {"response": response, "sources": sources}
+            self.answer_cache.put(query, cached, embedding, generation, scope)
+            return query, cached, timings, None
+
+        tasks = [
+            asyncio.create_task(answer(query, embedding, nodes, timings))
+            for query, embedding, (nodes, timings) in zip(distinct, embeddings, retrieved)
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                query, cached, timings, error = await task
+                for i in pending[query]:
+                    if error is not None:
+                        summary["errors"] += 1
+                        yield {"index": i, "query": query, "error": error}
+                    else:
+                        yield self._batch_result(i, query, cached, dict(timings), start)
+        finally:
+            # The client went away or the batch failed: drop the generations still waiting
+            for task in tasks:
+                task.cancel()
+        self._finish_batch(summary, start)
+
+    def _batch_result(self, index: int, query: str, cached: Dict[str, Any], timings: Dict[str, Any], start: float) -> Dict[str, Any]:
+        # total_ms is the time from the start of the batch to this answer
+        self._finish(timings, start, "batch")
+        return {"index": index, "query": query, "response": cached["response"], "sources": cached["sources"], "timings": timings}
+
+    @staticmethod
+    def _finish_batch(summary: Dict[str, Any], start: float):
+        summary["total_ms"] = _elapsed_ms(start)
+        metrics.record_batch(summary)
+
+    @staticmethod
+    def _finish(timings: Dict[str, Any], start: float, kind: str):
+        timings["total_ms"] = _elapsed_ms(start)
+        metrics.record_query(timings, kind)
+
+    def _lookup_cache(self, query: str, timings: Dict[str, float],
+                      scope: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        # The query embedding computed for the semantic tier is handed on to retrieval, so a miss costs no extra embed call
+        cached = self.answer_cache.get(query, scope)
+        query_embedding = None
+        if cached is None and self.answer_cache.semantic:
+            start = time.perf_counter()
+            query_embedding = self.embedder.get_query_embedding(query)
+            timings["embed_ms"] = _elapsed_ms(start)
+            cached = self.answer_cache.get_semantic(query_embedding, scope)
+        timings["cache_hit"] = cached is not None
+        return cached, query_embedding
+
+    async def _alookup_cache(self, query: str, timings: Dict[str, float],
+                             scope: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        cached = self.answer_cache.get(query, scope)
+        query_embedding = None
+        if cached is None and self.answer_cache.semantic:
+            start = time.perf_counter()
+            async with limiter("EMBEDDING"):
+                query_embedding = await self.embedder.aget_query_embedding(query)
+            timings["embed_ms"] = _elapsed_ms(start)
+            cached = self.answer_cache.get_semantic(query_embedding, scope)
+        timings["cache_hit"] = cached is not None
+        return cached, query_embedding
+
+    @staticmethod
+    def _cached_events(cached: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        yield {"event": "sources", "data": cached["sources"]}
+        yield {"event": "token", "data": cached["response"]}
+
+    @staticmethod
+    def _collect_event(event: Dict[str, Any], sources: List[Dict[str, Any]], tokens: List[str]):
+        if event["event"] == "sources":
+            sources.extend(event["data"])
+        elif event["event"] == "token":
+            tokens.append(event["data"])
+
+    def _caching_events(self, events: Iterator[Dict[str, Any]], query: str, query_embedding: Optional[List[float]],
+                        generation: int, scope: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        sources, tokens = [], []
+        for event in events:
+            self._collect_event(event, sources, tokens)
+            yield event
+        self.answer_cache.put(query, {"response": "".join(tokens), "sources": sources}, query_embedding, generation, scope)
     
 
 class RAGStringQueryEngine(CustomQueryEngine, BaseModel):
-    """Custom RAG String Query Engine."""
+    """Custom RAG String Query Engine.
+
+    Chat models (NVIDIA) are prompted with system/user messages, completion models (Azure OpenAI) with the raw prompt.
+    The async methods bound every backend call with the process-wide `limiter`. When a reranker is set, the retrieved
+    candidates go through it before the prompt is built (timed as rerank_ms).
+    """
     
     retriever: BaseRetriever = Field(...)
-    llm: Union[NVIDIA, AzureOpenAI] = Field(...)
+    llm: LLM = Field(...)
     qa_prompt: PromptTemplate = Field(...)
+    embed_model: Optional[BaseEmbedding] = Field(default=None)
+    use_chat: bool = Field(default=True)
+    reranker: Optional[ContextReranker] = Field(default=None)
 
-    def custom_query(self, query_str: str) -> str:
-        # Retrieve relevant nodes
-        nodes = self.retriever.retrieve(query_str)
-        
-        # Generate context string from nodes
-        context_str = "\n\n".join([n.node.get_content() for n in nodes])
-        
-        # Format prompt and query LLM
-        formatted_prompt = self.qa_prompt.format(context_str=context_str, query_str=query_str)
-        
-        if isinstance(self.llm, NVIDIA):
-            # NVIDIA chat model requires messages in a specific format
-            messages = [
-                ChatMessage(role=MessageRole.SYSTEM, content="You are a helpful assistant. If your output is very long, return the response in shorter point forms"),
-                ChatMessage(role=MessageRole.USER, content=formatted_prompt),
-            ]
-            response = self.llm.chat(messages)
+    def custom_query(self, query_str: str, timings: Optional[Dict[str, float]] = None,
+                     query_embedding: Optional[List[float]] = None) -> str:
+        response, _ = self.query_with_sources(query_str, timings=timings, query_embedding=query_embedding)
+        return response
 
-        elif isinstance(self.llm, AzureOpenAI):
+    def query_with_sources(self, query_str: str, timings: Optional[Dict[str, float]] = None,
+                           query_embedding: Optional[List[float]] = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """Answers the query.
+
+        Args:
+            query_str (str): Query
+            timings (Optional[Dict[str, float]]): If given, filled with the per-stage latency breakdown in milliseconds
+            query_embedding (Optional[List[float]]): Precomputed query embedding, skips the embed call when given
+
+        Returns:
+            Tuple[str, List[Dict[str, Any]]]: Answer and metadata of the retrieved source chunks
+        """
+        timings = {} if timings is None else timings
+
+        nodes = self._retrieve(query_str, timings, query_embedding)
+        formatted_prompt = self._format_prompt(nodes, query_str, timings)
+
+        start = time.perf_counter()
+        if self.use_chat:
+            # NVIDIA chat model requires messages in a specific format
+            response = self.llm.chat(self._build_messages(formatted_prompt))
+        else:
             # AzureOpenAI model can directly handle the prompt
             response = self.llm.complete(prompt=formatted_prompt)
+        timings["llm_ms"] = _elapsed_ms(start)
      
+        return self._response_text(response), self._source_metadata(nodes)
+
+    async def acustom_query(self, query_str: str, timings: Optional[Dict[str, float]] = None,
+                            query_embedding: Optional[List[float]] = None) -> str:
+        response, _ = await self.aquery_with_sources(query_str, timings=timings, query_embedding=query_embedding)
+        return response
+
+    async def aquery_with_sources(self, query_str: str, timings: Optional[Dict[str, float]] = None,
+                                  query_embedding: Optional[List[float]] = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """Async version of `query_with_sources`"""
+        timings = {} if timings is None else timings
+
+        nodes = await self._aretrieve(query_str, timings, query_embedding)
+        return await self.agenerate(nodes, query_str, timings)
+
+    async def agenerate(self, nodes: List[NodeWithScore], query_str: str,
+                        timings: Optional[Dict[str, float]] = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """Answers the query from chunks retrieved beforehand (e.g. by `Query_Pipeline.retrieve_many`)
+
+        Returns:
+            Tuple[str, List[Dict[str, Any]]]: Answer and metadata of the source chunks
+        """
+        timings = {} if timings is None else timings
+        formatted_prompt = self._format_prompt(nodes, query_str, timings)
+
+        start = time.perf_counter()
+        async with limiter("LLM"):
+            if self.use_chat:
+                response = await self.llm.achat(self._build_messages(formatted_prompt))
+            else:
+                response = await self.llm.acomplete(prompt=formatted_prompt)
+        timings["llm_ms"] = _elapsed_ms(start)
+
+        return self._response_text(response), self._source_metadata(nodes)
+
+    def custom_query_stream(self, query_str: str, timings: Optional[Dict[str, float]] = None,
+                            query_embedding: Optional[List[float]] = None) -> Iterator[Dict[str, Any]]:
+        """Streams the answer to the query.
+
+        Args:
+            query_str (str): Query
+            timings (Optional[Dict[str, float]]): If given, filled with the per-stage latency breakdown in milliseconds
+            query_embedding (Optional[List[float]]): Precomputed query embedding, skips the embed call when given
+
+        Yields:
+            Dict[str, Any]: {"event": "sources", "data": [...]} first, then {"event": "token", "data": str} per LLM delta
+        """
+        timings = {} if timings is None else timings
+
+        nodes = self._retrieve(query_str, timings, query_embedding)
+        formatted_prompt = self._format_prompt(nodes, query_str, timings)
+        yield {"event": "sources", "data": self._source_metadata(nodes)}
+
+        start = time.perf_counter()
+        if self.use_chat:
+            response_gen = self.llm.stream_chat(self._build_messages(formatted_prompt))
+        else:
+            response_gen = self.llm.stream_complete(prompt=formatted_prompt)
+
+        for response in response_gen:
+            if not response.delta:
+                continue
+            if "first_token_ms" not in timings:
+                timings["first_token_ms"] = _elapsed_ms(start)
+            timings["generated_tokens"] = timings.get("generated_tokens", 0) + 1
+            yield {"event": "token", "data": response.delta}
+        timings["llm_ms"] = _elapsed_ms(start)
+
+    async def acustom_query_stream(self, query_str: str, timings: Optional[Dict[str, float]] = None,
+                                   query_embedding: Optional[List[float]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Async version of `custom_query_stream`"""
+        timings = {} if timings is None else timings
+
+        nodes = await self._aretrieve(query_str, timings, query_embedding)
+        formatted_prompt = self._format_prompt(nodes, query_str, timings)
+        yield {"event": "sources", "data": self._source_metadata(nodes)}
+
+        start = time.perf_counter()
+        async with limiter("LLM"):
+            if self.use_chat:
+                response_gen = await self.llm.astream_chat(self._build_messages(formatted_prompt))
+            else:
+                response_gen = await self.llm.astream_complete(prompt=formatted_prompt)
+
+            async for response in response_gen:
+                if not response.delta:
+                    continue
+                if "first_token_ms" not in timings:
+                    timings["first_token_ms"] = _elapsed_ms(start)
+                timings["generated_tokens"] = timings.get("generated_tokens", 0) + 1
+                yield {"event": "token", "data": response.delta}
+        timings["llm_ms"] = _elapsed_ms(start)
+
+    def _retrieve(self, query_str: str, timings: Dict[str, float], query_embedding: Optional[List[float]] = None) -> List[NodeWithScore]:
+        start = time.perf_counter()
+        if query_embedding is None and self.reranker is not None and self.embed_model is not None:
+            # The reranker needs the query embedding, compute it once for both stages
+            query_embedding = self.embed_model.get_query_embedding(query_str)
+            timings["embed_ms"] = _elapsed_ms(start)
+        search_start = time.perf_counter()
+        nodes = self.retriever.retrieve(QueryBundle(query_str=query_str, embedding=query_embedding))
+        timings["search_ms"] = _elapsed_ms(search_start)
+        timings["retrieve_ms"] = _elapsed_ms(start)
+
+        if self.reranker is None:
+            return nodes
+        start = time.perf_counter()
+        nodes, rerank_stats = self.reranker.rerank(nodes, query_embedding)
+        timings["rerank_ms"] = _elapsed_ms(start)
+        timings["context_tokens"] = rerank_stats["context_tokens"]
+        return nodes
+
+    async def _aretrieve(self, query_str: str, timings: Dict[str, float], query_embedding: Optional[List[float]] = None) -> List[NodeWithScore]:
+        start = time.perf_counter()
+        search_start = start
+        if query_embedding is not None:
+            query_bundle = QueryBundle(query_str=query_str, embedding=query_embedding)
+            nodes = await limiter.run_in_thread("MILVUS", self.retriever.retrieve, query_bundle)
+        elif self.embed_model is None:
+            async with limiter("MILVUS"):
+                nodes = await self.retriever.aretrieve(query_str)
+        else:
+            # The Milvus store has no native async search: embed asynchronously, then search in a worker thread
+            async with limiter("EMBEDDING"):
+                query_embedding = await self.embed_model.aget_query_embedding(query_str)
+            timings["embed_ms"] = _elapsed_ms(start)
+
+            search_start = time.perf_counter()
+            query_bundle = QueryBundle(query_str=query_str, embedding=query_embedding)
+            nodes = await limiter.run_in_thread("MILVUS", self.retriever.retrieve, query_bundle)
+        timings["search_ms"] = _elapsed_ms(search_start)
+        timings["retrieve_ms"] = _elapsed_ms(start)
+
+        if self.reranker is None:
+            return nodes
+        # Vector cache misses are fetched from Milvus
+        start = time.perf_counter()
+        nodes, rerank_stats = await limiter.run_in_thread("MILVUS", self.reranker.rerank, nodes, query_embedding)
+        timings["rerank_ms"] = _elapsed_ms(start)
+        timings["context_tokens"] = rerank_stats["context_tokens"]
+        return nodes
+
+    def _format_prompt(self, nodes: List[NodeWithScore], query_str: str, timings: Dict[str, float]) -> str:
+        start = time.perf_counter()
+        # Generate context string from nodes
+        context_str = "\n\n".join([n.node.get_content() for n in nodes])
+        prompt = self.qa_prompt.format(context_str=context_str, query_str=query_str)
+        timings["prompt_ms"] = _elapsed_ms(start)
+        timings["chunks"] = len(nodes)
+        return prompt
+
+    @staticmethod
+    def _build_messages(formatted_prompt: str) -> List[ChatMessage]:
+        return [
+            ChatMessage(role=MessageRole.SYSTEM, content="You are a helpful assistant. If your output is very long, return the response in shorter point forms"),
+            ChatMessage(role=MessageRole.USER, content=formatted_prompt),
+        ]
+
+    @staticmethod
+    def _response_text(response) -> str:
         response_text = str(response.content) if hasattr(response, 'content') else str(response)
         return response_text.replace("assistant: ", "", 1) if response_text.startswith("assistant: ") else response_text
+
+    @staticmethod
+    def _source_metadata(nodes: List[NodeWithScore]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "node_id": n.node.node_id,
+                "score": n.score,
+                "file_name": n.node.metadata.get("file_name"),
+                "page_num": n.node.metadata.get("page_num"),
+            }
+            for n in nodes
+        ]
@@ -0,0 +1,160 @@
+from dotenv import load_dotenv
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import hashlib
+import os
+import threading
+
+import numpy as np
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.utils import get_tokenizer
+
+
+load_dotenv()
+
+
+class ContextReranker():
+
+    """Post-retrieval stage choosing which retrieved chunks go into the prompt.
+
+       Over-fetched candidates are rescored by cosine similarity with the query embedding, using chunk vectors kept
+       in a local LRU cache. Chunk ids are derived from the chunk content, so a cached vector or token count never
+       goes stale, and only cache misses are fetched (in one batched call). Candidates are then taken best first
+       while they score within `score_margin` of the best one (adaptive top-k), near-duplicates of an already
+       selected chunk are dropped, and chunks are packed until the context token budget is spent.
+
+    Args:
+        fetch_vectors (Optional[Callable[[List[str]], Dict[str, List[float]]]]): Returns the stored vectors of the
+            given chunk ids. Without it, only candidates retrieved with their embedding can be rescored.
+        enabled (Optional[bool]): Defaults to RERANK or false (the top SIMILARITY_TOP_K chunks go into the prompt unchanged).
+        fetch_k (Optional[int]): Candidates retrieved before reranking. Defaults to RERANK_FETCH_K or 20.
+        top_k (Optional[int]): Maximum chunks kept. Defaults to SIMILARITY_TOP_K or 5.
+        score_margin (Optional[float]): Candidates scoring below best score - margin are dropped. Defaults to RERANK_SCORE_MARGIN or 0.15.
+        dedup_similarity (Optional[float]): Cosine similarity above which a candidate is a near-duplicate. Defaults to RERANK_DEDUP_SIMILARITY or 0.95.
+        token_budget (Optional[int]): Maximum context tokens in the prompt. Defaults to CONTEXT_TOKEN_BUDGET or 2048.
+        cache_size (Optional[int]): Chunk vectors (and token counts) kept in memory. Defaults to RERANK_VECTOR_CACHE_SIZE or 10000.
+
+    """
+
+    def __init__(self, fetch_vectors: Optional[Callable[[List[str]], Dict[str, List[float]]]] = None, enabled: Optional[bool] = None,
+                 fetch_k: Optional[int] = None, top_k: Optional[int] = None, score_margin: Optional[float] = None,
+                 dedup_similarity: Optional[float] = None, token_budget: Optional[int] = None, cache_size: Optional[int] = None):
+        self.fetch_vectors = fetch_vectors
+        self.enabled = enabled if enabled is not None else os.getenv("RERANK", "false").lower() == "true"
+        self.fetch_k = fetch_k or int(os.getenv("RERANK_FETCH_K", 20))
+        self.top_k = top_k or int(os.getenv("SIMILARITY_TOP_K", 5))
+        self.score_margin = score_margin if score_margin is not None else float(os.getenv("RERANK_SCORE_MARGIN", 0.15))
+        self.dedup_similarity = dedup_similarity if dedup_similarity is not None else float(os.getenv("RERANK_DEDUP_SIMILARITY", 0.95))
+        self.token_budget = token_budget or int(os.getenv("CONTEXT_TOKEN_BUDGET", 2048))
+        self.cache_size = cache_size if cache_size is not None else int(os.getenv("RERANK_VECTOR_CACHE_SIZE", 10000))
+        self._tokenizer = get_tokenizer()
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._token_counts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def rerank(self, nodes: List[NodeWithScore], query_embedding: Optional[List[float]]) -> Tuple[List[NodeWithScore], Dict[str, int]]:
+        """Selects the chunks to put in the prompt
+
+        Args:
+            nodes (List[NodeWithScore]): Retrieved candidates, best first
+            query_embedding (Optional[List[float]]): Query embedding. Without it the retrieval order is kept.
+
+        Returns:
+            Tuple[List[NodeWithScore], Dict[str, int]]: Selected chunks (scored by cosine similarity when rescored), and
+                the number of candidates, kept chunks, dropped duplicates, chunks over budget and context tokens
+        """
+        vectors = self._get_vectors(nodes) if query_embedding is not None else {}
+        if vectors:
+            query_vector = _normalize(np.asarray(query_embedding, dtype=np.float32))
+            scores = {node_id: float(vector @ query_vector) for node_id, vector in vectors.items()}
+            # Candidates without a stored vector keep their retrieval order after the rescored ones
+            order = sorted(range(len(nodes)), key=lambda i: (-scores.get(nodes[i].node.node_id, -np.inf), i))
+        else:
+            scores, order = {}, list(range(len(nodes)))
+
+        best_score = max(scores.values()) if scores else None
+        selected, selected_vectors, seen_texts = [], [], set()
+        stats = {"candidates": len(nodes), "kept": 0, "duplicates": 0, "over_budget": 0, "context_tokens": 0}
+        for i in order:
+            node = nodes[i].node
+            score = scores.get(node.node_id)
+            if selected and score is not None and score < best_score - self.score_margin:
+                break
+
+            vector = vectors.get(node.node_id)
+            text = node.get_content()
+            text_hash = hashlib.sha256(text.encode("utf-8")).digest()
+            is_duplicate = text_hash in seen_texts or (
+                vector is not None and selected_vectors and float(np.max(np.stack(selected_vectors) @ vector)) >= self.dedup_similarity
+            )
+            if is_duplicate:
+                stats["duplicates"] += 1
+                continue
+
+            tokens = self._count_tokens(node.node_id, text)
+            # The best chunk is always kept, even if it alone exceeds the budget
+            if selected and stats["context_tokens"] + tokens > self.token_budget:
+                stats["over_budget"] += 1
+                continue
+
+            selected.append(NodeWithScore(node=node, score=score if score is not None else nodes[i].score))
+            seen_texts.add(text_hash)
+            if vector is not None:
+                selected_vectors.append(vector)
+            stats["context_tokens"] += tokens
+            if len(selected) == self.top_k or stats["context_tokens"] >= self.token_budget:
+                break
+
+        stats["kept"] = len(selected)
+        return selected, stats
+
+    def prefetch(self, nodes: List[NodeWithScore]):
+        """Loads the vectors of the candidates of many queries into the cache with a single `fetch_vectors` call, so
+        that reranking each query afterwards fetches nothing. Candidates shared by several queries are fetched once."""
+        unique = {node.node.node_id: node for node in nodes}
+        self._get_vectors(list(unique.values())[:self.cache_size])
+
+    def _get_vectors(self, nodes: List[NodeWithScore]) -> Dict[str, np.ndarray]:
+        """Normalized vectors of the candidates, from the nodes themselves, the cache or `fetch_vectors`"""
+        vectors, missing = {}, []
+        with self._lock:
+            for node_with_score in nodes:
+                node = node_with_score.node
+                if node.embedding is not None:
+                    vectors[node.node_id] = _normalize(np.asarray(node.embedding, dtype=np.float32))
+                elif node.node_id in self._vectors:
+                    self._vectors.move_to_end(node.node_id)
+                    vectors[node.node_id] = self._vectors[node.node_id]
+                else:
+                    missing.append(node.node_id)
+
+        if missing and self.fetch_vectors is not None:
+            fetched = {node_id: _normalize(np.asarray(vector, dtype=np.float32)) for node_id, vector in self.fetch_vectors(missing).items()}
+            vectors.update(fetched)
+            with self._lock:
+                self._vectors.update(fetched)
+                while len(self._vectors) > self.cache_size:
+                    self._vectors.popitem(last=False)
+        return vectors
+
+    def _count_tokens(self, node_id: str, text: str) -> int:
+        with self._lock:
+            tokens = self._token_counts.get(node_id)
+            if tokens is not None:
+                self._token_counts.move_to_end(node_id)
+                return tokens
+        tokens = len(self._tokenizer(text))
+        with self._lock:
+            self._token_counts[node_id] = tokens
+            while len(self._token_counts) > self.cache_size:
+                self._token_counts.popitem(last=False)
+        return tokens
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"cached_vectors": len(self._vectors), "max_cached_vectors": self.cache_size}
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,79 @@
+from dotenv import load_dotenv
+from typing import BinaryIO, Dict, Optional
+import mimetypes
+import os
+import time
+
+from minio import Minio
+import urllib3
+
+from FastAPI.concurrency import limiter
+
+
+load_dotenv()
+
+# Size of the parts streamed to MinIO (S3 multipart uploads need at least 5 MiB per part)
+MINIO_PART_SIZE = 8 * 1024 * 1024
+# Parts of one upload sent concurrently, each holding one part in memory
+MINIO_PARALLEL_PART_UPLOADS = 2
+
+
+def pooled_minio_client(max_connections: Optional[int] = None) -> Minio:
+    """Builds a MinIO client whose connection pool is large enough to be shared by concurrent uploads
+
+    Args:
+        max_connections (Optional[int]): Pool size. Defaults to the MINIO concurrency limit times the parallel part
+            uploads of each call
+
+    Returns:
+        Minio: MinIO client
+    """
+    part_uploads = int(os.getenv("MINIO_PARALLEL_PART_UPLOADS", MINIO_PARALLEL_PART_UPLOADS))
+    max_connections = max_connections or limiter.limits["MINIO"] * part_uploads
+    http_client = urllib3.PoolManager(
+        timeout=urllib3.Timeout(connect=300, read=300),
+        maxsize=max_connections,
+        retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+    )
+    return Minio(
+        os.getenv("MINIO_ENDPOINT", "localhost:9000"),
+        access_key=os.getenv("MINIO_ACCESS_KEY", "minioadmin"),
+        secret_key=os.getenv("MINIO_SECRET_KEY", "minioadmin"),
+        secure=os.getenv("MINIO_SECURE", "false").lower() == "true",
+        http_client=http_client,
+    )
+
+
+def upload_stream(minio_client, bucket_name: str, object_name: str, data: BinaryIO, length: int = -1,
+                  content_type: Optional[str] = None) -> Dict:
+    """Streams a file object to MinIO as a multipart upload, holding at most MINIO_PART_SIZE bytes per part in memory
+
+    Args:
+        minio_client (Minio): MinIO client
+        bucket_name (str): Destination bucket
+        object_name (str): Name of the object
+        data (BinaryIO): File object positioned at the start of the content (e.g. `UploadFile.file`)
+        length (int): Size of the content, -1 if unknown
+        content_type (Optional[str]): Content type. Guessed from the object name if not given
+
+    Returns:
+        Dict: Object name, size, etag and upload time
+    """
+    start = time.perf_counter()
+    content_type = content_type or mimetypes.guess_type(object_name)[0] or "application/octet-stream"
+    result = minio_client.put_object(
+        bucket_name,
+        object_name,
+        data,
+        length=length if length is not None else -1,
+        content_type=content_type,
+        part_size=int(os.getenv("MINIO_PART_SIZE", MINIO_PART_SIZE)),
+        num_parallel_uploads=int(os.getenv("MINIO_PARALLEL_PART_UPLOADS", MINIO_PARALLEL_PART_UPLOADS)),
+    )
+    size = length if length is not None and length >= 0 else data.tell()
+    return {
+        "file_name": object_name,
+        "size": size,
+        "etag": getattr(result, "etag", None),
+        "upload_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
@@ -0,0 +1,167 @@
+"""Wall time of answering many questions through POST /query/batch versus one POST /query per question.
+
+Ingests synthetic PDFs with the local stand-ins of benchmarks/fakes.py (see benchmarks/harness.py), then answers the
+same --questions questions twice with an empty answer cache: one /query request after the other, as the evaluation
+jobs do today, and one /query/batch request whose answers are read from its event stream as they arrive. The report
+gives the wall time of both runs, the time at which the batch streamed its first and median answers, the embedding
+API calls each run made and the speedup. --distinct makes only that many distinct questions, so the batch shares
+more of its retrieved chunks. Queries are embedded by the NVIDIA-shaped stand-in wrapped as clients.build_embedder
+wraps the default NVIDIA host; --embedder symmetric uses the embedder that embeds queries like passages (AZURE).
+
+Usage:
+    python -m benchmarks.bench_batch_query --questions 500
+    python -m benchmarks.bench_batch_query --questions 500 --vector-store local --concurrency 16 --output batch.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.fakes import EchoLLM, HashingEmbedding, LocalObjectStore, NVIDIAShapedEmbedding, synthetic_corpus
+from benchmarks.harness import _configure_environment, _documents, _ingest
+
+
+async def _sequential(client, questions: list) -> dict:
+    errors = 0
+    start = time.perf_counter()
+    for question in questions:
+        response = await client.post("/query", json={"query": question})
+        errors += response.status_code != 200
+    return {"wall_s": round(time.perf_counter() - start, 3), "errors": errors}
+
+
+async def _batch(client, questions: list, concurrency: int) -> dict:
+    # The ASGI transport hands over the body once the response is complete, so the time each answer was streamed at
+    # is taken from its total_ms (time since the start of the batch)
+    answer_ms, errors, summary = [], 0, {}
+    start = time.perf_counter()
+    async with client.stream("POST", "/query/batch", json={"queries": questions, "max_concurrency": concurrency}) as response:
+        response.raise_for_status()
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "answer":
+                    errors += "error" in data
+                    if "timings" in data:
+                        answer_ms.append(data["timings"]["total_ms"])
+                elif event == "done":
+                    summary = data
+                elif event == "error":
+                    raise RuntimeError(data["detail"])
+    return {
+        "wall_s": round(time.perf_counter() - start, 3),
+        "first_answer_s": round(min(answer_ms, default=0.0) / 1000, 3),
+        "median_answer_s": round(statistics.median(answer_ms) / 1000, 3) if answer_ms else 0.0,
+        "answers": len(answer_ms) + errors,
+        "errors": errors,
+        "summary": summary,
+    }
+
+
+async def _run(args, root: str) -> dict:
+    import httpx
+    from FastAPI.clients import clients
+    from FastAPI.embeddings import CachedBatchingEmbedding
+    import main
+
+    object_store = LocalObjectStore(os.path.join(root, "minio"))
+    object_store.make_bucket("harness")
+    symmetric = args.embedder == "symmetric"
+    if symmetric:
+        embedder = HashingEmbedding(dim=args.dim, latency_s=args.embed_latency)
+    else:
+        embedder = NVIDIAShapedEmbedding(dim=args.dim, latency_s=args.embed_latency)
+    clients.register("minio", object_store)
+    # Without the query-embedding cache, the second run embeds the questions again
+    clients.register("embedder", CachedBatchingEmbedding(embedder, symmetric=symmetric, max_entries=0))
+    clients.register("llm", EchoLLM(latency_s=args.llm_latency, tokens_per_s=args.tokens_per_s, num_output_tokens=args.output_tokens))
+
+    file_names = _documents(args, os.path.join(root, "minio", "harness"))
+    async with main.app.router.lifespan_context(main.app):
+        ingest = await asyncio.to_thread(_ingest, main.app, args, file_names)
+
+        rng = random.Random(args.seed)
+        vocabulary = [word for text in synthetic_corpus(50, seed=args.seed) for word in text.split()]
+        distinct = [" ".join(rng.choices(vocabulary, k=args.query_words)) + "?" for _ in range(args.distinct or args.questions)]
+        questions = [distinct[i % len(distinct)] for i in range(args.questions)]
+
+        pipeline = main.app.state.query_pipeline
+        results = {}
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for mode in ("sequential", "batch"):
+                # Both runs start from an empty answer cache
+                pipeline.answer_cache.invalidate()
+                embedder.reset_counters()
+                if mode == "sequential":
+                    results[mode] = await _sequential(client, questions)
+                else:
+                    results[mode] = await _batch(client, questions, args.concurrency)
+                results[mode]["embed_calls"] = embedder.calls
+
+    return {
+        "benchmark": "batch_query",
+        "config": {
+            "vector_store": args.vector_store,
+            "embedder": args.embedder,
+            "questions": args.questions,
+            "distinct_questions": len(distinct),
+            "concurrency": args.concurrency,
+            "embed_latency_s": args.embed_latency,
+            "llm_latency_s": args.llm_latency,
+            "tokens_per_s": args.tokens_per_s,
+        },
+        "ingest": {"pages": ingest["pages"], "chunks": ingest["chunks"]},
+        **results,
+        "speedup": round(results["sequential"]["wall_s"] / results["batch"]["wall_s"], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--distinct", type=int, default=0, help="Distinct questions, repeated to make --questions (0: all distinct)")
+    parser.add_argument("--concurrency", type=int, default=8, help="max_concurrency of the /query/batch request")
+    parser.add_argument("--vector-store", choices=["milvus", "local"], default="milvus",
+                        help="milvus: Milvus Lite (or --milvus-uri), local: embedded memory-mapped store")
+    parser.add_argument("--local-dtype", choices=["float32", "int8"], default="float32")
+    parser.add_argument("--milvus-uri", help="Milvus server to use instead of a Milvus Lite file")
+    parser.add_argument("--index-type", default="FLAT")
+    parser.add_argument("--synthetic-docs", type=int, default=4)
+    parser.add_argument("--synthetic-pages", type=int, default=20)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--embedder", choices=["nvidia", "symmetric"], default="nvidia",
+                        help="nvidia: separate query input type (default host), symmetric: queries embedded as passages")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="Simulated seconds per embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Simulated seconds to the first token")
+    parser.add_argument("--tokens-per-s", type=float, default=500.0)
+    parser.add_argument("--output-tokens", type=int, default=32)
+    parser.add_argument("--query-words", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+    # Read by the harness helpers
+    args.pdf, args.chunking = "", "sentence"
+
+    with tempfile.TemporaryDirectory() as root:
+        _configure_environment(args, root)
+        report = asyncio.run(_run(args, root))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
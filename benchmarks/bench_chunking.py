@@ -0,0 +1,133 @@
+"""Compares the chunking strategies of Indexing_Pipeline on a PDF: embedding calls, wall time and retrieval quality.
+
+Retrieval quality is measured as self-retrieval recall@k: sentences sampled from the document are used as queries,
+and a hit is counted when one of the top-k chunks contains the sentence.
+
+Uses the deterministic hashing embedder by default (counts are exact, quality is lexical). Pass --embedder live
+to use the embedder configured in .env instead.
+
+Usage:
+    python -m benchmarks.bench_chunking --pdf data/Essential_Drugs_for_Cancer_Therapy.pdf
+"""
+import argparse
+import json
+import os
+import random
+import re
+import tempfile
+import time
+
+import numpy as np
+from pydantic import PrivateAttr
+
+from FastAPI.chunking import CHUNKING_STRATEGIES
+from FastAPI.indexing import Indexing_Pipeline
+from benchmarks.fakes import HashingEmbedding, LocalObjectStore
+
+
+class _CountingEmbedding(HashingEmbedding):
+    """Wraps a live embedder so its API calls are counted like the hashing embedder's"""
+
+    _live: object = PrivateAttr(default=None)
+
+    def __init__(self, inner, **kwargs):
+        super().__init__(**kwargs)
+        self._live = inner
+
+    def _get_text_embeddings(self, texts):
+        self._record(len(texts))
+        return self._live.get_text_embedding_batch(texts)
+
+    def _get_query_embedding(self, query):
+        self._record(1)
+        return self._live.get_query_embedding(query)
+
+
+def _normalize_space(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _sample_queries(documents, num_queries: int, seed: int = 0):
+    rng = random.Random(seed)
+    sentences = [
+        _normalize_space(sentence)
+        for document in documents
+        for sentence in re.split(r"(?<=[.!?])\s+", document.text)
+        if len(sentence.split()) >= 8
+    ]
+    return rng.sample(sentences, min(num_queries, len(sentences)))
+
+
+def _recall_at_k(embedder, nodes, queries, k: int) -> float:
+    matrix = np.asarray([node.embedding for node in nodes], dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    texts = [_normalize_space(node.text) for node in nodes]
+
+    hits = 0
+    for query in queries:
+        query_vector = np.asarray(embedder.get_query_embedding(query), dtype=np.float32)
+        top_k = np.argsort(-(matrix @ query_vector))[:k]
+        hits += any(query in texts[i] for i in top_k)
+    return hits / len(queries) if queries else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default="data/Essential_Drugs_for_Cancer_Therapy.pdf")
+    parser.add_argument("--chunk-size", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--embedder", choices=["fake", "live"], default="fake")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        object_store = LocalObjectStore(root)
+        object_store.make_bucket("bench")
+        with open(args.pdf, "rb") as f:
+            object_store.put_object("bench", os.path.basename(args.pdf), f, length=-1)
+
+        if args.embedder == "live":
+            embedder = _CountingEmbedding(Indexing_Pipeline(chunking_strategy="sentence").embedder)
+        else:
+            embedder = HashingEmbedding()
+
+        results = []
+        documents, queries = None, None
+        for strategy in CHUNKING_STRATEGIES:
+            pipeline = Indexing_Pipeline(chunk_size=args.chunk_size, embedder=embedder, chunking_strategy=strategy)
+            pipeline.minio_client = object_store
+            pipeline.minio_bucket = "bench"
+            if documents is None:
+                documents = pipeline.read_document([os.path.basename(args.pdf)])
+                queries = _sample_queries(documents, args.queries)
+
+            embedder.reset_counters()
+            start = time.perf_counter()
+            chunks = pipeline.chunk_document(documents, chunk_size=args.chunk_size)
+            # Same embedding stage as Indexing_Pipeline.run: only chunks without a derived vector are embedded
+            for i in range(0, len(chunks), pipeline.embed_batch_size):
+                pipeline.embed_nodes(chunks[i:i + pipeline.embed_batch_size])
+            wall_s = time.perf_counter() - start
+            embed_calls, embedded_texts = embedder.calls, embedder.texts
+
+            results.append({
+                "strategy": strategy,
+                "pages": len(documents),
+                "chunks": len(chunks),
+                "embedding_calls": embed_calls,
+                "embedded_texts": embedded_texts,
+                "wall_s": round(wall_s, 3),
+                f"recall@{args.top_k}": round(_recall_at_k(embedder, chunks, queries, args.top_k), 4),
+            })
+
+    output = json.dumps({"benchmark": "chunking", "pdf": args.pdf, "queries": len(queries), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
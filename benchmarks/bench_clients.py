@@ -0,0 +1,113 @@
+"""Per indexing job overhead of building clients per call vs. sharing them through FastAPI.clients.ClientRegistry.
+
+Each simulated job checks that the uploaded file exists, downloads it for extraction, then reconnects the query side
+to the collection (as /index, Indexing_Pipeline.iter_documents and Query_Pipeline.refresh do). The per-call mode
+mirrors the previous code: `get_object` for the existence check and a new MilvusVectorStore (and Milvus client)
+on every reconnect. The shared mode uses `stat_object` and the registry's vector store. Bytes are counted as read
+from the local object store stand-in; Milvus runs as Milvus Lite unless --uri is given.
+
+Usage:
+    python -m benchmarks.bench_clients --jobs 20 --file-mb 16
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from llama_index.vector_stores.milvus import MilvusVectorStore
+from pymilvus import connections, utility
+
+from benchmarks.fakes import LocalObjectStore
+from FastAPI.clients import ClientRegistry
+from FastAPI.milvus_index import ensure_collection, index_params
+from FastAPI.pdf_extraction import spool_object
+
+
+class _CountingObjectStore(LocalObjectStore):
+    """Counts the bytes sent back by get_object"""
+
+    bytes_read = 0
+
+    def get_object(self, bucket_name: str, object_name: str, **kwargs):
+        response = super().get_object(bucket_name, object_name, **kwargs)
+        self.bytes_read += len(response.getbuffer())
+        return response
+
+
+def _job(store, bucket: str, name: str, shared: bool, connect_store):
+    if shared:
+        store.stat_object(bucket, name)
+    else:
+        response = store.get_object(bucket, name)
+        response.close()
+        response.release_conn()
+    os.remove(spool_object(store, bucket, name))
+    connect_store()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", help="Milvus URI. Defaults to a Milvus Lite file in a temporary directory")
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--file-mb", type=int, default=16)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        store = _CountingObjectStore(os.path.join(root, "minio"))
+        store.make_bucket("bench")
+        with open(os.path.join(root, "minio", "bench", "document.pdf"), "wb") as f:
+            f.write(os.urandom(args.file_mb * 2**20))
+
+        uri = args.uri or os.path.join(root, "bench_milvus.db")
+        connections.connect(alias="bench", uri=uri)
+        try:
+            if utility.has_collection("bench_clients", using="bench"):
+                utility.drop_collection("bench_clients", using="bench")
+            ensure_collection("bench_clients", dim=8, index=index_params("FLAT"), using="bench")
+            registry = ClientRegistry()
+            milvus_stores = []
+
+            def new_store():
+                milvus_stores.append(MilvusVectorStore(uri=uri, collection_name="bench_clients", overwrite=False))
+
+            for mode, connect_store in (
+                ("per_call", new_store),
+                ("shared", lambda: registry.milvus_store("bench_clients", uri=uri, overwrite=False)),
+            ):
+                store.bytes_read = 0
+                start = time.perf_counter()
+                for _ in range(args.jobs):
+                    _job(store, "bench", "document.pdf", mode == "shared", connect_store)
+                elapsed = time.perf_counter() - start
+                results.append({
+                    "mode": mode,
+                    "ms_per_job": round(elapsed / args.jobs * 1000, 2),
+                    "mb_read_per_job": round(store.bytes_read / args.jobs / 2**20, 2),
+                    "milvus_clients_opened": len(milvus_stores) if mode == "per_call" else len(registry._milvus_stores),
+                })
+            for milvus_store in milvus_stores:
+                milvus_store.client.close()
+            registry.close()
+            utility.drop_collection("bench_clients", using="bench")
+        finally:
+            connections.disconnect("bench")
+
+    output = json.dumps({
+        "benchmark": "clients",
+        "uri": args.uri or "milvus-lite",
+        "jobs": args.jobs,
+        "file_mb": args.file_mb,
+        "results": results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Query throughput vs. number of concurrent clients, using local stand-ins for the embedder, LLM and vector store.
+
+Compares the async request path (`acustom_query`) with the previous behaviour of calling the blocking
+`custom_query` from inside an `async def` route. The blocking path stays flat at ~1 request at a time, the
+async path scales until it reaches the LLM_MAX_CONCURRENCY limit.
+
+Usage:
+    python -m benchmarks.bench_concurrency --levels 1 2 4 8 16 --requests-per-client 5
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from llama_index.core import PromptTemplate
+
+from FastAPI.querying import QA_PROMPT_TMPL, RAGStringQueryEngine
+from benchmarks.fakes import EchoLLM, HashingEmbedding, build_in_memory_retriever, synthetic_corpus
+
+
+async def _client(engine: RAGStringQueryEngine, queries, use_async: bool):
+    for query in queries:
+        if use_async:
+            await engine.acustom_query(query)
+        else:
+            # What the route used to do: a blocking call inside `async def`
+            engine.custom_query(query)
+
+
+async def _run_level(engine, corpus, concurrency: int, requests_per_client: int, use_async: bool) -> dict:
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _client(engine, corpus[i * requests_per_client:(i + 1) * requests_per_client], use_async)
+        for i in range(concurrency)
+    ])
+    wall_s = time.perf_counter() - start
+    total = concurrency * requests_per_client
+    return {
+        "mode": "async" if use_async else "blocking",
+        "concurrency": concurrency,
+        "requests": total,
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(total / wall_s, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests-per-client", type=int, default=5)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    embed_model = HashingEmbedding(latency_s=0.0)
+    corpus = synthetic_corpus(200)
+    retriever = build_in_memory_retriever(corpus, embed_model)
+    embed_model.latency_s = args.embed_latency
+
+    engine = RAGStringQueryEngine(
+        retriever=retriever,
+        llm=EchoLLM(latency_s=args.llm_latency),
+        qa_prompt=PromptTemplate(QA_PROMPT_TMPL),
+        embed_model=embed_model,
+        use_chat=False,
+    )
+    queries = synthetic_corpus(max(args.levels) * args.requests_per_client, words_per_doc=12, seed=1)
+
+    async def run_all():
+        # One event loop for every level, the shared limiter's semaphores bind to it
+        return [
+            await _run_level(engine, queries, concurrency, args.requests_per_client, use_async)
+            for use_async in (False, True)
+            for concurrency in args.levels
+        ]
+
+    results = asyncio.run(run_all())
+
+    output = json.dumps({"benchmark": "query_concurrency", "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
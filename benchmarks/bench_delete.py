@@ -0,0 +1,107 @@
+"""Time to delete many documents: one delete (and compaction) per file vs. one bulk delete with deferred compaction.
+
+The per-file mode mirrors the previous /delete_milvus behaviour (a delete expression per file followed by
+`compact()`), the bulk mode builds one expression for all the files like Indexing_Pipeline.delete_documents and
+leaves compaction to FastAPI.milvus_index.CompactionScheduler. The chunks left behind are checked after each mode.
+
+Runs against Milvus Lite (a local file, `pip install milvus-lite`) by default. Milvus Lite does not implement
+compaction, so the per-file mode only deletes there; pass --uri http://localhost:19530 to include the compactions.
+
+Usage:
+    python -m benchmarks.bench_delete --files 200 --chunks-per-file 50
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from pymilvus import connections, utility
+
+from FastAPI.milvus_index import CompactionScheduler, ensure_collection, in_expression, index_params
+
+
+def _load(args, vectors: np.ndarray):
+    if utility.has_collection("bench_delete", using="bench"):
+        utility.drop_collection("bench_delete", using="bench")
+    collection = ensure_collection("bench_delete", dim=args.dim, index=index_params("FLAT"), using="bench", partition_key=False)
+    rows = [
+        {"id": f"{file}-{chunk}", "embedding": vectors[chunk].tolist(), "file_name": f"document-{file}.pdf", "page_num": chunk,
+         "page_hash": "", "content_hash": "", "tenant": "default"}
+        for file in range(args.files) for chunk in range(args.chunks_per_file)
+    ]
+    for i in range(0, len(rows), 5000):
+        collection.insert(rows[i:i + 5000])
+    collection.flush()
+    return collection
+
+
+def _remaining(collection, file_names) -> int:
+    return len(collection.query(expr=in_expression("file_name", file_names), output_fields=["id"], consistency_level="Strong"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", help="Milvus URI. Defaults to a Milvus Lite file in a temporary directory")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--chunks-per-file", type=int, default=50)
+    parser.add_argument("--deleted-files", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    vectors = np.random.default_rng(0).standard_normal((args.chunks_per_file, args.dim)).astype(np.float32)
+    file_names = [f"document-{file}.pdf" for file in range(args.deleted_files)]
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        connections.connect(alias="bench", uri=args.uri or os.path.join(root, "bench_milvus.db"))
+        try:
+            collection = _load(args, vectors)
+            compactions = 0
+            start = time.perf_counter()
+            for file_name in file_names:
+                collection.delete(f"file_name == '{file_name}'")
+                if args.uri:
+                    collection.compact()
+                    compactions += 1
+            results.append({
+                "mode": "per_file",
+                "delete_s": round(time.perf_counter() - start, 3),
+                "compactions": compactions,
+                "remaining_chunks": _remaining(collection, file_names),
+            })
+
+            collection = _load(args, vectors)
+            scheduler = CompactionScheduler(get_collection=lambda: collection)
+            start = time.perf_counter()
+            scheduler.record_deletes(collection.delete(in_expression("file_name", file_names)).delete_count)
+            delete_s = time.perf_counter() - start
+            scheduler.shutdown()
+            results.append({
+                "mode": "bulk",
+                "delete_s": round(delete_s, 3),
+                "compactions": scheduler.stats()["compactions"],
+                "pending_compaction_deletes": scheduler.stats()["pending_deletes"],
+                "remaining_chunks": _remaining(collection, file_names),
+            })
+            utility.drop_collection("bench_delete", using="bench")
+        finally:
+            connections.disconnect("bench")
+
+    output = json.dumps({
+        "benchmark": "delete",
+        "uri": args.uri or "milvus-lite",
+        "chunks": args.files * args.chunks_per_file,
+        "deleted_files": args.deleted_files,
+        "results": results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Query-embedding round trips and latency with and without CachedBatchingEmbedding.
+
+Simulates concurrent clients sending queries drawn from a skewed distribution (popular questions repeat)
+against a stand-in embedder with a fixed per-call latency. By default the stand-in is shaped like NVIDIAEmbedding
+(queries and passages embedded differently, no query batch method) and wrapped as `clients.build_embedder` wraps
+it; --embedder symmetric uses a model that embeds queries like passages (Azure OpenAI).
+
+Usage:
+    python -m benchmarks.bench_embeddings --clients 32 --queries-per-client 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from FastAPI.embeddings import CachedBatchingEmbedding
+from benchmarks.fakes import HashingEmbedding, NVIDIAShapedEmbedding, synthetic_corpus
+
+
+async def _run(embed_model, queries, clients: int) -> dict:
+    latencies = []
+
+    async def client(client_queries):
+        for query in client_queries:
+            start = time.perf_counter()
+            await embed_model.aget_query_embedding(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    per_client = len(queries) // clients
+    start = time.perf_counter()
+    await asyncio.gather(*[client(queries[i * per_client:(i + 1) * per_client]) for i in range(clients)])
+    wall_s = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "queries": len(latencies),
+        "wall_s": round(wall_s, 3),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--queries-per-client", type=int, default=20)
+    parser.add_argument("--distinct-queries", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.03, help="Simulated seconds per embedding API call")
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--embedder", choices=["nvidia", "symmetric"], default="nvidia",
+                        help="nvidia: NVIDIA-shaped stand-in (the default model host), symmetric: Azure OpenAI-like")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    distinct = synthetic_corpus(args.distinct_queries, words_per_doc=10, seed=2)
+    # Zipf-like popularity: a few questions make up most of the traffic
+    weights = [1 / (rank + 1) for rank in range(len(distinct))]
+    queries = rng.choices(distinct, weights=weights, k=args.clients * args.queries_per_client)
+
+    results = []
+    for name in ("direct", "cached_batching"):
+        symmetric = args.embedder == "symmetric"
+        inner = HashingEmbedding(latency_s=args.latency) if symmetric else NVIDIAShapedEmbedding(latency_s=args.latency)
+        embed_model = inner if name == "direct" else CachedBatchingEmbedding(inner, symmetric=symmetric, window_ms=args.window_ms)
+        result = asyncio.run(_run(embed_model, queries, args.clients))
+        result.update({
+            "mode": name,
+            "api_calls": inner.calls,
+            "api_calls_per_s": round(inner.calls / result["wall_s"], 2),
+        })
+        results.append(result)
+
+    output = json.dumps({"benchmark": "query_embeddings", "embedder": args.embedder, "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""PDF extraction throughput (pages/sec) and peak RSS for different numbers of extraction processes.
+
+The sample PDF can be repeated to build a multi-hundred-page document.
+
+Usage:
+    python -m benchmarks.bench_extraction --repeat 10 --workers 1 2 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import PyPDF2
+
+from FastAPI.pdf_extraction import iter_pdf_pages
+
+
+def _build_pdf(source: str, repeat: int, path: str):
+    writer = PyPDF2.PdfWriter()
+    reader = PyPDF2.PdfReader(source)
+    for _ in range(repeat):
+        for page in reader.pages:
+            writer.add_page(page)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default="data/Essential_Drugs_for_Cancer_Therapy.pdf")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--pages-per-task", type=int, default=16)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        pdf_path = os.path.join(root, "bench.pdf")
+        _build_pdf(args.pdf, args.repeat, pdf_path)
+
+        results = []
+        for workers in args.workers:
+            stats = {}
+            first_page_s = None
+            start = time.perf_counter()
+            for _ in iter_pdf_pages(pdf_path, workers=workers, pages_per_task=args.pages_per_task, stats=stats):
+                if first_page_s is None:
+                    # Time until the first page is available to the chunking stage
+                    first_page_s = round(time.perf_counter() - start, 3)
+            results.append({
+                "workers": workers,
+                "file_mb": round(os.path.getsize(pdf_path) / 2**20, 2),
+                "first_page_s": first_page_s,
+                **stats,
+            })
+
+    output = json.dumps({"benchmark": "pdf_extraction", "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
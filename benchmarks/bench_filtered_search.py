@@ -0,0 +1,122 @@
+"""Latency of searches restricted to one document (FastAPI.milvus_index.metadata_filters) in a large collection.
+
+A collection of many documents is compared with a collection holding only the searched document's chunks: with the
+file_name filter pushed down to Milvus (and its inverted index), a scoped search should cost about what searching the
+document alone costs, not what searching the whole collection costs. Searches go through MilvusVectorStore like the
+query route, and every hit of a scoped search is checked to belong to the requested document.
+
+Runs against Milvus Lite (a local file, `pip install milvus-lite`) by default, pass --uri http://localhost:19530 to
+run against the docker-compose Milvus.
+
+Usage:
+    python -m benchmarks.bench_filtered_search --documents 200 --chunks-per-document 100 --queries 200
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from llama_index.core.vector_stores import VectorStoreQuery
+from llama_index.vector_stores.milvus import MilvusVectorStore
+from pymilvus import connections, utility
+
+from FastAPI.milvus_index import ensure_collection, index_params, metadata_filters
+
+
+def _load(collection_name: str, vectors: np.ndarray, file_names: list, dim: int, index_type: str):
+    if utility.has_collection(collection_name, using="bench"):
+        utility.drop_collection(collection_name, using="bench")
+    collection = ensure_collection(collection_name, dim=dim, index=index_params(index_type), using="bench")
+    for i in range(0, len(vectors), 5000):
+        collection.insert([
+            {"id": str(j), "embedding": vectors[j].tolist(), "file_name": file_names[j], "page_num": j % 50,
+             "page_hash": "", "content_hash": "", "_node_content": json.dumps({"id_": str(j), "text": ""}), "_node_type": "TextNode"}
+            for j in range(i, min(i + 5000, len(vectors)))
+        ])
+    collection.flush()
+    return collection
+
+
+def _search(store: MilvusVectorStore, queries: np.ndarray, top_k: int, filters=None):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=top_k, filters=filters))
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(result.ids)
+    latencies.sort()
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", help="Milvus URI. Defaults to a Milvus Lite file in a temporary directory")
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--chunks-per-document", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--index-type", default="FLAT", help="Milvus Lite only builds FLAT and IVF_FLAT indexes")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    total = args.documents * args.chunks_per_document
+    vectors = rng.standard_normal((total, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    file_names = [f"document-{i // args.chunks_per_document}.pdf" for i in range(total)]
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    target = f"document-{random.Random(1).randrange(args.documents)}.pdf"
+    target_rows = [i for i, file_name in enumerate(file_names) if file_name == target]
+
+    with tempfile.TemporaryDirectory() as root:
+        uri = args.uri or os.path.join(root, "bench_milvus.db")
+        connections.connect(alias="bench", uri=uri)
+        try:
+            _load("bench_all_documents", vectors, file_names, args.dim, args.index_type)
+            _load("bench_one_document", vectors[target_rows], [target] * len(target_rows), args.dim, args.index_type)
+            stores = {
+                name: MilvusVectorStore(uri=uri, collection_name=name, overwrite=False, consistency_level="Strong")
+                for name in ("bench_all_documents", "bench_one_document")
+            }
+            filters = metadata_filters(documents=[target])
+            runs = {
+                "whole_collection": _search(stores["bench_all_documents"], queries, args.top_k),
+                "scoped_to_document": _search(stores["bench_all_documents"], queries, args.top_k, filters),
+                "document_alone": _search(stores["bench_one_document"], queries, args.top_k),
+            }
+        finally:
+            connections.disconnect("bench")
+
+    target_ids = {str(i) for i in target_rows}
+    results = []
+    for name, (latencies, ids) in runs.items():
+        result = {
+            "search": name,
+            "p50_ms": round(statistics.median(latencies), 3),
+            "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 3),
+        }
+        if name == "scoped_to_document":
+            result["hits_outside_document"] = sum(id_ not in target_ids for hit_ids in ids for id_ in hit_ids)
+        results.append(result)
+
+    output = json.dumps({
+        "benchmark": "filtered_search",
+        "uri": args.uri or "milvus-lite",
+        "chunks": total,
+        "document_chunks": len(target_rows),
+        "results": results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
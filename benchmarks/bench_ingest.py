@@ -0,0 +1,106 @@
+"""Wall time of a multi-document ingest run as strict phases vs. the StreamingPipeline used by Indexing_Pipeline.run.
+
+Each stage simulates its per-item latency (page extraction, page chunking, one embedding request per batch,
+one Milvus insert per batch), so the result shows how close the pipelined run gets to its slowest stage.
+
+Usage:
+    python -m benchmarks.bench_ingest --documents 4 --pages 100 --embed-max-in-flight 1 4
+"""
+import argparse
+import json
+import time
+
+from FastAPI.ingest import PipelineStage, StreamingPipeline
+
+
+def _pages(num_documents: int, num_pages: int, extract_s: float):
+    for document in range(num_documents):
+        for page in range(num_pages):
+            time.sleep(extract_s)
+            yield (document, page)
+
+
+def _run_phases(args) -> dict:
+    start = time.perf_counter()
+    pages = list(_pages(args.documents, args.pages, args.extract_s))
+    chunks = []
+    for page in pages:
+        time.sleep(args.chunk_s)
+        chunks.extend([page] * args.chunks_per_page)
+    for i in range(0, len(chunks), args.embed_batch_size):
+        time.sleep(args.embed_s)
+    for i in range(0, len(chunks), args.insert_batch_size):
+        time.sleep(args.insert_s)
+    return {"wall_s": round(time.perf_counter() - start, 3)}
+
+
+def _run_pipelined(args, embed_max_in_flight: int) -> dict:
+    def chunk(page):
+        time.sleep(args.chunk_s)
+        return [page] * args.chunks_per_page
+
+    def embed(batch):
+        time.sleep(args.embed_s)
+        return batch
+
+    def insert(batch):
+        time.sleep(args.insert_s)
+
+    pipeline = StreamingPipeline(
+        stages=[
+            PipelineStage("chunk", chunk, workers=args.chunk_workers),
+            PipelineStage("embed", embed, workers=embed_max_in_flight, batch_size=args.embed_batch_size),
+            PipelineStage("insert", insert, batch_size=args.insert_batch_size),
+        ],
+        queue_size=args.queue_size,
+    )
+    return pipeline.run(_pages(args.documents, args.pages, args.extract_s), source_name="extract")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=100, help="Pages per document")
+    parser.add_argument("--chunks-per-page", type=int, default=3)
+    parser.add_argument("--extract-s", type=float, default=0.002, help="Simulated seconds to extract one page")
+    parser.add_argument("--chunk-s", type=float, default=0.002, help="Simulated seconds to chunk one page")
+    parser.add_argument("--embed-s", type=float, default=0.05, help="Simulated seconds per embedding request")
+    parser.add_argument("--insert-s", type=float, default=0.02, help="Simulated seconds per Milvus insert")
+    parser.add_argument("--chunk-workers", type=int, default=2)
+    parser.add_argument("--embed-batch-size", type=int, default=32)
+    parser.add_argument("--embed-max-in-flight", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--insert-batch-size", type=int, default=256)
+    parser.add_argument("--queue-size", type=int, default=8)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    pages = args.documents * args.pages
+    chunks = pages * args.chunks_per_page
+    # Busy time of each stage on its own, the pipelined run cannot be faster than the largest one
+    stage_s = {
+        "extract": pages * args.extract_s,
+        "chunk": pages * args.chunk_s / args.chunk_workers,
+        "embed": -(-chunks // args.embed_batch_size) * args.embed_s,
+        "insert": -(-chunks // args.insert_batch_size) * args.insert_s,
+    }
+
+    results = [{"mode": "phases", **_run_phases(args)}]
+    for embed_max_in_flight in args.embed_max_in_flight:
+        results.append({"mode": "pipelined", "embed_max_in_flight": embed_max_in_flight, **_run_pipelined(args, embed_max_in_flight)})
+
+    output = json.dumps({
+        "benchmark": "ingest",
+        "pages": pages,
+        "chunks": chunks,
+        "stage_s": {name: round(seconds, 3) for name, seconds in stage_s.items()},
+        "results": results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
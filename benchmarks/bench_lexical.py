@@ -0,0 +1,115 @@
+"""Lexical (BM25) index size and search latency vs. corpus size, and recall@k of dense-only vs. hybrid retrieval.
+
+The recall corpus gives every chunk a unique code (like a drug or dosage code) among common words, and each query
+asks for one code surrounded by common words, the case where embeddings alone tend to miss.
+
+Usage:
+    python -m benchmarks.bench_lexical --sizes 1000 10000 100000 --queries 200
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from llama_index.core import VectorStoreIndex
+from llama_index.core.schema import QueryBundle, TextNode
+
+from FastAPI.lexical import BM25Index, HybridRetriever
+from benchmarks.fakes import HashingEmbedding, synthetic_corpus
+
+
+def _bench_size(size: int, num_queries: int, words_per_chunk: int) -> dict:
+    texts = synthetic_corpus(size, words_per_doc=words_per_chunk, seed=1)
+    nodes = [TextNode(id_=str(i), text=text, metadata={"file_name": "synthetic.pdf", "page_num": i}) for i, text in enumerate(texts)]
+
+    index = BM25Index(enabled=True, path="unused")
+    start = time.perf_counter()
+    index.add(nodes)
+    build_s = time.perf_counter() - start
+
+    rng = random.Random(2)
+    queries = [" ".join(rng.choice(texts).split()[:6]) for _ in range(num_queries)]
+    latencies = []
+    for query in queries:
+        query_start = time.perf_counter()
+        index.search(query, top_k=20)
+        latencies.append((time.perf_counter() - query_start) * 1000)
+
+    latencies.sort()
+    return {
+        "chunks": size,
+        "build_s": round(build_s, 3),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 3),
+        **index.stats(),
+    }
+
+
+def _bench_recall(num_chunks: int, num_queries: int, top_k: int, candidates: int, query_words: int) -> dict:
+    rng = random.Random(3)
+    texts = synthetic_corpus(num_chunks, words_per_doc=80, vocab_size=500, seed=4)
+    codes = [f"l01x{i:05d}" for i in range(num_chunks)]
+    nodes = [
+        TextNode(id_=str(i), text=f"{text} {code} {text}", metadata={"file_name": "synthetic.pdf", "page_num": i})
+        for i, (text, code) in enumerate(zip(texts, codes))
+    ]
+
+    embed_model = HashingEmbedding()
+    dense = VectorStoreIndex(nodes, embed_model=embed_model)
+    lexical = BM25Index(enabled=True, path="unused")
+    lexical.add(nodes)
+
+    retrievers = {
+        "dense": dense.as_retriever(similarity_top_k=top_k),
+        "hybrid": HybridRetriever(
+            dense_retriever=dense.as_retriever(similarity_top_k=candidates),
+            lexical_index=lexical,
+            similarity_top_k=top_k,
+            candidates=candidates,
+        ),
+    }
+
+    targets = rng.sample(range(num_chunks), num_queries)
+    vocab = sorted({word for text in texts for word in text.split()})
+    queries = [f"dose of {codes[i]} " + " ".join(rng.choices(vocab, k=query_words)) for i in targets]
+    query_embeddings = embed_model.get_text_embedding_batch(queries)
+
+    results = {}
+    for name, retriever in retrievers.items():
+        hits, latencies = 0, []
+        for target, query, query_embedding in zip(targets, queries, query_embeddings):
+            start = time.perf_counter()
+            found = retriever.retrieve(QueryBundle(query_str=query, embedding=query_embedding))
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += any(node.node.node_id == str(target) for node in found)
+        results[name] = {f"recall@{top_k}": round(hits / num_queries, 4), "p50_ms": round(statistics.median(latencies), 3)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--words-per-chunk", type=int, default=120)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--recall-chunks", type=int, default=2000)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--query-words", type=int, default=1, help="Common words added to the code in each recall query")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    output = json.dumps({
+        "benchmark": "lexical",
+        "latency": [_bench_size(size, args.queries, args.words_per_chunk) for size in args.sizes],
+        "recall": _bench_recall(args.recall_chunks, args.queries, args.top_k, args.candidates, args.query_words),
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
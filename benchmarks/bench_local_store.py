@@ -0,0 +1,135 @@
+"""Search, append and delete latency of the embedded vector store (FastAPI/local_store.py) for float32 and int8 storage.
+
+Fills a store with random unit vectors spread over --files files, then measures the time to open it and answer the
+first query (the files are mapped lazily), the p50/p99 latency of unfiltered top-k searches and of searches filtered
+on one file name, the time to append 1000 rows (the first insert after opening also loads the chunk ids) and to
+delete one file's rows, and the size on disk. The int8 results also report the recall of the float32 top-k.
+
+Usage:
+    python -m benchmarks.bench_local_store --rows 100000 --dim 384
+    python -m benchmarks.bench_local_store --rows 1000000 --dim 384 --queries 50 --output local_store.json
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from FastAPI.local_store import LocalVectorStore
+from FastAPI.milvus_index import metadata_filters
+
+
+def _vectors(rng, count: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _nodes(rng, start: int, count: int, dim: int, files: int) -> list:
+    return [
+        TextNode(
+            id_=f"chunk-{row}",
+            text=f"chunk {row}",
+            embedding=vector.tolist(),
+            metadata={"file_name": f"file-{row % files}.pdf", "page_num": row // files % 500, "tenant": "default"},
+        )
+        for row, vector in enumerate(_vectors(rng, count, dim), start=start)
+    ]
+
+
+def _latencies_ms(fn, queries) -> dict:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {"p50_ms": round(statistics.median(latencies), 3), "p99_ms": round(latencies[int(0.99 * (len(latencies) - 1))], 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--files", type=int, default=1000, help="Distinct file names the rows are spread over")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=10000, help="Rows appended per insert while filling the store")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    queries = _vectors(np.random.default_rng(args.seed + 1), args.queries, args.dim)
+    file_filter = metadata_filters(documents=["file-7.pdf"], tenant="default")
+    results, exact = [], None
+    with tempfile.TemporaryDirectory() as root:
+        for dtype in ("float32", "int8"):
+            path = os.path.join(root, dtype)
+            store = LocalVectorStore(path, dtype=dtype, metric_type="IP")
+            rng = np.random.default_rng(args.seed)
+            start = time.perf_counter()
+            for batch_start in range(0, args.rows, args.batch):
+                store.add(_nodes(rng, batch_start, min(args.batch, args.rows - batch_start), args.dim, args.files))
+            fill_s = time.perf_counter() - start
+
+            # Reopen: nothing is read before the first query
+            store.close()
+            start = time.perf_counter()
+            store = LocalVectorStore(path)
+            open_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            store.search(queries[0], args.top_k)
+            first_query_ms = (time.perf_counter() - start) * 1000
+
+            top_k = [[row for row, _ in store.search(query, args.top_k)] for query in queries]
+            if exact is None:
+                exact = top_k
+            recall = np.mean([len(set(found) & set(expected)) / len(expected) for found, expected in zip(top_k, exact)])
+
+            # The first insert also loads the chunk ids
+            appends_ms = []
+            for batch_start in (args.rows, args.rows + 1000):
+                nodes = _nodes(rng, batch_start, 1000, args.dim, args.files)
+                start = time.perf_counter()
+                store.add(nodes)
+                appends_ms.append(round((time.perf_counter() - start) * 1000, 2))
+            start = time.perf_counter()
+            deleted = store.delete_where(file_names=["file-3.pdf"])
+            delete_ms = (time.perf_counter() - start) * 1000
+
+            results.append({
+                "dtype": dtype,
+                "fill_rows_per_s": round(args.rows / fill_s),
+                "open_ms": round(open_ms, 3),
+                "first_query_ms": round(first_query_ms, 3),
+                "search": _latencies_ms(lambda query: store.search(query, args.top_k), queries),
+                "search_one_file": _latencies_ms(lambda query: store.search(query, args.top_k, file_filter), queries),
+                "recall_vs_float32": round(float(recall), 4),
+                "first_append_1000_ms": appends_ms[0],
+                "append_1000_ms": appends_ms[1],
+                "delete_one_file_ms": round(delete_ms, 2),
+                "rows_deleted": deleted,
+                "disk_mb": store.stats()["disk_mb"],
+            })
+            store.clear()
+
+    output = json.dumps({
+        "benchmark": "local_store",
+        "rows": args.rows,
+        "dim": args.dim,
+        "files": args.files,
+        "top_k": args.top_k,
+        "results": results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Per-call overhead of FastAPI.metrics with instrumentation on and off.
+
+Times the calls the pipelines make per query (`record_query` with a typical timings dict), per indexing batch
+(`timer`) and per HTTP request (`record_request`), with metrics enabled, disabled (METRICS_ENABLED=false) and
+enabled with a trace file, and prints an excerpt of the rendered /metrics output.
+
+Usage:
+    python -m benchmarks.bench_metrics --calls 100000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from FastAPI.metrics import Metrics
+
+
+TIMINGS = {
+    "cache_hit": False, "embed_ms": 12.5, "setup_ms": 0.01, "search_ms": 4.2, "retrieve_ms": 16.8, "rerank_ms": 0.6,
+    "context_tokens": 1800, "prompt_ms": 0.1, "chunks": 5, "llm_ms": 850.0, "total_ms": 868.0,
+}
+
+
+def _ns_per_call(fn, calls: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(calls):
+        fn()
+    return round((time.perf_counter_ns() - start) / calls, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        for mode, metrics in (
+            ("disabled", Metrics(enabled=False, trace_file="")),
+            ("enabled", Metrics(enabled=True, trace_file="")),
+            ("enabled_with_traces", Metrics(enabled=True, trace_file=os.path.join(root, "traces.jsonl"))),
+        ):
+            def timed_block():
+                with metrics.timer("embed"):
+                    pass
+
+            results.append({
+                "mode": mode,
+                "record_query_ns": _ns_per_call(lambda: metrics.record_query(TIMINGS), args.calls),
+                "timer_ns": _ns_per_call(timed_block, args.calls),
+                "record_request_ns": _ns_per_call(lambda: metrics.record_request("/query", "POST", 200, 0.87), args.calls),
+            })
+            if mode == "enabled":
+                excerpt = [line for line in metrics.render().splitlines() if "stage=\"llm\"" in line][-3:]
+
+    output = json.dumps({"benchmark": "metrics", "calls": args.calls, "results": results, "render_excerpt": excerpt}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
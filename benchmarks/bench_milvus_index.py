@@ -0,0 +1,134 @@
+"""Recall@k and search latency of the Milvus index types and search parameters supported by FastAPI.milvus_index.
+
+Random unit vectors are indexed, and queries are noisy copies of indexed vectors. Recall is measured against an
+exact NumPy search, latency is measured with one query per search call like the query route.
+
+Runs against Milvus Lite (a local file, `pip install milvus-lite`) by default. Milvus Lite only builds FLAT and
+IVF_FLAT indexes, the other configurations are reported as skipped; pass --uri http://localhost:19530 to compare
+all the index types on the docker-compose Milvus.
+
+Usage:
+    python -m benchmarks.bench_milvus_index --vectors 20000 --queries 200 --top-k 5
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from pymilvus import MilvusException, connections, utility
+
+from FastAPI.milvus_index import ensure_collection, index_params, search_params
+
+# (index type, build params, list of search params to sweep)
+CONFIGS = [
+    ("FLAT", {}, [{}]),
+    ("IVF_FLAT", {"nlist": 256}, [{"nprobe": 4}, {"nprobe": 16}, {"nprobe": 64}]),
+    ("IVF_SQ8", {"nlist": 256}, [{"nprobe": 4}, {"nprobe": 16}, {"nprobe": 64}]),
+    ("HNSW", {"M": 16, "efConstruction": 200}, [{"ef": 16}, {"ef": 64}, {"ef": 256}]),
+]
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _bench_config(args, index_type, build_params, sweep, vectors, queries, ground_truth) -> list:
+    collection_name = f"bench_{index_type.lower()}"
+    if utility.has_collection(collection_name, using="bench"):
+        utility.drop_collection(collection_name, using="bench")
+
+    start = time.perf_counter()
+    try:
+        collection = ensure_collection(
+            collection_name, dim=args.dim, index=index_params(index_type, build_params), level=args.consistency_level, using="bench"
+        )
+    except MilvusException as e:
+        utility.drop_collection(collection_name, using="bench")
+        return [{"index_type": index_type, "build_params": build_params, "skipped": e.message}]
+    for i in range(0, len(vectors), 5000):
+        batch = vectors[i:i + 5000]
+        ids = [str(j) for j in range(i, i + len(batch))]
+        collection.insert([
+            {"id": id_, "embedding": vector.tolist(), "file_name": "bench.pdf", "page_num": 0, "page_hash": "", "content_hash": ""}
+            for id_, vector in zip(ids, batch)
+        ])
+    collection.flush()
+    build_s = time.perf_counter() - start
+
+    results = []
+    for params in sweep:
+        latencies, hits = [], 0
+        for query, expected in zip(queries, ground_truth):
+            query_start = time.perf_counter()
+            found = collection.search(
+                data=[query.tolist()],
+                anns_field="embedding",
+                param=search_params(index_type, params),
+                limit=args.top_k,
+                consistency_level=args.consistency_level,
+            )[0]
+            latencies.append((time.perf_counter() - query_start) * 1000)
+            hits += len({int(hit.id) for hit in found} & set(expected))
+
+        latencies.sort()
+        results.append({
+            "index_type": index_type,
+            "build_params": build_params,
+            "search_params": params,
+            "insert_and_build_s": round(build_s, 3),
+            f"recall@{args.top_k}": round(hits / (len(queries) * args.top_k), 4),
+            "p50_ms": round(statistics.median(latencies), 3),
+            "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 3),
+        })
+
+    collection.release()
+    utility.drop_collection(collection_name, using="bench")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", help="Milvus URI. Defaults to a Milvus Lite file in a temporary directory")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.05, help="Standard deviation of the noise added to the queries")
+    parser.add_argument("--consistency-level", default="Bounded")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = _unit(rng.standard_normal((args.vectors, args.dim)).astype(np.float32))
+    sources = rng.choice(args.vectors, size=args.queries, replace=False)
+    queries = _unit(vectors[sources] + args.noise * rng.standard_normal((args.queries, args.dim)).astype(np.float32))
+    ground_truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.top_k].tolist()
+
+    with tempfile.TemporaryDirectory() as root:
+        connections.connect(alias="bench", uri=args.uri or os.path.join(root, "bench_milvus.db"))
+        try:
+            results = []
+            for index_type, build_params, sweep in CONFIGS:
+                results.extend(_bench_config(args, index_type, build_params, sweep, vectors, queries, ground_truth))
+        finally:
+            connections.disconnect("bench")
+
+    output = json.dumps({
+        "benchmark": "milvus_index",
+        "uri": args.uri or "milvus-lite",
+        "vectors": args.vectors,
+        "dim": args.dim,
+        "results": results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
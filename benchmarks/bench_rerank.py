@@ -0,0 +1,112 @@
+"""Prompt context tokens, recall and latency of the post-retrieval reranking stage (FastAPI.rerank.ContextReranker).
+
+Compares the previous behaviour (top-k chunks straight into the prompt) with over-fetching and reranking on a
+corpus where some chunks are near-duplicates of others. Queries are snippets of a target chunk, and recall@k
+counts the queries whose target chunk made it into the prompt.
+
+Usage:
+    python -m benchmarks.bench_rerank --chunks 2000 --queries 200 --token-budget 1024
+"""
+import argparse
+import json
+import random
+import statistics
+
+from llama_index.core import PromptTemplate, VectorStoreIndex
+from llama_index.core.schema import TextNode
+from llama_index.core.utils import get_tokenizer
+
+from FastAPI.querying import QA_PROMPT_TMPL, RAGStringQueryEngine
+from FastAPI.rerank import ContextReranker
+from benchmarks.fakes import EchoLLM, HashingEmbedding, synthetic_corpus
+
+
+def _build_nodes(num_chunks: int, words_per_chunk: int, duplicate_ratio: float, seed: int = 0):
+    rng = random.Random(seed)
+    texts = synthetic_corpus(num_chunks, words_per_doc=words_per_chunk, vocab_size=3000, seed=seed)
+    nodes = [TextNode(id_=str(i), text=text, metadata={"file_name": "synthetic.pdf", "page_num": i}) for i, text in enumerate(texts)]
+    # Near-duplicates: the same chunk with one word changed, as produced by repeated headers or overlapping pages
+    for i in rng.sample(range(num_chunks), int(num_chunks * duplicate_ratio)):
+        words = texts[i].split()
+        words[rng.randrange(len(words))] = "revised"
+        nodes.append(TextNode(id_=f"{i}-dup", text=" ".join(words), metadata={"file_name": "synthetic.pdf", "page_num": i}))
+    return texts, nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--words-per-chunk", type=int, default=120)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--fetch-k", type=int, default=20)
+    parser.add_argument("--token-budget", type=int, default=1024)
+    parser.add_argument("--score-margin", type=float, default=0.15)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    embed_model = HashingEmbedding()
+    texts, nodes = _build_nodes(args.chunks, args.words_per_chunk, args.duplicate_ratio)
+    index = VectorStoreIndex(nodes, embed_model=embed_model)
+    stored = index.vector_store.data.embedding_dict
+    tokenizer = get_tokenizer()
+
+    rng = random.Random(1)
+    targets = rng.sample(range(args.chunks), args.queries)
+    queries = []
+    for target in targets:
+        words = texts[target].split()
+        start = rng.randrange(len(words) - 10)
+        queries.append((str(target), " ".join(words[start:start + 10])))
+
+    configs = {
+        "top_k": (args.top_k, None),
+        "rerank": (args.fetch_k, ContextReranker(
+            fetch_vectors=lambda ids: {id_: stored[id_] for id_ in ids if id_ in stored},
+            enabled=True,
+            fetch_k=args.fetch_k,
+            top_k=args.top_k,
+            score_margin=args.score_margin,
+            token_budget=args.token_budget,
+        )),
+    }
+
+    results = []
+    for name, (retrieve_k, reranker) in configs.items():
+        engine = RAGStringQueryEngine(
+            retriever=index.as_retriever(similarity_top_k=retrieve_k),
+            llm=EchoLLM(),
+            qa_prompt=PromptTemplate(QA_PROMPT_TMPL),
+            embed_model=embed_model,
+            use_chat=False,
+            reranker=reranker,
+        )
+        context_tokens, chunks, rerank_ms, hits = [], [], [], 0
+        for target, query in queries:
+            timings = {}
+            selected = engine._retrieve(query, timings)
+            context_tokens.append(sum(len(tokenizer(node.node.get_content())) for node in selected))
+            chunks.append(len(selected))
+            rerank_ms.append(timings.get("rerank_ms", 0.0))
+            hits += any(node.node.node_id in (target, f"{target}-dup") for node in selected)
+
+        results.append({
+            "mode": name,
+            "retrieved": retrieve_k,
+            "avg_chunks_in_prompt": round(statistics.mean(chunks), 2),
+            "avg_context_tokens": round(statistics.mean(context_tokens), 1),
+            f"recall@{args.top_k}": round(hits / len(queries), 4),
+            "rerank_p50_ms": round(statistics.median(rerank_ms), 3),
+        })
+
+    output = json.dumps({"benchmark": "rerank", "chunks": len(nodes), "queries": len(queries), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
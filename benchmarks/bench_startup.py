@@ -0,0 +1,146 @@
+"""Cold-start cost of the FastAPI app: import time, time to the first served request and time until the models are ready.
+
+Each run starts a fresh interpreter that imports main, enters the app lifespan and sends a first request (GET /metrics,
+which needs no model or Milvus client) through the ASGI app, then waits for the shared embedder and LLM. The provider
+SDKs (NVIDIA / Azure OpenAI) are only imported when these clients are first built, so the report also lists which of
+their modules were loaded by `import main` and what importing them costs on its own. With --fakes, the local stand-ins
+of benchmarks/fakes.py are registered in place of the MinIO and model clients, so no credentials or network are needed.
+Milvus runs as Milvus Lite in a temporary directory.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --runs 3 --fakes --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# Modules pulled in by the model providers, which `import main` should not load
+PROVIDER_MODULES = (
+    "llama_index.embeddings.nvidia",
+    "llama_index.embeddings.azure_openai",
+    "llama_index.llms.nvidia",
+    "llama_index.llms.azure_openai",
+    "llama_index.vector_stores.milvus",
+    "openai",
+    "transformers",
+    "torch",
+)
+
+
+def _child(fakes: bool):
+    start = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+    loaded = [name for name in PROVIDER_MODULES if name in sys.modules]
+
+    import asyncio
+    import httpx
+    from FastAPI.clients import clients
+
+    if fakes:
+        from benchmarks.fakes import EchoLLM, HashingEmbedding, LocalObjectStore
+        from FastAPI.embeddings import CachedBatchingEmbedding
+
+        clients.register("minio", LocalObjectStore(os.path.join(os.environ["BENCH_ROOT"], "minio")))
+        clients.register("embedder", CachedBatchingEmbedding(HashingEmbedding(dim=int(os.environ["EMBEDDING_MODEL_DIMS"]))))
+        clients.register("llm", EchoLLM())
+
+    async def serve():
+        timings = {}
+        async with main.app.router.lifespan_context(main.app):
+            timings["startup_s"] = time.perf_counter() - start
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                response = await client.get("/metrics")
+                response.raise_for_status()
+            timings["first_request_s"] = time.perf_counter() - start
+            await asyncio.to_thread(clients.embedder)
+            await asyncio.to_thread(clients.llm)
+            timings["models_ready_s"] = time.perf_counter() - start
+        return timings
+
+    timings = asyncio.run(serve())
+    print(json.dumps({"import_s": imported - start, **timings, "provider_modules_loaded": loaded}))
+
+
+def _provider_import_child():
+    import llama_index.core  # noqa: F401 (imported by main anyway, not counted)
+
+    start = time.perf_counter()
+    model_host = os.getenv("MODEL_HOST", "NVIDIA")
+    if model_host == "AZURE":
+        import llama_index.embeddings.azure_openai  # noqa: F401
+        import llama_index.llms.azure_openai  # noqa: F401
+    else:
+        import llama_index.embeddings.nvidia  # noqa: F401
+        import llama_index.llms.nvidia  # noqa: F401
+    import llama_index.vector_stores.milvus  # noqa: F401
+    print(json.dumps({"provider_import_s": time.perf_counter() - start}))
+
+
+def _run_child(args: list, env: dict) -> dict:
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", *args], env=env, capture_output=True,
+                            text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_s"] = time.perf_counter() - start
+    return result
+
+
+def _summary(runs: list) -> dict:
+    summary = {key: round(statistics.median(run[key] for run in runs), 3)
+               for key in runs[0] if isinstance(runs[0][key], float)}
+    if "provider_modules_loaded" in runs[0]:
+        summary["provider_modules_loaded"] = runs[0]["provider_modules_loaded"]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters started per mode (medians are reported)")
+    parser.add_argument("--fakes", action="store_true", help="Register the local stand-ins instead of the MinIO and model clients")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--provider-imports", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.child:
+        return _child(args.fakes)
+    if args.provider_imports:
+        return _provider_import_child()
+
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        env = dict(os.environ, BENCH_ROOT=root, MILVUS_CONNECTION_URI=os.path.join(root, "startup_milvus.db"),
+                   MILVUS_COLLECTION_NAME="startup", EMBEDDING_MODEL_DIMS="384", METRICS_TRACE_FILE="",
+                   LEXICAL_INDEX_PATH=os.path.join(root, "lexical_index.npz"))
+        env.pop("EMBED_CACHE_PATH", None)
+        for warm_up in ("true", "false"):
+            runs = [_run_child(["--child"] + (["--fakes"] if args.fakes else []), dict(env, WARM_UP_CLIENTS=warm_up))
+                    for _ in range(args.runs)]
+            results.append({"warm_up_clients": warm_up == "true", **_summary(runs)})
+        provider_imports = _summary([_run_child(["--provider-imports"], env) for _ in range(args.runs)])["provider_import_s"]
+
+    output = json.dumps({
+        "benchmark": "startup",
+        "model_host": "fakes" if args.fakes else os.getenv("MODEL_HOST", "NVIDIA"),
+        "runs": args.runs,
+        "results": results,
+        "provider_import_s": provider_imports,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Query latency of one tenant as unrelated tenants' data grows in the shared collection.
+
+The searched tenant always has the same chunks, while other tenants' chunks are added between measurements. Searches
+go through MilvusVectorStore with the tenant filter built by FastAPI.milvus_index.metadata_filters, like the query
+route, and are compared with unscoped searches of the whole collection. Every scoped hit is checked to belong to the
+searched tenant.
+
+On the docker-compose Milvus (--uri http://localhost:19530) the collection is partitioned by tenant (partition key),
+so a scoped search only touches the tenant's partition. Milvus Lite does not support partition keys: by default
+the benchmark then uses a tenant field with an inverted index instead.
+
+Usage:
+    python -m benchmarks.bench_tenants --tenant-chunks 2000 --other-chunks 0 20000 50000 100000 --queries 100
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from llama_index.core.vector_stores import VectorStoreQuery
+from llama_index.vector_stores.milvus import MilvusVectorStore
+from pymilvus import connections, utility
+
+from FastAPI.milvus_index import ensure_collection, index_params, metadata_filters
+
+
+def _insert(collection, vectors: np.ndarray, tenant: str, start_id: int):
+    for i in range(0, len(vectors), 5000):
+        collection.insert([
+            {"id": str(start_id + j), "embedding": vectors[j].tolist(), "file_name": f"{tenant}.pdf", "page_num": j,
+             "page_hash": "", "content_hash": "", "tenant": tenant,
+             "_node_content": json.dumps({"id_": str(start_id + j), "text": ""}), "_node_type": "TextNode"}
+            for j in range(i, min(i + 5000, len(vectors)))
+        ])
+    collection.flush()
+
+
+def _search(store: MilvusVectorStore, queries: np.ndarray, top_k: int, filters=None):
+    latencies, ids = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=top_k, filters=filters))
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.extend(result.ids)
+    latencies.sort()
+    return latencies, ids
+
+
+def _percentiles(latencies: list) -> dict:
+    return {"p50_ms": round(statistics.median(latencies), 3), "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", help="Milvus URI. Defaults to a Milvus Lite file in a temporary directory")
+    parser.add_argument("--tenant-chunks", type=int, default=2000, help="Chunks of the searched tenant")
+    parser.add_argument("--other-chunks", type=int, nargs="+", default=[0, 20000, 50000, 100000],
+                        help="Total chunks of the other tenants at each measurement")
+    parser.add_argument("--other-tenants", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--index-type", default="FLAT", help="Milvus Lite only builds FLAT and IVF_FLAT indexes")
+    parser.add_argument("--partition-key", choices=["auto", "on", "off"], default="auto",
+                        help="Partition the collection by tenant. auto: on unless running on Milvus Lite")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    partition_key = args.partition_key == "on" or (args.partition_key == "auto" and args.uri is not None)
+    rng = np.random.default_rng(0)
+
+    def unit(n: int) -> np.ndarray:
+        vectors = rng.standard_normal((n, args.dim)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    queries = unit(args.queries)
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        uri = args.uri or os.path.join(root, "bench_milvus.db")
+        connections.connect(alias="bench", uri=uri)
+        try:
+            if utility.has_collection("bench_tenants", using="bench"):
+                utility.drop_collection("bench_tenants", using="bench")
+            collection = ensure_collection(
+                "bench_tenants", dim=args.dim, index=index_params(args.index_type), using="bench", partition_key=partition_key
+            )
+            _insert(collection, unit(args.tenant_chunks), "tenant-0", 0)
+            store = MilvusVectorStore(uri=uri, collection_name="bench_tenants", overwrite=False, consistency_level="Strong")
+            filters = metadata_filters(tenant="tenant-0")
+            tenant_ids = {str(i) for i in range(args.tenant_chunks)}
+
+            other_chunks, next_id = 0, args.tenant_chunks
+            for target in sorted(args.other_chunks):
+                # Spread the new chunks over the other tenants
+                per_tenant = (target - other_chunks) // args.other_tenants
+                for tenant in range(1, args.other_tenants + 1):
+                    if per_tenant:
+                        _insert(collection, unit(per_tenant), f"tenant-{tenant}", next_id)
+                        next_id += per_tenant
+                other_chunks += per_tenant * args.other_tenants
+
+                scoped_latencies, scoped_ids = _search(store, queries, args.top_k, filters)
+                whole_latencies, _ = _search(store, queries, args.top_k)
+                results.append({
+                    "other_tenants_chunks": other_chunks,
+                    "scoped_to_tenant": {**_percentiles(scoped_latencies), "hits_outside_tenant": sum(id_ not in tenant_ids for id_ in scoped_ids)},
+                    "whole_collection": _percentiles(whole_latencies),
+                })
+            utility.drop_collection("bench_tenants", using="bench")
+        finally:
+            connections.disconnect("bench")
+
+    output = json.dumps({
+        "benchmark": "tenants",
+        "uri": args.uri or "milvus-lite",
+        "partition_key": partition_key,
+        "tenant_chunks": args.tenant_chunks,
+        "results": results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
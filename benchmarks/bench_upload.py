@@ -0,0 +1,106 @@
+"""Memory and throughput of MinIO uploads: reading each upload into memory vs. streaming it in multipart parts.
+
+Uploads are spooled like Starlette's multipart parser does (SpooledTemporaryFile, 1 MB in memory) and sent to the
+local object store stand-in. The buffered mode mirrors the previous /upload_file (`await file.read()` then
+`put_object(BytesIO(...))`), the streaming mode uses FastAPI.storage.upload_stream like /upload_file and
+/upload_files now do. Each mode uploads the files one by one and then as one concurrent batch through the MINIO
+limiter. Peak memory is the peak of Python allocations (tracemalloc) during the uploads.
+
+Usage:
+    python -m benchmarks.bench_upload --files 8 --file-mb 64
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fakes import LocalObjectStore
+from FastAPI.concurrency import limiter
+from FastAPI.storage import upload_stream
+
+
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def _spooled_upload(path: str):
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    with open(path, "rb") as f:
+        while chunk := f.read(SPOOL_MAX_SIZE):
+            spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def _buffered(store, bucket: str, name: str, spooled):
+    content = spooled.read()
+    store.put_object(bucket, name, io.BytesIO(content), length=len(content))
+
+
+def _streaming(store, bucket: str, name: str, spooled):
+    size = spooled.seek(0, os.SEEK_END)
+    spooled.seek(0)
+    upload_stream(store, bucket, name, spooled, size)
+
+
+async def _run(upload, store, bucket: str, paths: list, concurrent: bool) -> dict:
+    spooled = [_spooled_upload(path) for path in paths]
+    tracemalloc.start()
+    start = time.perf_counter()
+    calls = [limiter.run_in_thread("MINIO", upload, store, bucket, os.path.basename(path), f) for path, f in zip(paths, spooled)]
+    if concurrent:
+        await asyncio.gather(*calls)
+    else:
+        for call in calls:
+            await call
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    for f in spooled:
+        f.close()
+    total_mb = sum(os.path.getsize(path) for path in paths) / 2**20
+    return {"seconds": round(elapsed, 3), "mb_per_s": round(total_mb / elapsed, 1), "peak_memory_mb": round(peak / 2**20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--file-mb", type=int, default=64)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(root, f"document-{i}.pdf")
+            with open(path, "wb") as f:
+                for _ in range(args.file_mb):
+                    f.write(os.urandom(2**20))
+            paths.append(path)
+        store = LocalObjectStore(os.path.join(root, "minio"))
+        store.make_bucket("bench")
+
+        for mode, upload in (("buffered", _buffered), ("streaming", _streaming)):
+            for concurrent in (False, True):
+                result = asyncio.run(_run(upload, store, "bench", paths, concurrent))
+                results.append({"mode": mode, "batch": "concurrent" if concurrent else "sequential", **result})
+
+    output = json.dumps({
+        "benchmark": "upload",
+        "files": args.files,
+        "file_mb": args.file_mb,
+        "results": results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
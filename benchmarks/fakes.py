@@ -0,0 +1,310 @@
+"""Deterministic local stand-ins for the NVIDIA/Azure models and MinIO, used by the benchmarks.
+
+None of these make network calls. Latencies are simulated with sleeps so that concurrency behaves like a
+remote backend (blocking in the sync methods, yielding to the event loop in the async ones).
+"""
+from typing import Any, List, Sequence
+import asyncio
+import hashlib
+import io
+import math
+import os
+import re
+import time
+
+from pydantic import Field, PrivateAttr
+from llama_index.core import VectorStoreIndex
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.llms import (
+    ChatMessage,
+    ChatResponse,
+    CompletionResponse,
+    CustomLLM,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.schema import TextNode
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class HashingEmbedding(BaseEmbedding):
+    """Bag-of-words hashing embedder. Texts sharing words get similar vectors, so retrieval stays meaningful."""
+
+    dim: int = Field(default=1024)
+    latency_s: float = Field(default=0.0, description="Simulated round-trip latency per API call")
+    _calls: int = PrivateAttr(default=0)
+    _texts: int = PrivateAttr(default=0)
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    @property
+    def texts(self) -> int:
+        return self._texts
+
+    def reset_counters(self):
+        self._calls = 0
+        self._texts = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for token in _TOKEN_RE.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def _record(self, count: int):
+        self._calls += 1
+        self._texts += count
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._get_text_embeddings([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return (await self._aget_text_embeddings([query]))[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self._record(len(texts))
+        time.sleep(self.latency_s)
+        return [self._embed(text) for text in texts]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self._record(len(texts))
+        await asyncio.sleep(self.latency_s)
+        return [self._embed(text) for text in texts]
+
+
+class _EmbeddingItem():
+    def __init__(self, embedding: List[float]):
+        self.embedding = embedding
+
+
+class _EmbeddingsResponse():
+    def __init__(self, embeddings: List[List[float]]):
+        self.data = [_EmbeddingItem(embedding) for embedding in embeddings]
+
+
+class _EmbeddingsAPI():
+    """`client.embeddings` of the OpenAI-compatible client NVIDIAEmbedding calls"""
+
+    def __init__(self, owner: "NVIDIAShapedEmbedding"):
+        self._owner = owner
+
+    def create(self, input: List[str], model: str, extra_body: dict) -> _EmbeddingsResponse:
+        assert len(input) <= 259, "The batch size should not be larger than 259."
+        self._owner.input_types[extra_body["input_type"]] = self._owner.input_types.get(extra_body["input_type"], 0) + 1
+        return _EmbeddingsResponse(self._owner._get_text_embeddings(input))
+
+
+class NVIDIAShapedEmbedding(HashingEmbedding):
+    """Hashing embedder shaped like NVIDIAEmbedding (the default model host): one API call per query through
+    `_client.embeddings.create` with input_type="query", and no batch method for queries. Wrapped with
+    `symmetric=False`, as `clients.build_embedder` does for NVIDIA, it shows whether query batches really merge."""
+
+    model: str = Field(default="nvidia/nv-embedqa-e5-v5")
+    truncate: str = Field(default="END")
+    input_types: dict = Field(default_factory=dict, description="API calls per input_type")
+    _client: Any = PrivateAttr()
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._client = type("Client", (), {})()
+        self._client.embeddings = _EmbeddingsAPI(self)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._client.embeddings.create(input=[query], model=self.model, extra_body={"input_type": "query"}).data[0].embedding
+
+
+class EchoLLM(CustomLLM):
+    """Completion LLM that echoes the tail of the prompt at a fixed token rate."""
+
+    latency_s: float = Field(default=0.05, description="Simulated time to first token")
+    tokens_per_s: float = Field(default=200.0, description="Simulated generation speed")
+    num_output_tokens: int = Field(default=32)
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name="echo", is_chat_model=False)
+
+    def _tokens(self, prompt: str) -> List[str]:
+        return [f"{word} " for word in prompt.split()[-self.num_output_tokens:]]
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        tokens = self._tokens(prompt)
+        time.sleep(self.latency_s + len(tokens) / self.tokens_per_s)
+        return CompletionResponse(text="".join(tokens))
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        def gen():
+            text = ""
+            time.sleep(self.latency_s)
+            for token in self._tokens(prompt):
+                time.sleep(1 / self.tokens_per_s)
+                text += token
+                yield CompletionResponse(text=text, delta=token)
+
+        return gen()
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        tokens = self._tokens(prompt)
+        await asyncio.sleep(self.latency_s + len(tokens) / self.tokens_per_s)
+        return CompletionResponse(text="".join(tokens))
+
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        async def gen():
+            text = ""
+            await asyncio.sleep(self.latency_s)
+            for token in self._tokens(prompt):
+                await asyncio.sleep(1 / self.tokens_per_s)
+                text += token
+                yield CompletionResponse(text=text, delta=token)
+
+        return gen()
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        completion = await self.acomplete(self.messages_to_prompt(messages))
+        return ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=completion.text))
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        completion_gen = await self.astream_complete(self.messages_to_prompt(messages))
+
+        async def gen():
+            async for completion in completion_gen:
+                yield ChatResponse(
+                    message=ChatMessage(role=MessageRole.ASSISTANT, content=completion.text),
+                    delta=completion.delta,
+                )
+
+        return gen()
+
+
+class _LocalObject(io.BytesIO):
+    """Mimics the urllib3 response returned by `Minio.get_object`."""
+
+    def stream(self, amt: int = 64 * 1024):
+        while True:
+            data = self.read(amt)
+            if not data:
+                return
+            yield data
+
+    def release_conn(self):
+        pass
+
+
+class _LocalStat():
+    def __init__(self, object_name: str, size: int):
+        self.object_name = object_name
+        self.size = size
+
+
+class LocalObjectStore():
+    """Directory-backed stand-in for the subset of the `minio.Minio` client used by this repo."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, bucket_name: str, object_name: str) -> str:
+        return os.path.join(self.root, bucket_name, object_name)
+
+    def bucket_exists(self, bucket_name: str) -> bool:
+        return os.path.isdir(os.path.join(self.root, bucket_name))
+
+    def make_bucket(self, bucket_name: str):
+        os.makedirs(os.path.join(self.root, bucket_name), exist_ok=True)
+
+    def put_object(self, bucket_name: str, object_name: str, data, length: int, part_size: int = 0, **kwargs):
+        path = self._path(bucket_name, object_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        chunk_size = part_size or 5 * 1024 * 1024
+        with open(path, "wb") as f:
+            while True:
+                chunk = data.read(chunk_size)
+                if not chunk:
+                    break
+                f.write(chunk)
+        return _LocalStat(object_name, os.path.getsize(path))
+
+    def fput_object(self, bucket_name: str, object_name: str, file_path: str, **kwargs):
+        with open(file_path, "rb") as f:
+            return self.put_object(bucket_name, object_name, f, length=-1)
+
+    def get_object(self, bucket_name: str, object_name: str, **kwargs) -> _LocalObject:
+        with open(self._path(bucket_name, object_name), "rb") as f:
+            return _LocalObject(f.read())
+
+    def stat_object(self, bucket_name: str, object_name: str, **kwargs) -> _LocalStat:
+        path = self._path(bucket_name, object_name)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Object '{object_name}' not found in bucket '{bucket_name}'")
+        return _LocalStat(object_name, os.path.getsize(path))
+
+    def remove_object(self, bucket_name: str, object_name: str, **kwargs):
+        path = self._path(bucket_name, object_name)
+        if os.path.isfile(path):
+            os.remove(path)
+
+    def list_objects(self, bucket_name: str, prefix: str = "", recursive: bool = False, **kwargs):
+        bucket_root = os.path.join(self.root, bucket_name)
+        for directory, _, files in os.walk(bucket_root):
+            for file_name in files:
+                object_name = os.path.relpath(os.path.join(directory, file_name), bucket_root)
+                if object_name.startswith(prefix):
+                    yield _LocalStat(object_name, os.path.getsize(os.path.join(directory, file_name)))
+
+
+def write_text_pdf(path: str, pages: List[str], words_per_line: int = 12):
+    """Writes a minimal PDF with one page per text (Helvetica, no compression) that PyPDF2 can extract"""
+
+    def escape(text: str) -> str:
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for text in pages:
+        words = text.split()
+        lines = [" ".join(words[i:i + words_per_line]) for i in range(0, len(words), words_per_line)]
+        content = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({escape(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(content.encode('latin-1', 'replace'))} >>\nstream\n{content}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {len(objects)} 0 R "
+                       f"/Resources << /Font << /F1 3 0 R >> >> >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1", "replace"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    out.write("".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    with open(path, "wb") as f:
+        f.write(out.getvalue())
+
+
+def build_in_memory_retriever(texts: List[str], embed_model: BaseEmbedding, similarity_top_k: int = 5):
+    """Builds a retriever over an in-memory vector store, standing in for the Milvus retriever"""
+    nodes = [TextNode(text=text, metadata={"file_name": "synthetic.pdf", "page_num": i}) for i, text in enumerate(texts)]
+    index = VectorStoreIndex(nodes, embed_model=embed_model)
+    return index.as_retriever(similarity_top_k=similarity_top_k)
+
+
+def synthetic_corpus(num_docs: int, words_per_doc: int = 200, vocab_size: int = 5000, seed: int = 0) -> List[str]:
+    """Generates a reproducible corpus of pseudo-random word documents"""
+    import random
+
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    return [" ".join(rng.choices(vocab, k=words_per_doc)) for _ in range(num_docs)]
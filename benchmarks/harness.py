@@ -0,0 +1,239 @@
+"""End-to-end offline benchmark of Indexing_Pipeline.run and the /query route, with deterministic local stand-ins.
+
+The real pipelines and FastAPI app run with their clients swapped in FastAPI.clients.clients: the NVIDIA-shaped
+hashing embedder and echo LLM from benchmarks/fakes.py (with configurable latency and token rate) and a
+directory-backed object store instead of MinIO. Chunks are stored in Milvus Lite (a local file, or --milvus-uri for a real server), with
+--vector-store local in the embedded memory-mapped store (FastAPI/local_store.py), or with --vector-store memory in
+an in-memory llama-index vector store.
+
+The ingest phase indexes data/Essential_Drugs_for_Cancer_Therapy.pdf and/or synthetic PDFs, then the query phase
+sends POST /query requests through the ASGI app at each concurrency level. The report gives the ingest throughput
+(pages/s, chunks/s and per-stage metrics), the query throughput and p50/p95/p99 latencies, and the peak RSS after
+each phase, as JSON so that runs can be compared.
+
+Usage:
+    python -m benchmarks.harness --synthetic-docs 4 --concurrency 1 8 32 --requests 200
+    python -m benchmarks.harness --pdf data/Essential_Drugs_for_Cancer_Therapy.pdf --vector-store memory --output run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.fakes import EchoLLM, LocalObjectStore, NVIDIAShapedEmbedding, synthetic_corpus, write_text_pdf
+
+
+DEFAULT_PDF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "Essential_Drugs_for_Cancer_Therapy.pdf")
+
+
+def _configure_environment(args, root: str):
+    # Read by the pipelines and routes when they are imported and built, so set before importing them
+    os.environ.update({
+        "MILVUS_CONNECTION_URI": args.milvus_uri or os.path.join(root, "harness_milvus.db"),
+        "MILVUS_COLLECTION_NAME": "harness",
+        "MILVUS_INDEX_TYPE": args.index_type,
+        "MILVUS_PARTITION_KEY": "true" if args.milvus_uri else "false",
+        "MINIO_BUCKET_NAME": "harness",
+        "EMBEDDING_MODEL_DIMS": str(args.dim),
+        "CHUNKING_STRATEGY": args.chunking,
+        "LEXICAL_INDEX_PATH": os.path.join(root, "lexical_index.npz"),
+        "VECTOR_STORE_BACKEND": "local" if args.vector_store == "local" else "milvus",
+        "LOCAL_VECTOR_STORE_PATH": os.path.join(root, "local_vector_store"),
+        "LOCAL_VECTOR_STORE_DTYPE": args.local_dtype,
+        "METRICS_TRACE_FILE": "",
+    })
+    os.environ.pop("EMBED_CACHE_PATH", None)
+
+
+def _percentiles(latencies_ms: list) -> dict:
+    latencies_ms = sorted(latencies_ms)
+    if not latencies_ms:
+        return {}
+
+    def pick(q: float) -> float:
+        return round(latencies_ms[min(len(latencies_ms) - 1, int(q * len(latencies_ms)))], 3)
+
+    return {"p50_ms": round(statistics.median(latencies_ms), 3), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+def _documents(args, bucket_root: str) -> list:
+    file_names = []
+    if args.pdf:
+        file_names.append(os.path.basename(args.pdf))
+        shutil.copy(args.pdf, os.path.join(bucket_root, file_names[-1]))
+    for i in range(args.synthetic_docs):
+        file_names.append(f"synthetic-{i}.pdf")
+        pages = synthetic_corpus(args.synthetic_pages, words_per_doc=args.words_per_page, seed=i)
+        write_text_pdf(os.path.join(bucket_root, file_names[-1]), pages)
+    return file_names
+
+
+def _in_memory_query_pipeline(nodes):
+    from llama_index.core import VectorStoreIndex
+    from FastAPI.querying import Query_Pipeline
+
+    class InMemoryQueryPipeline(Query_Pipeline):
+        """Query_Pipeline over an in-memory vector store holding the ingested chunks"""
+
+        def get_index(self):
+            with self._lock:
+                if self._index is None:
+                    self._index = VectorStoreIndex(nodes, embed_model=self.embedder)
+                return self._index
+
+        def fetch_vectors(self, ids):
+            ids = set(ids)
+            return {node.id_: node.embedding for node in nodes if node.id_ in ids}
+
+    return InMemoryQueryPipeline()
+
+
+def _ingest(app, args, file_names: list) -> dict:
+    from FastAPI.pdf_extraction import peak_rss_mb
+
+    pipeline = app.state.indexing_pipeline
+    start = time.perf_counter()
+    if args.vector_store == "memory":
+        # Same extract, chunk and embed steps as Indexing_Pipeline.run, with the chunks kept in memory
+        nodes = []
+        state = {"tenant": None, "indexed_pages": set(), "unchanged_pages": set(), "node_ids": set(), "lock": threading.Lock()}
+        for document in pipeline.iter_documents(file_names):
+            chunks = pipeline._page_nodes(document, state)
+            pipeline.embed_nodes(chunks)
+            nodes.extend(chunks)
+        app.state.query_pipeline = _in_memory_query_pipeline(nodes)
+        summary = {"pages": len({(n.metadata["file_name"], n.metadata["page_num"]) for n in nodes}), "chunks_added": len(nodes)}
+    else:
+        summary = pipeline.run(file_names)
+        app.state.query_pipeline.refresh()
+    wall_s = time.perf_counter() - start
+
+    return {
+        "documents": len(file_names),
+        "pages": summary["pages"],
+        "chunks": summary["chunks_added"],
+        "wall_s": round(wall_s, 3),
+        "pages_per_s": round(summary["pages"] / wall_s, 2),
+        "chunks_per_s": round(summary["chunks_added"] / wall_s, 2),
+        "stages": summary.get("stages", {}),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def _query_level(client, queries: list, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    pending = iter(queries)
+
+    async def worker():
+        nonlocal errors
+        for query in pending:
+            start = time.perf_counter()
+            response = await client.post("/query", json={"query": query})
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code != 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    wall_s = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": len(queries),
+        "errors": errors,
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(queries) / wall_s, 2),
+        **_percentiles(latencies),
+    }
+
+
+async def _run(args, root: str) -> dict:
+    import httpx
+    from FastAPI.clients import clients
+    from FastAPI.embeddings import CachedBatchingEmbedding
+    from FastAPI.pdf_extraction import peak_rss_mb
+    import main
+
+    object_store = LocalObjectStore(os.path.join(root, "minio"))
+    object_store.make_bucket("harness")
+    embedder = NVIDIAShapedEmbedding(dim=args.dim, latency_s=args.embed_latency)
+    clients.register("minio", object_store)
+    clients.register("embedder", CachedBatchingEmbedding(embedder))
+    clients.register("llm", EchoLLM(latency_s=args.llm_latency, tokens_per_s=args.tokens_per_s, num_output_tokens=args.output_tokens))
+
+    file_names = _documents(args, os.path.join(root, "minio", "harness"))
+    async with main.app.router.lifespan_context(main.app):
+        ingest = await asyncio.to_thread(_ingest, main.app, args, file_names)
+        embed_calls = embedder.calls
+
+        rng = random.Random(args.seed)
+        vocabulary = [word for text in synthetic_corpus(50, seed=args.seed) for word in text.split()]
+        query = []
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://harness", timeout=None) as client:
+            for concurrency in args.concurrency:
+                # Distinct questions so that every request goes through retrieval and generation
+                queries = [" ".join(rng.choices(vocabulary, k=args.query_words)) + "?" for _ in range(args.requests)]
+                main.app.state.query_pipeline.answer_cache.invalidate()
+                query.append(await _query_level(client, queries, concurrency))
+
+    return {
+        "benchmark": "harness",
+        "config": {
+            "vector_store": "milvus" if args.milvus_uri else ("milvus-lite" if args.vector_store == "milvus" else args.vector_store),
+            "chunking": args.chunking,
+            "dim": args.dim,
+            "embed_latency_s": args.embed_latency,
+            "llm_latency_s": args.llm_latency,
+            "tokens_per_s": args.tokens_per_s,
+            "python": platform.python_version(),
+        },
+        "ingest": {**ingest, "embed_calls": embed_calls},
+        "query": query,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=DEFAULT_PDF, help="PDF to ingest, empty to only ingest synthetic documents")
+    parser.add_argument("--synthetic-docs", type=int, default=0)
+    parser.add_argument("--synthetic-pages", type=int, default=20)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--vector-store", choices=["milvus", "local", "memory"], default="milvus",
+                        help="milvus: Milvus Lite (or --milvus-uri), local: embedded memory-mapped store, memory: in-memory llama-index vector store")
+    parser.add_argument("--local-dtype", choices=["float32", "int8"], default="float32", help="Storage of the local vector store")
+    parser.add_argument("--milvus-uri", help="Milvus server to use instead of a Milvus Lite file")
+    parser.add_argument("--index-type", default="FLAT", help="Milvus Lite only builds FLAT and IVF_FLAT indexes")
+    parser.add_argument("--chunking", default="sentence", choices=["sentence", "semantic", "hybrid"])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="Simulated seconds per embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Simulated seconds to the first token")
+    parser.add_argument("--tokens-per-s", type=float, default=500.0)
+    parser.add_argument("--output-tokens", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100, help="Queries sent at each concurrency level")
+    parser.add_argument("--query-words", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        _configure_environment(args, root)
+        report = asyncio.run(_run(args, root))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
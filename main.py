@@ -1,16 +1,59 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import Any, Dict, List, Optional, Union
 from FastAPI.indexing import Indexing_Pipeline 
 from FastAPI.querying import Query_Pipeline 
+from FastAPI.concurrency import limiter
+from FastAPI.jobs import IndexingJobQueue
+from FastAPI.embeddings import CachedBatchingEmbedding
+from FastAPI.milvus_index import metadata_filters
+from FastAPI.clients import clients
+from FastAPI.metrics import metrics
+from FastAPI.storage import upload_stream
+import asyncio
 import os
-import io
+import json
+import time
 import uvicorn
-from minio import Minio
+from minio.error import S3Error
 from llama_index.core import Settings
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Builds the pipelines once at startup. Model, Milvus and MinIO clients come from the shared client registry: they
+    are built on first use, or in the background right after startup when WARM_UP_CLIENTS is true, and closed at shutdown.
+    """
+    query_pipeline = Query_Pipeline()
+
+    def set_default_models():
+        Settings.embed_model = clients.embedder()
+        Settings.llm = clients.llm()
+
+    if os.getenv("WARM_UP_CLIENTS", "true").lower() == "true":
+        # The app serves requests while the provider SDKs are imported and the clients connect (the local vector
+        # store needs no connection, its files are mapped by the first query)
+        names = ["embedder", "llm"] + (["milvus"] if query_pipeline.vector_store_backend == "milvus" else [])
+        clients.warm_up(names, on_ready=set_default_models)
+
+    app.state.query_pipeline = query_pipeline
+    app.state.indexing_pipeline = Indexing_Pipeline(lexical_index=query_pipeline.lexical_index)
+    app.state.indexing_jobs = IndexingJobQueue(run_fn=index_document_in_background)
+    yield
+    app.state.indexing_jobs.shutdown()
+    app.state.indexing_pipeline.compaction.shutdown()
+    # peek does not build the embedder if no request needed it
+    embedder = clients.peek("embedder")
+    if isinstance(embedder, CachedBatchingEmbedding):
+        embedder.save()
+    clients.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,6 +64,28 @@ app.add_middleware(
 )
 bucket_name = os.getenv("MINIO_BUCKET_NAME")  # MinIO bucket name
 
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # Latency until the response starts (the whole answer for /query, the first byte for /query/stream)
+    if not metrics.enabled:
+        return await call_next(request)
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.record_request(route.path if route is not None else "unmatched", request.method, response.status_code,
+                           time.perf_counter() - start)
+    return response
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Request latency histograms, per-stage timings of the indexing and query pipelines, and token/chunk counters in
+    the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Define Pydantic models for request validation
 class Document(BaseModel):
     id: str
@@ -28,14 +93,37 @@ class Document(BaseModel):
 
 class QueryRequest(BaseModel):
     query: str
+    # Optional restriction of the search to some documents (file names) and/or metadata conditions such as
+    # {"key": "page_num", "operator": ">=", "value": 10}, pushed down to Milvus as a filter expression
+    documents: Optional[List[str]] = None
+    filters: Optional[List[Dict[str, Any]]] = None
+    # Tenant (user or workspace) whose documents are searched, DEFAULT_TENANT if not given
+    tenant: Optional[str] = None
 
-# Initialize MinIO client
-minio_client = Minio(
-    "localhost:9000",  # MinIO URL
-    access_key="minioadmin",  # MinIO access key
-    secret_key="minioadmin",  # MinIO secret key
-    secure=False  # Set to True if using https
-)
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    # Same restrictions as QueryRequest, applied to every query of the batch
+    documents: Optional[List[str]] = None
+    filters: Optional[List[Dict[str, Any]]] = None
+    tenant: Optional[str] = None
+    # LLM calls in flight for this batch, BATCH_QUERY_CONCURRENCY if not given
+    max_concurrency: Optional[int] = None
+
+
+def query_filters(query: Union[QueryRequest, BatchQueryRequest]):
+    try:
+        return metadata_filters(query.documents, query.filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def stream_upload(file: UploadFile) -> Dict:
+    # The multipart parser has already spooled the upload (to disk past 1 MB), stream it to MinIO part by part
+    # instead of reading it into memory
+    return await limiter.run_in_thread(
+        "MINIO", upload_stream, clients.minio(), bucket_name, file.filename, file.file,
+        file.size if file.size is not None else -1, file.content_type
+    )
 
 
 @app.post("/upload_file")
@@ -44,30 +132,50 @@ async def upload_file(file: UploadFile = File(...)):
     Upload a file to MinIO.
     """
     try:
-        file_content = await file.read()
-        file_name = file.filename
-        minio_client.put_object(
-            bucket_name,
-            file_name,
-            io.BytesIO(file_content),
-            length=len(file_content)
-        )
-        return JSONResponse(content={"message": "File uploaded successfully", "file_name": file_name})
+        await stream_upload(file)
+        return JSONResponse(content={"message": "File uploaded successfully", "file_name": file.filename})
     except Exception as e:
         return JSONResponse(content={"message": "MinIO upload error", "error": str(e)}, status_code=500)
 
 
+@app.post("/upload_files")
+async def upload_files(files: List[UploadFile] = File(...), index: bool = False, tenant: Optional[str] = None):
+    """
+    Upload several files to MinIO concurrently (bounded by MINIO_MAX_CONCURRENCY), optionally queueing an indexing
+    job for each uploaded file.
+    """
+    results = await asyncio.gather(*(stream_upload(file) for file in files), return_exceptions=True)
+    uploaded, failed = [], []
+    for file, result in zip(files, results):
+        if isinstance(result, Exception):
+            failed.append({"file_name": file.filename, "error": str(result)})
+            continue
+        if index:
+            job = app.state.indexing_jobs.submit(file.filename, tenant)
+            result.update({"job_id": job.job_id, "status": job.status})
+        uploaded.append(result)
+
+    content = {"uploaded": uploaded, "failed": failed}
+    if failed:
+        content["message"] = "MinIO upload error"
+    return JSONResponse(content=content, status_code=500 if failed and not uploaded else 200)
+
+
 @app.get("/list_files")
 async def list_files():
     """
     List all objects in the MinIO bucket.
     """
-    try:
+    def list_object_names():
+        minio_client = clients.minio()
         if not minio_client.bucket_exists(bucket_name):
             minio_client.make_bucket(bucket_name)
     
         objects = minio_client.list_objects(bucket_name, recursive=True)
-        documents = [obj.object_name for obj in objects]
+        return [obj.object_name for obj in objects]
+
+    try:
+        documents = await limiter.run_in_thread("MINIO", list_object_names)
         return JSONResponse(content=documents)
     
     except Exception as e:
@@ -84,72 +192,168 @@ async def delete_file(request: Request):
         raise HTTPException(status_code=400, detail="Filename is required")
 
     try:
-        minio_client.remove_object(bucket_name, file_name)
+        await limiter.run_in_thread("MINIO", clients.minio().remove_object, bucket_name, file_name)
         return JSONResponse(content={"message": "Document deleted successfully"})
     except Exception as e:
         return JSONResponse(content={"message": "Error deleting document", "error": str(e)}, status_code=500)
 
 
-# Background task for document indexing
-def index_document_in_background(file_path):
-    try: 
-        indexing_pipeline = Indexing_Pipeline()
-        index = indexing_pipeline.run([file_path])
-        return index
-    
-    except Exception as e:
-        print(f"Error indexing document: {e}") 
+# Background task for document indexing, run by the indexing job queue (errors are recorded on the job and retried)
+def index_document_in_background(file_path, progress=None, tenant=None):
+    result = app.state.indexing_pipeline.run([file_path], progress=progress, tenant=tenant)
+    # The collection may have just been created, let the query pipeline reconnect
+    app.state.query_pipeline.refresh()
+    return result
 
 
 # Helper function for querying
-def query_pipeline_execution(query: str):
+async def query_pipeline_execution(query: str, filters=None, tenant=None):
     try:
-        query_pipeline= Query_Pipeline() 
-        # Set the embedder and LLM model in the settings
-        Settings.embed_model = query_pipeline.embedder
-        Settings.llm = query_pipeline.llm_model
-        response = query_pipeline.run(query)
-        return response
+        timings = {}
+        response = await app.state.query_pipeline.arun(query, timings=timings, filters=filters, tenant=tenant)
+        return response, timings
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error querying documents: {e}")
 
 
-@app.post("/index")
-async def index_document(file_name: str):
+@app.post("/index", status_code=202)
+async def index_document(file_name: str, tenant: Optional[str] = None):
     try:
-        print(f"Attempting to retrieve file from MinIO: {file_name}")
-        response = minio_client.get_object(bucket_name, file_name)
-        
-        if not response:
+        # Only check that the object exists, the indexing job downloads it once
+        await limiter.run_in_thread("MINIO", clients.minio().stat_object, bucket_name, file_name)
+
+        job = app.state.indexing_jobs.submit(file_name, tenant)
+        return {"job_id": job.job_id, "status": job.status}
+
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchBucket"):
             raise HTTPException(status_code=404, detail=f"Document '{file_name}' not found in MinIO")
+        print(f"Error occurred: {e}")  # Log the error
+        raise HTTPException(status_code=500, detail=f"Error indexing document: {e}")
 
-        index = index_document_in_background(file_name)
-        return {"index": index}
-    
     except Exception as e:
         print(f"Error occurred: {e}")  # Log the error
         raise HTTPException(status_code=500, detail=f"Error indexing document: {e}")
-    
-    finally:
-        if 'response' in locals():
-            response.close()
-            response.release_conn()
+
+@app.get("/index/status/{job_id}")
+async def index_status(job_id: str):
+    job = app.state.indexing_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Indexing job '{job_id}' not found")
+    return job.to_dict()
+
 
 # Route to handle document querying
 @app.post("/query")
 async def query_documents(query: QueryRequest):
+    filters = query_filters(query)
     try:
-        response = query_pipeline_execution(query.query) 
-        return {"response": response}
+        response, timings = await query_pipeline_execution(query.query, filters, query.tenant)
+        return {"response": response, "timings": timings}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving response: {e}")
 
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss counters of the answer cache and the query-embedding cache, and the size of the reranker's vector cache.
+    """
+    query_pipeline = app.state.query_pipeline
+    stats = {"answers": query_pipeline.answer_cache.stats(), "rerank_vectors": query_pipeline.reranker.stats()}
+    if isinstance(query_pipeline.embedder, CachedBatchingEmbedding):
+        stats["embeddings"] = query_pipeline.embedder.stats()
+    return stats
+
+
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Route to stream the response token by token as Server-Sent Events
+@app.post("/query/stream")
+async def query_documents_stream(query: QueryRequest):
+    filters = query_filters(query)
+
+    async def event_stream():
+        timings = {}
+        try:
+            async for event in app.state.query_pipeline.astream(query.query, timings=timings, filters=filters, tenant=query.tenant):
+                yield _sse_event(event["event"], event["data"])
+            yield _sse_event("done", {"timings": timings})
+        except Exception as e:
+            print(f"Error streaming response: {e}")
+            yield _sse_event("error", {"detail": f"Error retrieving response: {e}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Route to answer many queries at once, streaming each answer as Server-Sent Events as soon as it is generated
+@app.post("/query/batch")
+async def query_documents_batch(batch: BatchQueryRequest):
+    """
+    Answers a batch of queries with one batched embed call, one multi-vector search and concurrent LLM calls. Each
+    answer is sent as an "answer" event ({"index", "query", "response", "sources", "timings"}, or {"index", "query",
+    "error"}) in the order they finish, then a "done" event with the batch summary.
+    """
+    query_pipeline = app.state.query_pipeline
+    if not batch.queries:
+        raise HTTPException(status_code=400, detail="Please give at least one query")
+    if len(batch.queries) > query_pipeline.max_batch_size:
+        raise HTTPException(status_code=400, detail=f"A batch holds at most {query_pipeline.max_batch_size} queries, got {len(batch.queries)}")
+    if batch.max_concurrency is not None and batch.max_concurrency < 1:
+        raise HTTPException(status_code=400, detail="max_concurrency should be at least 1")
+    filters = query_filters(batch)
+
+    async def event_stream():
+        summary = {}
+        try:
+            async for result in query_pipeline.abatch(batch.queries, filters=filters, tenant=batch.tenant,
+                                                      max_concurrency=batch.max_concurrency, summary=summary):
+                yield _sse_event("answer", result)
+            yield _sse_event("done", summary)
+        except Exception as e:
+            print(f"Error answering batch: {e}")
+            yield _sse_event("error", {"detail": f"Error retrieving responses: {e}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
     
+@app.delete("/delete_documents")
+async def delete_documents(file_name: Optional[List[str]] = Query(None), prefix: Optional[str] = None,
+                           tenant: Optional[str] = None, remove_objects: bool = True):
+    """
+    Delete documents (repeated file_name parameters and/or every file starting with prefix) from Milvus, the
+    lexical index and MinIO in one call, with the time spent in each. Compaction runs later in the background.
+    Deletes only the tenant's chunks, and keeps in MinIO the files another tenant still has indexed.
+    """
+    if not file_name and not prefix:
+        raise HTTPException(status_code=400, detail="Please give the file_name or the prefix of the documents to delete")
+    try:
+        result = await limiter.run_in_thread(
+            "MILVUS", app.state.indexing_pipeline.delete_documents, file_name, prefix, tenant, remove_objects
+        )
+        app.state.query_pipeline.refresh()
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting documents: {e}")
+
+
 @app.delete("/delete_milvus")
-async def delete_indexes(file_name: str = Query(...)):
+async def delete_indexes(file_name: str = Query(...), tenant: Optional[str] = None):
     try:
-        indexing_pipeline = Indexing_Pipeline()
-        response = indexing_pipeline.delete_milvus_indexes_using_filename(file_name)
+        response = await limiter.run_in_thread(
+            "MILVUS", app.state.indexing_pipeline.delete_milvus_indexes_using_filename, file_name, tenant
+        )
+        app.state.query_pipeline.refresh()
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting indexes from milvus: {e}")
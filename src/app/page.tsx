@@ -83,8 +83,8 @@ export default function RAGChatbot() {
     setInput('')
 
     try {
-        // Make an API call FastAPI backend with the user's query
-        const response = await fetch('http://127.0.0.1:8000/query', {
+        // Stream the answer from the FastAPI backend as Server-Sent Events
+        const response = await fetch('http://127.0.0.1:8000/query/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -94,7 +94,7 @@ export default function RAGChatbot() {
             }),
         });
 
-        if (!response.ok) {
+        if (!response.ok || !response.body) {
           if (response.status === 500) {
               console.error("Please index documents before querying.");
               setMessages([...newMessages, { role: 'bot', content: "Please index documents before querying." }]);
@@ -104,11 +104,45 @@ export default function RAGChatbot() {
           return;
       }
 
-        // Parse the response from FastAPI
-        const data = await response.json();
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let answer = '';
 
-        // Update the messages state with the bot's response
-        setMessages([...newMessages, { role: 'bot', content: data.response }]);
+        // Render an empty bot message and grow it as tokens arrive
+        setMessages([...newMessages, { role: 'bot', content: '' }]);
+
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+
+          // Events are separated by a blank line
+          const events = buffer.split('\n\n');
+          buffer = events.pop() ?? '';
+
+          for (const rawEvent of events) {
+            let eventName = 'message';
+            let data = '';
+            for (const line of rawEvent.split('\n')) {
+              if (line.startsWith('event: ')) eventName = line.slice(7);
+              else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            if (!data) continue;
+
+            if (eventName === 'token') {
+              answer += JSON.parse(data);
+              setMessages([...newMessages, { role: 'bot', content: answer }]);
+            } else if (eventName === 'sources') {
+              console.log('Retrieved sources:', JSON.parse(data));
+            } else if (eventName === 'error') {
+              const detail = JSON.parse(data).detail || 'Something went wrong while answering. Please try again later.';
+              console.error('Error:', detail);
+              // Keep what was already streamed and show the error after it
+              setMessages([...newMessages, { role: 'bot', content: answer ? `${answer}\n\n${detail}` : detail }]);
+            }
+          }
+        }
 
     } catch (error) {
         console.error('Error sending message to backend:', error);
@@ -133,6 +167,21 @@ export default function RAGChatbot() {
     }
   };
 
+  const waitForIndexingJob = async (jobId: string) => {
+    while (true) {
+      const response = await fetch(`http://127.0.0.1:8000/index/status/${jobId}`);
+      if (!response.ok) {
+        return { status: 'failed', error: await response.text() };
+      }
+      const job = await response.json();
+      console.log('Indexing progress:', job.progress);
+      if (job.status === 'completed' || job.status === 'failed') {
+        return job;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+  };
+
   const handleFileUpload = async () => {
     if (selectedFile) {
       setIsUploading(true);
@@ -159,7 +208,14 @@ export default function RAGChatbot() {
           });
   
           if (indexResponse.ok) {
-            console.log('Indexed:', fileName);
+            // Indexing runs as a background job, poll until it finishes
+            const { job_id } = await indexResponse.json();
+            const job = await waitForIndexingJob(job_id);
+            if (job.status === 'completed') {
+              console.log('Indexed:', fileName, job.result);
+            } else {
+              console.error('Indexing failed:', job.error);
+            }
             fetchDocuments();
           } else {
             const errorText = await indexResponse.text();